@@ -0,0 +1,205 @@
+"""
+Stand-ins for the discord.py objects and AI provider the bot talks to.
+
+They implement only the attributes and methods the bot's code paths use,
+so handlers, the history importer and the summarizer can be driven without
+a gateway connection or API key, deterministically.
+"""
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Iterator, List, Optional
+
+import discord
+
+from services.ai.base import AIProvider, ProviderError
+
+class FakeRole:
+    def __init__(self, name: str):
+        self.name = name
+
+class FakeMember:
+    """Author of a fake message; str() gives the name, like discord.Member."""
+
+    def __init__(self, member_id: int, name: str, roles: Optional[List[FakeRole]] = None, bot: bool = False):
+        self.id = member_id
+        self.name = name
+        self.roles = roles or []
+        self.bot = bot
+
+    def __str__(self) -> str:
+        return self.name
+
+class FakeReference:
+    def __init__(self, message_id: int, resolved: Optional["FakeMessage"] = None):
+        self.message_id = message_id
+        self.resolved = resolved
+
+class FakeMessage:
+    def __init__(self, message_id: int, channel: "FakeThread", author: FakeMember, content: str,
+                 created_at: datetime, reference: Optional[FakeReference] = None,
+                 edited_at: Optional[datetime] = None):
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.reference = reference
+        self.edited_at = edited_at
+        self.guild = None
+        self._state = None  # Read by commands.Context in process_commands
+
+class FakeThread:
+    """A thread whose history() pages through an in-memory message list."""
+
+    def __init__(self, thread_id: int, name: str, history_delay: float = 0.0, page_size: int = 100):
+        """
+        Args:
+            thread_id: Channel ID
+            name: Thread name
+            history_delay: Seconds slept per page of history, like an API round trip
+            page_size: Messages per simulated history request
+        """
+        self.id = thread_id
+        self.name = name
+        self.history_delay = history_delay
+        self.page_size = page_size
+        self.messages: List[FakeMessage] = []
+        self.history_requests = 0
+
+    async def history(self, limit: Optional[int] = 100, before=None, after=None, around=None,
+                      oldest_first: Optional[bool] = None) -> AsyncIterator[FakeMessage]:
+        messages = sorted(self.messages, key=lambda m: m.id)
+        if after is not None:
+            messages = [m for m in messages if m.id > after.id]
+        if before is not None:
+            messages = [m for m in messages if m.id < before.id]
+        if around is not None:
+            index = next((i for i, m in enumerate(messages) if m.id >= around.id), len(messages))
+            half = (limit or 100) // 2
+            messages = messages[max(0, index - half):index + half]
+        elif not oldest_first:
+            messages.reverse()
+        if limit is not None:
+            messages = messages[:limit]
+
+        for start in range(0, len(messages), self.page_size):
+            self.history_requests += 1
+            if self.history_delay:
+                await asyncio.sleep(self.history_delay)
+            for message in messages[start:start + self.page_size]:
+                yield message
+
+class TrafficGenerator:
+    """
+    Deterministic synthetic feedback traffic.
+
+    Messages get snowflake IDs matching their timestamps, a mix of member,
+    moderator and developer authors, and a share of replies to earlier
+    messages. Reply references are left unresolved, as they are for
+    messages outside discord.py's cache.
+    """
+
+    WORDS = ("boss", "dodge", "lag", "balance", "weapon", "map", "spawn", "crash", "menu", "heal",
+             "jump", "wall", "damage", "tier", "loot", "ui", "sound", "match", "ranked", "skin")
+
+    def __init__(self, seed: int = 0, authors: int = 200, reply_ratio: float = 0.2):
+        self.random = random.Random(seed)
+        self.reply_ratio = reply_ratio
+        mod, dev = [FakeRole("Mod")], [FakeRole("Developer")]
+        self.authors = [
+            FakeMember(10_000 + i, f"user{i}", mod if i % 25 == 0 else dev if i % 40 == 1 else [])
+            for i in range(authors)
+        ]
+        self._last_id = 0
+
+    def content(self) -> str:
+        words = self.random.choices(self.WORDS, k=self.random.randint(5, 60))
+        return " ".join(words).capitalize() + "."
+
+    def messages(self, channel: FakeThread, count: int, start: datetime,
+                 interval: timedelta) -> Iterator[FakeMessage]:
+        """Yield `count` messages in `channel`, `interval` apart from `start` (UTC)."""
+        start = start.replace(tzinfo=timezone.utc) if start.tzinfo is None else start
+        recent: List[int] = []
+        for i in range(count):
+            created_at = start + interval * i
+            message_id = max(discord.utils.time_snowflake(created_at), self._last_id + 1)
+            self._last_id = message_id
+            reference = None
+            if recent and self.random.random() < self.reply_ratio:
+                reference = FakeReference(self.random.choice(recent))
+            yield FakeMessage(message_id, channel, self.random.choice(self.authors),
+                              self.content(), created_at, reference)
+            recent.append(message_id)
+            del recent[:-50]
+
+class StubProvider(AIProvider):
+    """
+    Deterministic AI provider with configurable latency.
+
+    The summary depends only on the input, so repeated runs produce the
+    same cache keys and output sizes. Streaming yields the summary in
+    `stream_pieces` parts spread over the latency. A seeded share of calls
+    can be made slow or failing, to imitate a degraded backend.
+    """
+
+    def __init__(self, latency: float = 0.2, per_line_latency: float = 0.0,
+                 stream_pieces: int = 10, max_concurrency: int = 4, name: str = "stub",
+                 tail_ratio: float = 0.0, tail_latency: float = 0.0,
+                 failure_ratio: float = 0.0, seed: int = 0):
+        """
+        Args:
+            latency: Seconds per call
+            per_line_latency: Extra seconds per input line
+            stream_pieces: Pieces a streamed summary is split into
+            max_concurrency: Maximum in-flight calls
+            name: Provider label in metrics
+            tail_ratio: Share of calls that take tail_latency seconds instead
+            tail_latency: Seconds per slow call
+            failure_ratio: Share of calls that fail with ProviderError
+            seed: Seed for choosing slow and failing calls
+        """
+        super().__init__(max_concurrency)
+        self.latency = latency
+        self.per_line_latency = per_line_latency
+        self.stream_pieces = stream_pieces
+        self._name = name
+        self.tail_ratio = tail_ratio
+        self.tail_latency = tail_latency
+        self.failure_ratio = failure_ratio
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.lines = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _latency(self, messages: List[str]) -> float:
+        if self.failure_ratio and self.random.random() < self.failure_ratio:
+            raise ProviderError("simulated outage")
+        if self.tail_ratio and self.random.random() < self.tail_ratio:
+            return self.tail_latency
+        return self.latency + self.per_line_latency * len(messages)
+
+    def _summary(self, messages: List[str], prompt: str) -> str:
+        digest = hashlib.sha256("\n".join([prompt, *messages]).encode()).hexdigest()[:12]
+        return f"- Summary of {len(messages)} lines ({digest})\n" + "- Feedback point\n" * 10
+
+    async def _generate(self, messages: List[str], prompt: str) -> str:
+        self.calls += 1
+        self.lines += len(messages)
+        await asyncio.sleep(self._latency(messages))
+        return self._summary(messages, prompt)
+
+    async def _stream(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        self.lines += len(messages)
+        summary = self._summary(messages, prompt)
+        step = max(1, -(-len(summary) // self.stream_pieces))
+        delay = self._latency(messages) / self.stream_pieces
+        for start in range(0, len(summary), step):
+            await asyncio.sleep(delay)
+            yield summary[start:start + step]
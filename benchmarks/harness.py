@@ -0,0 +1,119 @@
+"""
+Shared setup for the benchmark scripts.
+
+prepare_environment() must run before any project module that opens the
+database is imported: the global `db` and `async_db` are created from
+DATABASE_URL at import time, and benchmarks must never touch the real one.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+def prepare_environment(database_url: Optional[str] = None) -> str:
+    """
+    Point the bot at a scratch database and a dummy API key.
+
+    Args:
+        database_url: Disposable database to use (default: a new SQLite file)
+
+    Returns:
+        str: The database URL in use
+    """
+    if database_url is None:
+        scratch = tempfile.mkdtemp(prefix="feedback-bench-")
+        database_url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    # The summarizer is created at import time and requires a key; its provider is replaced
+    os.environ.setdefault("OPENAI_KEY", "benchmark")
+    return database_url
+
+def percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """p50/p95/p99/max of `values`, multiplied by `scale` (seconds to ms by default)."""
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * scale
+    return {"p50": statistics.median(ordered) * scale, "p95": pick(0.95),
+            "p99": pick(0.99), "max": ordered[-1] * scale}
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a task that sleeps `interval`
+    seconds wakes up. Anything blocking the loop shows up as lag.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        """Stop sampling and return lag percentiles in milliseconds."""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {f"loop_lag_{name}_ms": value for name, value in percentiles(self.samples).items()}
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - expected))
+
+class App:
+    """
+    The bot's modules wired to fakes: a logged-in fake bot user and the
+    summarizer using the given provider. Import only after prepare_environment().
+    """
+
+    def __init__(self, provider):
+        from benchmarks.fakes import FakeMember
+        import bot as bot_module
+        from commands import thread_commands
+        from config.database import db
+        from config.async_database import async_db
+        from services.reply_resolver import reply_resolver
+        from services.token_index import token_index
+        from utils.thread_store import watched_threads
+
+        self.bot_module = bot_module
+        self.bot = bot_module.bot
+        self.bot._connection.user = FakeMember(1, "feedback-bot", bot=True)
+        self.commands = thread_commands
+        self.commands.summarizer.provider = provider
+        self.provider = provider
+        self.db = db
+        self.async_db = async_db
+        self.reply_resolver = reply_resolver
+        self.token_index = token_index
+        self.watched_threads = watched_threads
+
+    async def on_message(self, message) -> None:
+        await self.bot_module.on_message(message)
+
+    async def add_thread(self, thread_id: int, nickname: str) -> None:
+        """Store and watch a thread, like !saveThread without the import."""
+        await self.async_db.save_thread(thread_id, nickname, "benchmark")
+        self.watched_threads.add(thread_id)
+
+    def reset(self) -> None:
+        """Empty every table and in-memory cache between benchmarks."""
+        from models.database import Base
+        with self.db.engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        self.token_index.invalidate()
+        self.reply_resolver.clear()
+        for key in self.bot.ingestion.stats:
+            self.bot.ingestion.stats[key] = 0
+        for thread_id in list(self.watched_threads):
+            self.watched_threads.discard(thread_id)
@@ -0,0 +1,145 @@
+"""
+Replay a feedback_log.txt style log through the bot's on_message handler.
+
+Each log line becomes a fake Discord message delivered like a gateway
+event, with the original gaps between messages divided by --speed
+(0 = as fast as possible). Reports handler latency, event-loop lag and
+ingestion throughput.
+
+Usage:
+    python -m benchmarks.replay feedback_log.txt
+    python -m benchmarks.replay big.log --speed 600 --limit 50000 --output replay.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import timezone
+from typing import Any, Dict, Iterator, Optional
+
+from benchmarks.harness import App, LoopLagMonitor, percentiles, prepare_environment
+
+REPLAY_THREAD_ID = 900_000_000_000_000_001
+
+def log_messages(log_file: str, channel, limit: Optional[int] = None) -> Iterator[Any]:
+    """Yield fake messages for the parseable lines of a log file."""
+    import discord
+    from benchmarks.fakes import FakeMember, FakeMessage, FakeRole
+    from utils.migrate import parse_log_line
+
+    authors: Dict[str, FakeMember] = {}
+    last_id = 0
+    count = 0
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parsed = parse_log_line(line.strip())
+            if parsed is None:
+                continue
+            author = authors.get(parsed['author'])
+            if author is None:
+                roles = [FakeRole(parsed['role'])] if parsed['role'] else []
+                author = authors[parsed['author']] = FakeMember(len(authors) + 2, parsed['author'], roles)
+            created_at = parsed['timestamp'].replace(tzinfo=timezone.utc)
+            last_id = max(discord.utils.time_snowflake(created_at), last_id + 1)
+            yield FakeMessage(last_id, channel, author, parsed['content'], created_at)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+async def replay_log(app: App, log_file: str, speed: float = 0.0, max_gap: float = 5.0,
+                     limit: Optional[int] = None) -> Dict[str, float]:
+    """
+    Deliver a log's messages to on_message and wait until they are written.
+
+    Args:
+        app: Bot modules wired to fakes
+        log_file: Log to replay
+        speed: Real-time multiplier; 0 sends messages back to back
+        max_gap: Longest pause between two messages, in seconds after scaling
+        limit: Stop after this many messages
+
+    Returns:
+        dict: Metrics of the replay
+    """
+    from benchmarks.fakes import FakeThread
+
+    channel = FakeThread(REPLAY_THREAD_ID, "replay")
+    await app.add_thread(channel.id, "replay")
+    app.bot.ingestion.start()
+    monitor = LoopLagMonitor()
+    monitor.start()
+
+    latencies = []
+    tasks = set()
+
+    async def deliver(message) -> None:
+        started = time.perf_counter()
+        await app.on_message(message)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    previous = None
+    for message in log_messages(log_file, channel, limit):
+        if speed and previous is not None:
+            gap = (message.created_at - previous).total_seconds() / speed
+            if gap > 0:
+                await asyncio.sleep(min(gap, max_gap))
+        previous = message.created_at
+        # discord.py runs each event handler as its own task
+        task = asyncio.create_task(deliver(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if not speed and len(tasks) >= 100:
+            await asyncio.sleep(0)
+    if tasks:
+        await asyncio.gather(*tasks)
+    handled = time.perf_counter() - started
+    await app.bot.ingestion.stop()
+    elapsed = time.perf_counter() - started
+
+    stats = app.bot.ingestion.stats
+    result = {
+        "messages": len(latencies),
+        "written": stats["written"],
+        "dropped": stats["dropped"],
+        "handled_s": handled,
+        "elapsed_s": elapsed,
+        "messages_per_s": stats["written"] / elapsed if elapsed else 0.0,
+    }
+    result.update({f"handler_{name}_ms": value for name, value in percentiles(latencies).items()})
+    result.update(await monitor.stop())
+    return result
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a feedback log through on_message.")
+    parser.add_argument("log_file", help="Log in feedback_log.txt format")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Real-time multiplier, e.g. 60 = one hour per minute (default: 0, no pauses)")
+    parser.add_argument("--max-gap", type=float, default=5.0, help="Longest pause between messages in seconds (default: 5)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many messages")
+    parser.add_argument("--url", help="Scratch database URL (default: a temporary SQLite file)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    prepare_environment(args.url)
+    from benchmarks.fakes import StubProvider
+
+    async def run() -> Dict[str, float]:
+        app = App(StubProvider())
+        app.reset()
+        try:
+            return await replay_log(app, args.log_file, args.speed, args.max_gap, args.limit)
+        finally:
+            await app.async_db.close()
+
+    result = asyncio.run(run())
+    for metric, value in result.items():
+        print(f"{metric:<24}{value:>14.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Benchmark suite for the bot's hot paths, driven by synthetic Discord
+traffic and a deterministic stub AI provider.
+
+Benchmarks:
+- ingest:    on_message throughput and event-loop lag under a burst of messages
+- import:    import_thread_history throughput against a paged fake thread
+- summarize: summarize_thread latency for 24h / 3d / 7d windows, cold and cached, and AI calls
+  of widening windows that overlap
+- cleanup:   retention cleanup duration and lock time on a large table
+- migrate:   migrate_log_to_db speed on a generated log
+- failover:  AI call latency with a degraded primary, alone and behind the provider router
+- search:    !search query latency with the full-text index and with a LIKE scan
+- replay:    a feedback_log.txt style log replayed through on_message (with --log)
+
+Results are written as JSON (commit, settings and metrics) so runs can be
+compared between commits.
+
+Usage:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only ingest,summarize --scale 0.2
+    python -m benchmarks.suite --output after.json --compare before.json
+    python -m benchmarks.suite --log feedback_log.txt --speed 0
+
+Only point --url at a disposable database: every table is emptied.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+from benchmarks.harness import App, LoopLagMonitor, percentiles, prepare_environment
+
+BENCHMARKS = ("ingest", "import", "summarize", "cleanup", "migrate", "failover", "search", "replay")
+
+async def bench_ingest(app: App, args) -> Dict[str, float]:
+    """Deliver a burst of messages across several threads to on_message."""
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+
+    count = int(20000 * args.scale)
+    threads = [FakeThread(800_000_000_000_000_000 + i, f"ingest-{i}") for i in range(10)]
+    for thread in threads:
+        await app.add_thread(thread.id, thread.name)
+
+    generator = TrafficGenerator(seed=1)
+    start = datetime.utcnow() - timedelta(hours=1)
+    messages = [
+        message
+        for i, thread in enumerate(threads)
+        for message in generator.messages(thread, count // len(threads), start + timedelta(microseconds=i),
+                                          timedelta(milliseconds=100))
+    ]
+    messages.sort(key=lambda m: m.id)
+
+    app.bot.ingestion.start()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    for offset in range(0, len(messages), 100):
+        # discord.py runs each event handler as its own task
+        await asyncio.gather(*(app.on_message(m) for m in messages[offset:offset + 100]))
+    handled = time.perf_counter() - started
+    await app.bot.ingestion.stop()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "messages": len(messages),
+        "written": app.bot.ingestion.stats["written"],
+        "handled_per_s": len(messages) / handled,
+        "written_per_s": app.bot.ingestion.stats["written"] / elapsed,
+    }
+    result.update(await monitor.stop())
+    return result
+
+async def bench_import(app: App, args) -> Dict[str, float]:
+    """Import a thread's history through the paged fake history API."""
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+
+    count = int(20000 * args.scale)
+    thread = FakeThread(800_000_000_000_001_000, "import", history_delay=args.api_latency)
+    await app.add_thread(thread.id, thread.name)
+    generator = TrafficGenerator(seed=2)
+    thread.messages = list(generator.messages(
+        thread, count, datetime.utcnow() - timedelta(days=7), timedelta(days=7) / max(count, 1)
+    ))
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    imported = await app.commands.import_thread_history(thread)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "messages": imported,
+        "elapsed_s": elapsed,
+        "messages_per_s": imported / elapsed,
+        "history_requests": thread.history_requests,
+    }
+    result.update(await monitor.stop())
+    return result
+
+async def bench_summarize(app: App, args) -> Dict[str, float]:
+    """End-to-end summarize_thread latency over a week of traffic."""
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+    from models.database import CachedSummary, SummaryBucket
+    from services.summary_cache import summary_cache
+    from utils.thread_store import get_thread_by_id
+
+    thread = FakeThread(800_000_000_000_002_000, "summarize")
+    await app.add_thread(thread.id, thread.name)
+    count = int(20000 * args.scale)
+    generator = TrafficGenerator(seed=3)
+    now = datetime.utcnow()
+    rows = [
+        app.db.message_row(thread_id=thread.id, author=str(m.author), content=m.content,
+                           created_at=m.created_at.replace(tzinfo=None), discord_message_id=m.id)
+        for m in generator.messages(thread, count, now - timedelta(days=7), timedelta(days=7) / max(count, 1))
+    ]
+    for offset in range(0, len(rows), 5000):
+        app.db.insert_messages(rows[offset:offset + 5000])
+    thread_info = await get_thread_by_id(thread.id)
+
+    result: Dict[str, float] = {"messages": len(rows)}
+    for timeframe in ("24h", "3d", "7d"):
+        # Cold: no cached summaries of any kind
+        with app.db.engine.begin() as conn:
+            conn.execute(CachedSummary.__table__.delete())
+            conn.execute(SummaryBucket.__table__.delete())
+        app.token_index.invalidate(thread.id)
+
+        for run in ("cold", "cached"):
+            calls = app.provider.calls
+            started = time.perf_counter()
+            summary = await app.commands.summarize_thread(thread_info, timeframe)
+            result[f"{timeframe}_{run}_s"] = time.perf_counter() - started
+            result[f"{timeframe}_{run}_ai_calls"] = app.provider.calls - calls
+            if summary.startswith("Error generating summary"):
+                raise RuntimeError(summary)
+
+    # Overlapping: widening windows in a row reuse the bucket summaries of the
+    # narrower ones; only the finished-summary cache is cleared between them
+    with app.db.engine.begin() as conn:
+        conn.execute(SummaryBucket.__table__.delete())
+    for timeframe in ("24h", "3d", "7d"):
+        with app.db.engine.begin() as conn:
+            conn.execute(CachedSummary.__table__.delete())
+        summary_cache.clear_memory()
+        calls = app.provider.calls
+        await app.commands.summarize_thread(thread_info, timeframe)
+        result[f"{timeframe}_overlap_ai_calls"] = app.provider.calls - calls
+    return result
+
+async def bench_cleanup(app: App, args) -> Dict[str, float]:
+    """Retention cleanup of a large table, half of which has expired."""
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+    from utils.cleanup import MessageCleanup
+
+    count = int(200000 * args.scale)
+    threads = [FakeThread(800_000_000_000_003_000 + i, f"cleanup-{i}") for i in range(10)]
+    generator = TrafficGenerator(seed=4)
+    now = datetime.utcnow()
+    per_thread = count // len(threads)
+    for i, thread in enumerate(threads):
+        await app.add_thread(thread.id, thread.name)
+        rows = [
+            app.db.message_row(thread_id=thread.id, author=str(m.author), content=m.content,
+                               created_at=m.created_at.replace(tzinfo=None), discord_message_id=m.id)
+            for m in generator.messages(thread, per_thread, now - timedelta(days=60, seconds=-i),
+                                        timedelta(days=60) / max(per_thread, 1))
+        ]
+        for offset in range(0, len(rows), 5000):
+            app.db.insert_messages(rows[offset:offset + 5000])
+
+    cleanup = MessageCleanup()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    deleted = await cleanup.cleanup_old_messages()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "rows": per_thread * len(threads),
+        "deleted": deleted,
+        "elapsed_s": elapsed,
+        "deleted_per_s": deleted / elapsed if elapsed else 0.0,
+        "batches": cleanup.stats["batches"],
+        "max_lock_ms": cleanup.stats["max_lock_seconds"] * 1000,
+    }
+    result.update(await monitor.stop())
+    return result
+
+async def bench_migrate(app: App, args) -> Dict[str, float]:
+    """Import a generated feedback log with migrate_log_to_db."""
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+    from utils.migrate import migrate_log_to_db
+
+    count = int(100000 * args.scale)
+    thread = FakeThread(800_000_000_000_004_000, "migrate")
+    await app.add_thread(thread.id, thread.name)
+    generator = TrafficGenerator(seed=5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feedback_log.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for m in generator.messages(thread, count, datetime(2025, 1, 1), timedelta(seconds=5)):
+                role = f"[{m.author.roles[0].name}] " if m.author.roles else ""
+                f.write(f"[{m.created_at:%Y-%m-%d %H:%M:%S} UTC] {role}{m.author}: {m.content}\n")
+        size = os.path.getsize(path)
+
+        started = time.perf_counter()
+        imported = await asyncio.to_thread(migrate_log_to_db, path, thread.id)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "lines": count,
+        "imported": imported,
+        "elapsed_s": elapsed,
+        "messages_per_s": imported / elapsed,
+        "mb_per_s": size / 1024 / 1024 / elapsed,
+    }
+
+async def bench_failover(app: App, args) -> Dict[str, float]:
+    """
+    AI call latency when the primary provider has a slow tail (3% of calls
+    20x slower) or fails outright, called directly and through the router.
+    """
+    from benchmarks.fakes import StubProvider
+    from services.ai.router import ProviderRouter, Route
+
+    calls = max(int(400 * args.scale), 50)
+    latency = args.ai_latency
+
+    def stub(name: str, **kwargs) -> StubProvider:
+        return StubProvider(latency, max_concurrency=8, name=name, **kwargs)
+
+    def router(primary: StubProvider, backup: StubProvider) -> ProviderRouter:
+        return ProviderRouter([Route(primary, timeout=latency * 40), Route(backup, timeout=latency * 40)],
+                              default_hedge_delay=latency * 2, min_hedge_delay=0.0)
+
+    async def measure(provider) -> Dict[str, float]:
+        latencies = []
+        slots = asyncio.Semaphore(8)
+
+        async def call(i: int) -> None:
+            async with slots:
+                started = time.perf_counter()
+                await provider.generate_summary([f"line {i}"], "Summarize.")
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(call(i) for i in range(calls)))
+        return percentiles(latencies)
+
+    degraded = dict(tail_ratio=0.03, tail_latency=latency * 20, seed=7)
+    result: Dict[str, float] = {"calls": calls}
+    result.update({f"direct_{k}_ms": v for k, v in (await measure(stub("primary", **degraded))).items()})
+
+    backup = stub("backup")
+    result.update({f"hedged_{k}_ms": v for k, v in
+                   (await measure(router(stub("primary", **degraded), backup))).items()})
+    result["hedged_backup_calls"] = backup.calls
+
+    primary = stub("primary", failure_ratio=1.0)
+    result.update({f"outage_{k}_ms": v for k, v in (await measure(router(primary, stub("backup")))).items()})
+    result["outage_primary_calls"] = primary.calls
+    return result
+
+async def bench_search(app: App, args) -> Dict[str, float]:
+    """
+    Full-text search latency on a large table, through the index and as the
+    LIKE scan it replaces. The stub traffic has a 20-word vocabulary, so
+    "common" matches nearly every message; real searches are closer to
+    "rare" (0.2% of messages) or "absent", which a scan reads the whole
+    thread for.
+    """
+    import random
+    from benchmarks.fakes import FakeThread, TrafficGenerator
+
+    count = int(500000 * args.scale)
+    threads = [FakeThread(800_000_000_000_005_000 + i, f"search-{i}") for i in range(10)]
+    generator = TrafficGenerator(seed=8)
+    rare = random.Random(8)
+    now = datetime.utcnow()
+    per_thread = count // len(threads)
+    for i, thread in enumerate(threads):
+        await app.add_thread(thread.id, thread.name)
+        rows = [
+            app.db.message_row(thread_id=thread.id, author=str(m.author),
+                               content=m.content + (" Desync after respawn." if rare.random() < 0.002 else ""),
+                               created_at=m.created_at.replace(tzinfo=None), discord_message_id=m.id)
+            for m in generator.messages(thread, per_thread, now - timedelta(days=30, seconds=-i),
+                                        timedelta(days=30) / max(per_thread, 1))
+        ]
+        for offset in range(0, len(rows), 5000):
+            app.db.insert_messages(rows[offset:offset + 5000])
+
+    queries = {"rare": "desync", "phrase": '"desync after respawn"', "absent": "refund", "common": "crash"}
+    indexed_backend = app.db.search_backend
+    result: Dict[str, float] = {"rows": per_thread * len(threads)}
+    for mode, backend in (("index", indexed_backend), ("scan", None)):
+        app.db.search_backend = backend
+        for name, query in queries.items():
+            latencies = []
+            for run in range(10):
+                started = time.perf_counter()
+                await app.async_db.search_messages(threads[run % len(threads)].id, query, limit=6)
+                latencies.append(time.perf_counter() - started)
+            result[f"{mode}_{name}_p50_ms"] = percentiles(latencies)["p50"]
+    app.db.search_backend = indexed_backend
+    return result
+
+async def bench_replay(app: App, args) -> Dict[str, float]:
+    """Replay a real log through on_message (needs --log)."""
+    from benchmarks.replay import replay_log
+    return await replay_log(app, args.log, args.speed, limit=args.limit)
+
+RUNNERS: Dict[str, Callable[[App, Any], Any]] = {
+    "ingest": bench_ingest,
+    "import": bench_import,
+    "summarize": bench_summarize,
+    "cleanup": bench_cleanup,
+    "migrate": bench_migrate,
+    "failover": bench_failover,
+    "search": bench_search,
+    "replay": bench_replay,
+}
+
+def git_revision() -> Dict[str, Any]:
+    """Current commit and whether the working tree has changes, if this is a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+async def run_suite(names, args, database_url: str) -> Dict[str, Any]:
+    from benchmarks.fakes import StubProvider
+
+    provider = StubProvider(latency=args.ai_latency, per_line_latency=args.ai_line_latency)
+    app = App(provider)
+    results: Dict[str, Any] = {}
+    try:
+        for name in names:
+            print(f"Running {name}...")
+            app.reset()
+            results[name] = await RUNNERS[name](app, args)
+    finally:
+        await app.async_db.close()
+
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_url.split(":", 1)[0],
+            "scale": args.scale,
+            "ai_latency": args.ai_latency,
+            "api_latency": args.api_latency,
+        },
+        "results": results,
+    }
+
+def print_results(report: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    """Print every metric, with the change against a baseline report if one is given."""
+    previous = (baseline or {}).get("results", {})
+    for name, metrics in report["results"].items():
+        print(f"\n{name}")
+        for metric, value in metrics.items():
+            line = f"  {metric:<28}{value:>14.2f}"
+            old = previous.get(name, {}).get(metric)
+            if old is not None:
+                change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+                line += f"{old:>14.2f}{change:>10}"
+            print(line)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the bot with synthetic Discord traffic.")
+    parser.add_argument("--only", help=f"Comma-separated benchmarks to run (default: all of {', '.join(BENCHMARKS[:-1])})")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for all data sizes (default: 1.0)")
+    parser.add_argument("--ai-latency", type=float, default=0.2, help="Stub AI seconds per call (default: 0.2)")
+    parser.add_argument("--ai-line-latency", type=float, default=0.0,
+                        help="Stub AI extra seconds per input line (default: 0)")
+    parser.add_argument("--api-latency", type=float, default=0.05,
+                        help="Fake Discord seconds per history page (default: 0.05)")
+    parser.add_argument("--log", help="Log to replay through on_message (enables the replay benchmark)")
+    parser.add_argument("--speed", type=float, default=0.0, help="Replay real-time multiplier; 0 = no pauses (default: 0)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many messages")
+    parser.add_argument("--url", help="Scratch database URL (default: a temporary SQLite file)")
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="Where to write the JSON results (default: benchmark-results.json)")
+    parser.add_argument("--compare", help="Earlier JSON results to show changes against")
+    args = parser.parse_args()
+
+    if args.only:
+        names = [name.strip() for name in args.only.split(",") if name.strip()]
+        unknown = [name for name in names if name not in RUNNERS]
+        if unknown:
+            parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    else:
+        names = [name for name in BENCHMARKS if name != "replay" or args.log]
+    if "replay" in names and not args.log:
+        parser.error("The replay benchmark needs --log")
+
+    database_url = prepare_environment(args.url)
+    report = asyncio.run(run_suite(names, args, database_url))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(report, baseline)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
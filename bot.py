@@ -2,13 +2,21 @@ import os
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands, tasks
-from openai import OpenAI
-from datetime import datetime
+from datetime import datetime, time, timezone
 
 from utils.logging_utils import log_message
 from utils.cleanup import MessageCleanup
 from config.database import db
-from permissions import is_privileged, DEV_ROLES, MOD_ROLES
+from config.async_database import async_db
+from services.ingestion import IngestionQueue
+from services.history_import import history_importer
+from services.reply_resolver import reply_resolver
+from services.thread_status import thread_status
+from services.digests import digest_times
+from services.metrics import (MetricsServer, ingestion_depth, ingestion_operations,
+                              instrument_discord_http, timed_event)
+from utils.thread_store import watched_threads
+from permissions import get_user_role
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,36 +24,61 @@ load_dotenv()
 # Get the tokens securely
 TOKEN = os.getenv("DISCORD_TOKEN")
 OPEN_API_KEY = os.getenv("OPENAI_KEY")
+# Serve Prometheus metrics on this local port (disabled when unset)
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# UTC hours at which default-window summaries are precomputed (empty disables)
+DIGEST_TIMES = digest_times(os.getenv("DIGEST_HOURS", "4"))
 
 # TARGET_THREAD_ID is no longer used since summaries are for any stored thread
 
-def get_user_role(member: discord.Member) -> str:
-    """Determine the highest priority role for a user."""
-    if any(role.name in DEV_ROLES for role in member.roles):
-        return "Dev"
-    if any(role.name in MOD_ROLES for role in member.roles):
-        return "Mod"
-    return None
-
 class FeedbackBot(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cleanup_manager = MessageCleanup()
+        self.ingestion = IngestionQueue(db)
+        self.metrics_server = MetricsServer()
+        ingestion_depth.set_function(lambda: self.ingestion.depth)
+        ingestion_operations.set_function(lambda: self.ingestion.stats)
+        instrument_discord_http(self)
     
     async def setup_hook(self):
         """Called when the bot is done preparing data"""
         print("Loading extensions...")
         await self.load_extension("commands.thread_commands")
         print("Extensions loaded!")
+        # Load watched threads so handlers can drop unwatched traffic in O(1)
+        count = await watched_threads.load()
+        print(f"Watching {count} threads")
+        # Start the write-behind ingestion queue before any messages arrive
+        self.ingestion.start()
+        if METRICS_PORT:
+            await self.metrics_server.start(int(METRICS_PORT), METRICS_HOST)
         # Sync slash commands with Discord
         await self.tree.sync()
         # Start the cleanup task after bot is ready
         self.message_cleanup_task.start()
+        if DIGEST_TIMES:
+            self.digest_task.start()
+        # Finish history imports that were interrupted by a restart
+        self.loop.create_task(self.resume_imports())
+
+    async def resume_imports(self):
+        """Resume interrupted thread history imports once the bot is ready"""
+        await self.wait_until_ready()
+        await history_importer.resume_incomplete(self)
     
-    @tasks.loop(hours=24)
+    async def close(self):
+        """Flush pending messages to the database before disconnecting"""
+        self.digest_task.cancel()
+        await self.ingestion.stop()
+        await self.metrics_server.stop()
+        await async_db.close()
+        await super().close()
+
+    @tasks.loop(hours=1)
     async def message_cleanup_task(self):
-        """Run daily cleanup of old messages"""
-        from datetime import timezone
+        """Run hourly cleanup of old messages, so each run only deletes a small batch"""
         print(f"Running scheduled message cleanup at {datetime.now(timezone.utc)}")
         await self.cleanup_manager.cleanup_old_messages()
     
@@ -54,6 +87,17 @@ class FeedbackBot(commands.Bot):
         """Wait until the bot is ready before starting the task"""
         await self.wait_until_ready()
 
+    @tasks.loop(time=DIGEST_TIMES or [time(hour=4, tzinfo=timezone.utc)])
+    async def digest_task(self):
+        """Precompute default-window summaries off-peak so !sum can answer them from the digest store"""
+        print(f"Running scheduled digests at {datetime.now(timezone.utc)}")
+        await self.get_cog("ThreadCommands").digest_scheduler.run()
+
+    @digest_task.before_loop
+    async def before_digests(self):
+        """Wait until the bot is ready before starting the task"""
+        await self.wait_until_ready()
+
 # --- BOT SETUP ---
 intents = discord.Intents.default()
 intents.message_content = True  # required to read messages
@@ -61,7 +105,6 @@ intents.guilds = True
 
 # Remove default help command
 bot = FeedbackBot(command_prefix="!", intents=intents, help_command=None)
-client = OpenAI(api_key=OPEN_API_KEY)
 
 # --- EVENTS ---
 @bot.event
@@ -76,74 +119,89 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    # Ignore command messages
+    # Commands run outside the timing so a long !sum does not count as message latency
     if message.content.startswith(bot.command_prefix):
         await bot.process_commands(message)
         return
 
-    # Only handle messages in the target thread
-    # Removed TARGET_THREAD_ID check to allow multiple threads
-    # if message.channel.id != TARGET_THREAD_ID:
-    #     return
+    await ingest_message(message)
+
+@timed_event(event="on_message")
+async def ingest_message(message):
+    """Queue a watched thread's message for the background writer."""
+    # Only handle messages in watched threads
+    if message.channel.id not in watched_threads:
+        return
 
     # Skip non-text messages
     if not message.content.strip():
         return
 
+    # Later replies to this message resolve from memory
+    reply_resolver.remember(message)
+
     # Detect if message is a reply
-    reply_to = None
-    if message.reference and message.reference.resolved:
-        reply_to = f"{message.reference.resolved.author} ({message.reference.resolved.created_at.strftime('%Y-%m-%d %H:%M:%S')})"
-    elif message.reference:
-        try:
-            ref = await message.channel.fetch_message(message.reference.message_id)
-            reply_to = f"{ref.author} ({ref.created_at.strftime('%Y-%m-%d %H:%M:%S')})"
-        except Exception:
-            pass
+    reply_to = await reply_resolver.label(message)
 
     # Get user's role if any
     role = get_user_role(message.author)
 
-    # Save to database
-    db.save_message(
+    # Queue for the background writer (waits if the queue is full)
+    await bot.ingestion.put(
         thread_id=message.channel.id,
         author=str(message.author),
         role=role,
         content=message.content.strip(),
         created_at=message.created_at,
         reply_to=reply_to,
+        discord_message_id=message.id,
     )
 
-    await bot.process_commands(message)
-
 @bot.event
+@timed_event
 async def on_message_delete(message):
     """Handle message deletion by removing the message from the database."""
+    # Only handle messages in watched threads
+    if message.channel.id not in watched_threads:
+        return
+
     # Skip bot's own messages
     if message.author == bot.user:
         return
-        
-    # Skip non-text messages
-    if not message.content.strip():
+
+    # Queue the delete behind any pending insert of the same message
+    await bot.ingestion.put_delete(message.id)
+    print(f"Deleted message from {message.author} in thread {message.channel.id}")
+
+@bot.event
+@timed_event
+async def on_raw_message_delete(payload):
+    """Handle deletion of messages that are no longer in discord.py's message cache."""
+    # Cached messages are handled by on_message_delete
+    if payload.cached_message is not None:
         return
-        
-    # Delete the message from the database
-    success = db.delete_message(
-        thread_id=message.channel.id,
-        author=str(message.author),
-        created_at=message.created_at
-    )
-    
-    if success:
-        print(f"Deleted message from {message.author} in thread {message.channel.id}")
+    if payload.channel_id not in watched_threads:
+        return
+
+    await bot.ingestion.put_delete(payload.message_id)
+
+@bot.event
+@timed_event
+async def on_raw_bulk_message_delete(payload):
+    """Handle bulk deletes (e.g. moderator purges), which never fire on_message_delete."""
+    if payload.channel_id not in watched_threads:
+        return
+
+    for message_id in payload.message_ids:
+        await bot.ingestion.put_delete(message_id)
 
 @bot.event
+@timed_event
 async def on_message_edit(before, after):
     """Handle message edits by updating the original message in the database."""
-    # Only track edits in the target thread
-    # Removed TARGET_THREAD_ID check to allow multiple threads
-    # if after.channel.id != TARGET_THREAD_ID:
-    #     return
+    # Only track edits in watched threads
+    if after.channel.id not in watched_threads:
+        return
 
     # Skip if the content didn't actually change
     if before.content.strip() == after.content.strip():
@@ -156,37 +214,54 @@ async def on_message_edit(before, after):
     # Get user's role if any
     role = get_user_role(after.author)
 
-    # Update the existing message in the database instead of creating a new one
-    # We need to find the message by matching author, original content, and timestamp
-    # Since we don't store message IDs, we can match by author and created_at timestamp
-    # This assumes no duplicate messages with same author and timestamp
-
-    try:
-        from models.database import Message
-        with db.Session() as session:
-            message = session.query(Message).filter(
-                Message.thread_id == after.channel.id,
-                Message.author == str(after.author),
-                Message.created_at == before.created_at
-            ).first()
-
-            if message:
-                message.content = after.content.strip()
-                message.edited = True
-                message.created_at = after.edited_at or after.created_at
-                session.commit()
-            else:
-                # If message not found, fallback to saving as new message
-                db.save_message(
-                    thread_id=after.channel.id,
-                    author=str(after.author),
-                    role=role,
-                    content=after.content.strip(),
-                    created_at=after.edited_at or after.created_at,
-                    edited=True,
-                )
-    except Exception as e:
-        print(f"Error updating edited message: {e}")
+    # Upsert by Discord message ID: updates the stored row in place, or
+    # stores the message if it was never recorded. created_at is kept so
+    # later edits and deletes still match.
+    await bot.ingestion.put(
+        thread_id=after.channel.id,
+        author=str(after.author),
+        role=role,
+        content=after.content.strip(),
+        created_at=after.created_at,
+        edited=True,
+        edited_at=after.edited_at or datetime.now(timezone.utc),
+        discord_message_id=after.id,
+    )
+
+@bot.event
+@timed_event
+async def on_raw_message_edit(payload):
+    """Handle edits of messages that are no longer in discord.py's message cache."""
+    # Cached messages are handled by on_message_edit
+    if payload.cached_message is not None:
+        return
+    if payload.channel_id not in watched_threads:
+        return
+
+    # Embed-only updates carry no content
+    content = payload.data.get("content")
+    if content is None or not content.strip():
+        return
+    if payload.data.get("author", {}).get("bot"):
+        return
+
+    edited_timestamp = payload.data.get("edited_timestamp")
+    edited_at = discord.utils.parse_time(edited_timestamp) if edited_timestamp else datetime.now(timezone.utc)
+
+    await bot.ingestion.put_edit(payload.message_id, content.strip(), edited_at)
+
+@bot.event
+@timed_event
+async def on_raw_thread_update(payload):
+    """Keep !listThreads statuses current when a watched thread is archived or reopened."""
+    thread_status.on_raw_update(payload)
+
+@bot.event
+@timed_event
+async def on_raw_thread_delete(payload):
+    """Mark deleted watched threads in the status cache."""
+    thread_status.on_raw_delete(payload)
 
 # --- RUN ---
-bot.run(TOKEN)
+if __name__ == "__main__":
+    bot.run(TOKEN)
@@ -1,26 +1,91 @@
 import discord
 from discord.ext import commands
 from permissions import can_manage_threads, is_privileged
-from utils.thread_store import save_thread, get_thread_by_name
+from utils.thread_store import save_thread, remove_thread, get_thread_by_name
 from utils.logging_utils import log_message
 from utils.migrate import migrate_log_to_db
 from utils.time_utils import parse_timeframe, format_timeframe
 from config.prompts import DEFAULT_PROMPT
-from config.database import db, Thread, Message
+from config.async_database import async_db
+from config.retention import retention_policy
 from services.summarizer import SummarizerService
+from services.ai.base import current_requester
+from services.token_index import token_index
+from services.summary_buckets import summary_buckets
+from services.transcript import COLLAPSE_DUPLICATES, read_chunks, read_collapsed
+from services.summary_cache import summary_cache
+from services.history_import import history_importer
+from services.thread_status import STATUS_ICONS, UNKNOWN, thread_status
+from services.digests import DEFAULT_TIMEFRAMES, DigestScheduler, digest_store
+from utils.streaming_reply import MESSAGE_LIMIT, StreamingReply, paginate, split_message
+from services.metrics import stats_summary
 import os
+import re
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
 from sqlalchemy.orm import Session
 
 # Initialize summarizer service
 summarizer = SummarizerService()
 
+# Characters kept free on each !listThreads page for its header and footer
+LIST_PAGE_RESERVE = 200
+
+# Matches shown per !search page (each entry is at most ~350 characters)
+SEARCH_PAGE_SIZE = 5
+SEARCH_TIMEFRAME_PATTERN = re.compile(r"\d+[hdw]", re.IGNORECASE)
+SEARCH_PAGE_PATTERN = re.compile(r"page:(\d+)", re.IGNORECASE)
+
+def split_search_args(text: str) -> Tuple[str, Optional[str], int]:
+    """Split !search arguments into the query, a trailing timeframe (e.g. 7d) and page:N."""
+    words = text.split()
+    timeframe, page = None, 1
+    while words:
+        page_match = SEARCH_PAGE_PATTERN.fullmatch(words[-1])
+        if page_match:
+            page = int(page_match.group(1))
+        elif timeframe is None and SEARCH_TIMEFRAME_PATTERN.fullmatch(words[-1]):
+            timeframe = words[-1]
+        else:
+            break
+        words.pop()
+    return " ".join(words), timeframe, page
+
+def search_entry(number: int, hit, guild_id: int, thread_id: int) -> str:
+    """One match in the !search output, with a link to the message when it is known."""
+    role = f" [{hit.role}]" if hit.role else ""
+    link = ""
+    if hit.discord_message_id:
+        link = f" · [jump](<https://discord.com/channels/{guild_id}/{thread_id}/{hit.discord_message_id}>)"
+    return f"**{number}.** {hit.author}{role} · {hit.created_at:%Y-%m-%d %H:%M} UTC{link}\n> {hit.snippet}\n"
+
+def thread_prompt(thread_info) -> str:
+    """The summary prompt for a thread: its description, if it has one, then DEFAULT_PROMPT."""
+    if thread_info.description:
+        return f"{thread_info.description}\n\n{DEFAULT_PROMPT}"
+    return DEFAULT_PROMPT
+
+def thread_entry(thread, icon: str) -> str:
+    """One thread's block in the !listThreads output."""
+    return (
+        f"{icon} **{thread.nickname}**\n"
+        f"  • ID: {thread.thread_id}\n"
+        f"  • Created by: {thread.created_by}\n"
+        f"  • Created at: {thread.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    )
+
 class ThreadCommands(commands.Cog):
     """Commands for managing feedback threads"""
 
     def __init__(self, bot):
         self.bot = bot
+        self.digest_scheduler = digest_scheduler
         print("Thread Commands cog initialized!")
 
+    async def cog_unload(self):
+        """Close pooled AI provider connections when the bot shuts down"""
+        await summarizer.close()
+
     @commands.command(name="commands")
     async def commands_list(self, ctx):
         """Show available commands"""
@@ -35,50 +100,120 @@ Show this help message
 !saveThread [thread_id] "nickname"
 Save a thread for monitoring
 
-!sum "nickname" [timeframe]
-Generate a summary for a stored thread
+!removeThread "nickname"
+Stop monitoring a thread and delete its stored messages
+
+!sum "nickname" [timeframe] [fresh]
+Generate a summary for a stored thread (fresh skips the precomputed digest)
 
-!listThreads
-Show all watched threads and their status
+!listThreads [page]
+Show watched threads and their status
+
+!search "nickname" query [timeframe] [page:N]
+Search a stored thread's messages ("exact phrase", -exclude, OR)
 
 !setDescription "nickname" "description"
 Set or update the description for a thread
 
+!setRetention "nickname" [days]
+Set how many days of messages to keep for a thread (omit days to use the default)
+
+!stats
+Show handler, queue, database, AI and Discord API timings
+
 🔐 All commands require Mod or Dev role"""
 
         await ctx.reply(commands_list)
 
     @commands.command(name="listThreads")
-    async def list_threads_command(self, ctx):
-        """Show all watched threads and their status"""
+    async def list_threads_command(self, ctx, page: int = 1):
+        """Show watched threads and their status, one message-sized page at a time"""
         if not is_privileged(ctx.author):
             return await ctx.reply("⚠️ Only Devs or Mods can use this command.")
 
         try:
-            threads = db.get_threads()
+            threads = await async_db.get_threads()
             if not threads:
                 return await ctx.reply("No threads are currently being watched.")
 
-            thread_list = ["📋 **Watched Threads:**\n"]
-            for thread in threads:
-                try:
-                    # Try to fetch the thread to check if it still exists
-                    channel = await ctx.guild.fetch_channel(thread.thread_id)
-                    status = "🟢" if channel and isinstance(channel, discord.Thread) else "🔴"
-                except (discord.NotFound, discord.Forbidden):
-                    status = "🔴"
-
-                thread_list.append(
-                    f"{status} **{thread.nickname}**\n"
-                    f"  • ID: {thread.thread_id}\n"
-                    f"  • Created by: {thread.created_by}\n"
-                    f"  • Created at: {thread.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                )
+            # Status icons are one character, so pages can be laid out before
+            # any status is known; only the requested page's threads are checked
+            pages = paginate([thread_entry(thread, STATUS_ICONS[UNKNOWN]) for thread in threads],
+                             MESSAGE_LIMIT - LIST_PAGE_RESERVE)
+            if not 1 <= page <= len(pages):
+                return await ctx.reply(f"❌ Page must be between 1 and {len(pages)}.")
+            start = sum(len(p) for p in pages[:page - 1])
+            page_threads = threads[start:start + len(pages[page - 1])]
+
+            statuses = await thread_status.statuses(ctx.guild, [thread.thread_id for thread in page_threads])
+            thread_list = [f"📋 **Watched Threads** (page {page}/{len(pages)}, {len(threads)} threads):\n"]
+            thread_list.extend(
+                thread_entry(thread, STATUS_ICONS[statuses[thread.thread_id]]) for thread in page_threads
+            )
+            thread_list.append("🟢 active · 🟡 archived · 🔴 deleted or no access · ⚪ unknown")
+            if page < len(pages):
+                thread_list.append(f"Next page: `!listThreads {page + 1}`")
 
             await ctx.reply("\n".join(thread_list))
         except Exception as e:
             await ctx.reply(f"❌ Error listing threads: {str(e)}")
 
+    @commands.command(name="search")
+    async def search_command(self, ctx, nickname: str, *, query: str = ""):
+        """
+        Search a stored thread's messages, best match first
+
+        Examples:
+        !search general-feedback crash              - All stored messages
+        !search general-feedback "boss fight" 3d    - Exact phrase, last 3 days
+        !search general-feedback lag -ping page:2   - Second page of results
+        """
+        if not is_privileged(ctx.author):
+            return await ctx.reply("⚠️ Only Devs or Mods can use this command.")
+
+        thread = await get_thread_by_name(nickname)
+        if not thread:
+            return await ctx.reply(f"❌ No thread found with nickname '{nickname}'.")
+
+        query, timeframe, page = split_search_args(query)
+        if page < 1:
+            return await ctx.reply("❌ Page must be 1 or more.")
+        start_date, end_date = parse_timeframe(timeframe) if timeframe else (None, None)
+        scope = format_timeframe(start_date, end_date) if timeframe else "all stored messages"
+
+        try:
+            # One extra row tells whether there is a next page without counting every match
+            hits = await async_db.search_messages(
+                thread.thread_id, query, start_date, end_date,
+                limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE
+            )
+        except ValueError as e:
+            return await ctx.reply(f"❌ {e} Example: `!search \"{nickname}\" crash`")
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return await ctx.reply(f"❌ Error searching messages: {str(e)}")
+
+        if not hits:
+            if page > 1:
+                return await ctx.reply(f"❌ No results on page {page}; try a lower page.")
+            return await ctx.reply(f"No messages in '{nickname}' match `{query}` ({scope}).")
+
+        first = (page - 1) * SEARCH_PAGE_SIZE + 1
+        results = [f"🔎 **Results for `{query}` in {nickname}** ({scope}, page {page}):\n"]
+        results.extend(
+            search_entry(number, hit, ctx.guild.id, thread.thread_id)
+            for number, hit in enumerate(hits[:SEARCH_PAGE_SIZE], start=first)
+        )
+        if len(hits) > SEARCH_PAGE_SIZE:
+            timeframe_arg = f" {timeframe}" if timeframe else ""
+            results.append(f"Next page: `!search \"{nickname}\" {query}{timeframe_arg} page:{page + 1}`")
+
+        # Snippets quote members' messages; never let them ping anyone
+        text = "\n".join(results)
+        while text:
+            head, text = split_message(text)
+            await ctx.reply(head, allowed_mentions=discord.AllowedMentions.none())
+
     @commands.command(name="saveThread")
     async def save_thread_command(self, ctx, thread_id: int, nickname: str):
         """Save a thread for monitoring"""
@@ -90,9 +225,10 @@ Set or update the description for a thread
             thread = await ctx.guild.fetch_channel(thread_id)
             if not thread or not isinstance(thread, discord.Thread):
                 return await ctx.reply("❌ Invalid thread ID or channel is not a thread.")
+            thread_status.update(thread)
             
             # Save the thread first
-            if not save_thread(thread_id, nickname, ctx.author):
+            if not await save_thread(thread_id, nickname, ctx.author):
                 return await ctx.reply(f"❌ A thread with nickname '{nickname}' already exists.")
             
             progress_msg = await ctx.reply("📥 Starting message import...")
@@ -108,150 +244,242 @@ Set or update the description for a thread
         except Exception as e:
             await ctx.reply(f"❌ Error saving thread: {str(e)}")
 
+    @commands.command(name="removeThread")
+    async def remove_thread_command(self, ctx, nickname: str):
+        """Stop monitoring a thread and delete everything stored for it."""
+        if not can_manage_threads(ctx.author):
+            return await ctx.reply("⚠️ Only Devs, Mods, or the server owner can remove threads.")
+
+        thread = await get_thread_by_name(nickname)
+        if not thread:
+            return await ctx.reply(f"❌ No thread found with nickname '{nickname}'.")
+
+        try:
+            if await remove_thread(thread.thread_id):
+                await ctx.reply(f"✅ Stopped monitoring '{nickname}' and deleted its stored messages.")
+            else:
+                await ctx.reply(f"❌ Thread '{nickname}' not found in database.")
+        except Exception as e:
+            await ctx.reply(f"❌ Error removing thread: {str(e)}")
+
     @commands.command(name="setDescription")
     async def set_description_command(self, ctx, nickname: str, *, description: str):
         """Set or update the description for a thread."""
         if not can_manage_threads(ctx.author):
             return await ctx.reply("⚠️ Only Devs, Mods, or the server owner can set thread descriptions.")
         
-        thread = get_thread_by_name(nickname)
+        thread = await get_thread_by_name(nickname)
         if not thread:
             return await ctx.reply(f"❌ No thread found with nickname '{nickname}'.")
         
         try:
-            with db.Session() as session:
-                db_thread = session.query(Thread).filter(Thread.thread_id == thread.thread_id).first()
-                if db_thread:
-                    db_thread.description = description
-                    session.commit()
-                    await ctx.reply(f"✅ Description updated for thread '{nickname}'.")
-                else:
-                    await ctx.reply(f"❌ Thread '{nickname}' not found in database.")
+            if await async_db.set_thread_description(thread.thread_id, description):
+                await ctx.reply(f"✅ Description updated for thread '{nickname}'.")
+            else:
+                await ctx.reply(f"❌ Thread '{nickname}' not found in database.")
         except Exception as e:
             await ctx.reply(f"❌ Error updating description: {str(e)}")
 
+    @commands.command(name="setRetention")
+    async def set_retention_command(self, ctx, nickname: str, days: int = None):
+        """Set or clear the number of days of messages kept for a thread."""
+        if not can_manage_threads(ctx.author):
+            return await ctx.reply("⚠️ Only Devs, Mods, or the server owner can set thread retention.")
+
+        if days is not None and days < 1:
+            return await ctx.reply("❌ Retention must be at least 1 day.")
+
+        thread = await get_thread_by_name(nickname)
+        if not thread:
+            return await ctx.reply(f"❌ No thread found with nickname '{nickname}'.")
+
+        try:
+            await async_db.set_thread_retention(thread.thread_id, days)
+            if days is None:
+                await ctx.reply(f"✅ Thread '{nickname}' now keeps the default {retention_policy.default_days} days of messages.")
+            else:
+                await ctx.reply(f"✅ Thread '{nickname}' now keeps {days} days of messages.")
+        except Exception as e:
+            await ctx.reply(f"❌ Error updating retention: {str(e)}")
+
+    @commands.command(name="stats")
+    async def stats_command(self, ctx):
+        """Show where the bot spends its time: handlers, queue, database, AI and Discord calls."""
+        if not is_privileged(ctx.author):
+            return await ctx.reply("⚠️ Only Devs or Mods can use this command.")
+
+        text = stats_summary()
+        while text:
+            head, text = split_message(text)
+            await ctx.reply(head)
+
     @commands.command(name="sum")
-    async def sum_command(self, ctx, nickname: str, timeframe: str = None):
+    async def sum_command(self, ctx, nickname: str, timeframe: str = None, option: str = None):
         """
         Generate a summary for a stored thread
         
         Examples:
-        !sum general-feedback      - Last 24 hours
-        !sum general-feedback 3d   - Last 3 days
-        !sum general-feedback 1w   - Last week
-        !sum general-feedback 30d  - Last 30 days
+        !sum general-feedback          - Last 24 hours
+        !sum general-feedback 3d       - Last 3 days
+        !sum general-feedback 1w       - Last week
+        !sum general-feedback 30d      - Last 30 days
+        !sum general-feedback 1w fresh - Last week, ignoring the precomputed digest
         """
         if not is_privileged(ctx.author):
             return await ctx.reply("⚠️ Only Devs or Mods can use this command.")
+
+        if timeframe and timeframe.lower() == "fresh" and option is None:
+            timeframe, option = None, timeframe
+        if option is not None and option.lower() != "fresh":
+            return await ctx.reply(f"❌ Unknown option '{option}'. Use `fresh` to skip the precomputed digest.")
         
-        thread = get_thread_by_name(nickname)
+        thread = await get_thread_by_name(nickname)
         if not thread:
             return await ctx.reply(f"❌ No thread found with nickname '{nickname}'.")
         
+        # Queue this moderator's AI calls fairly against other running summaries
+        current_requester.set(ctx.author.id)
+
+        reply = None
         try:
             start_date, end_date = parse_timeframe(timeframe)
-            await ctx.reply(f"🧠 Generating summary for {format_timeframe(start_date, end_date)}... please wait.")
             
             # Include thread description in the prompt if available
-            prompt = DEFAULT_PROMPT
-            if thread.description:
-                prompt = f"{thread.description}\n\n{prompt}"
-            
-            summary = await summarize_thread(thread, timeframe, prompt)
+            prompt = thread_prompt(thread)
+
+            # Default windows are precomputed off-peak; answer from the digest when there is one
+            if option is None:
+                digest = await digest_store.get(thread.thread_id, timeframe, prompt,
+                                                summarizer.settings.get("model", ""))
+                if digest is not None:
+                    return await send_digest(ctx, nickname, timeframe, digest)
             
-            # Split long summaries into multiple messages (Discord has a 2000 character limit)
+            # Stream the summary into the placeholder as it is generated; long
+            # summaries continue in new messages (Discord has a 2000 character limit)
             header = f"📋 **Summary ({format_timeframe(start_date, end_date)}):**\n"
-            max_length = 2000 - len(header)
-            
-            if len(summary) <= max_length:
-                await ctx.reply(f"{header}{summary}")
-            else:
-                # Send the header with the first part
-                await ctx.reply(f"{header}{summary[:max_length]}")
-                
-                # Send the rest in chunks
-                remaining = summary[max_length:]
-                chunk_size = 1990  # Leave some room for "..." prefix
-                
-                for i in range(0, len(remaining), chunk_size):
-                    chunk = remaining[i:i+chunk_size]
-                    await ctx.reply(f"...{chunk}")
+            reply = StreamingReply(ctx, header, empty_text="⚠️ The AI provider returned an empty summary.")
+            await reply.start(f"🧠 Generating summary for {format_timeframe(start_date, end_date)}... please wait.")
+            async for piece in stream_thread_summary(thread, timeframe, prompt):
+                await reply.write(piece)
+            await reply.finish()
         except Exception as e:
-            await ctx.reply(f"❌ Error generating summary: {str(e)}")
+            print(f"Error generating summary: {e}")
+            # Replaces the "please wait" placeholder, or follows a partial summary
+            error = f"❌ Error generating summary: {str(e)}"
+            if reply is not None:
+                await reply.fail(error)
+            else:
+                await ctx.reply(error)
+
+async def send_digest(ctx, nickname: str, timeframe: Optional[str], digest) -> None:
+    """Reply with a precomputed summary, saying when it was made and what it leaves out."""
+    start_date, end_date = parse_timeframe(timeframe)
+    header = (f"📋 **Summary ({format_timeframe(start_date, end_date)}, "
+              f"as of {digest.as_of:%Y-%m-%d %H:%M} UTC):**\n")
+    newer, _ = await token_index.window_stats(digest.thread_id, digest.as_of, datetime.utcnow())
+    footer = ""
+    if newer:
+        messages = "1 newer message is" if newer == 1 else f"{newer} newer messages are"
+        footer = (f"\n\n_{messages} not included; "
+                  f"`!sum \"{nickname}\" {timeframe or '24h'} fresh` for an up-to-date summary._")
+    reply = StreamingReply(ctx, header)
+    await reply.write(digest.summary + footer)
+    await reply.finish()
 
 async def summarize_thread(thread_info, timeframe=None, prompt=DEFAULT_PROMPT):
     """Generate a summary for the specified thread using configured AI provider."""
     try:
-        # Parse timeframe and get date range
-        start_date, end_date = parse_timeframe(timeframe)
-        
-        # Get messages for the thread within the timeframe
-        with db.Session() as session:
-            messages = session.query(Message).filter(
-                Message.thread_id == thread_info.thread_id,
-                Message.created_at >= start_date,
-                Message.created_at <= end_date
-            ).order_by(Message.created_at.asc()).all()
-
-            if not messages:
-                return f"No messages found in this thread for {format_timeframe(start_date, end_date)}."
-
-            # Format messages for the AI
-            formatted_messages = []
-            for msg in messages:
-                role_prefix = f"[{msg.role}] " if msg.role else ""
-                formatted_messages.append(f"{role_prefix}{msg.author}: {msg.content}")
-
-            # Generate summary using configured AI provider
-            return await summarizer.generate_summary(formatted_messages, prompt)
-
+        return await build_thread_summary(thread_info, timeframe, prompt)
     except Exception as e:
         print(f"Error generating summary: {e}")
         return f"Error generating summary: {str(e)}"
 
-async def import_thread_history(thread: discord.Thread, progress_message = None):
-    """Import all messages from a thread's history."""
-    from datetime import datetime, timedelta
-    retention_days = 30
-    cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
-    messages_imported = 0
+async def build_thread_summary(thread_info, timeframe=None, prompt=DEFAULT_PROMPT) -> str:
+    """Generate a complete summary for the specified thread. Raises on errors."""
+    return "".join([piece async for piece in stream_thread_summary(thread_info, timeframe, prompt)])
+
+async def stream_thread_summary(thread_info, timeframe=None, prompt=DEFAULT_PROMPT) -> AsyncIterator[str]:
+    """
+    Generate a summary for the specified thread, yielding text as the AI
+    provider produces it. Raises on errors.
+    """
+    # Parse timeframe and get date range
+    start_date, end_date = parse_timeframe(timeframe)
     
+    # Size the window from the token index before reading any rows
+    count, tokens = await token_index.window_stats(thread_info.thread_id, start_date, end_date)
+    if not count:
+        yield f"No messages found in this thread for {format_timeframe(start_date, end_date)}."
+        return
+
+    # Identical requests over an unchanged message set reuse the last result
+    cache_key = await summary_cache.make_key(
+        thread_info.thread_id, start_date, end_date, prompt, summarizer.settings.get("model", "")
+    )
+    cached = await summary_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    budget = summarizer.chunk_budget(prompt)
+    chunks = None
+    if COLLAPSE_DUPLICATES and tokens > budget:
+        # Repeats never reach the AI, so size the window by what is left after
+        # collapsing: it may fit one call, or the window limit, after all
+        chunks, tokens = await read_collapsed(thread_info.thread_id, start_date, end_date, budget)
+    summarizer.check_window_size(tokens)
+
+    if chunks is None:
+        chunk_sizes = await token_index.pack_window(thread_info.thread_id, start_date, end_date, budget)
+        if len(chunk_sizes) <= 1:
+            chunks = await read_chunks(thread_info.thread_id, start_date, end_date, budget, chunk_sizes)
+
+    if chunks is None or len(chunks) > 1:
+        # Too long for one call: reuse cached bucket summaries, only summarize
+        # buckets that are new or changed, and stream the final merge
+        partials = await summary_buckets.section_summaries(
+            thread_info.thread_id, start_date, end_date, prompt, summarizer
+        )
+        if partials is None:
+            yield f"No messages found in this thread for {format_timeframe(start_date, end_date)}."
+            return
+        pieces = summarizer.stream_merge(partials, prompt)
+    else:
+        # Generate summary using configured AI provider
+        pieces = summarizer.stream_chunks(chunks, prompt)
+
+    parts = []
+    async for piece in pieces:
+        parts.append(piece)
+        yield piece
+    # Provider failures raise, so only complete summaries get here
+    await summary_cache.put(cache_key, thread_info.thread_id, "".join(parts))
+
+async def import_thread_history(thread: discord.Thread, progress_message = None):
+    """Import a thread's history, resuming from its checkpoint if an earlier import was interrupted."""
+    async def report(count: int):
+        await progress_message.edit(content=f"📥 Importing messages... ({count} processed)")
+
     try:
-        async for msg in thread.history(limit=None, oldest_first=True):
-            if not msg.author.bot and msg.content.strip():
-                if msg.created_at < cutoff_date:
-                    continue  # Skip messages older than retention period
-                
-                reply_to = None
-                if msg.reference and msg.reference.resolved:
-                    reply_to = f"{msg.reference.resolved.author} ({msg.reference.resolved.created_at.strftime('%Y-%m-%d %H:%M:%S')})"
-                elif msg.reference:
-                    try:
-                        ref = await msg.channel.fetch_message(msg.reference.message_id)
-                        reply_to = f"{ref.author} ({ref.created_at.strftime('%Y-%m-%d %H:%M:%S')})"
-                    except Exception:
-                        pass
-                
-                success = db.save_message(
-                    thread_id=thread.id,
-                    author=str(msg.author),
-                    content=msg.content.strip(),
-                    created_at=msg.created_at,
-                    reply_to=reply_to
-                )
-                
-                if success:
-                    messages_imported += 1
-                    
-                    if progress_message and messages_imported % 100 == 0:
-                        await progress_message.edit(content=f"📥 Importing messages... ({messages_imported} processed)")
-        
-        return messages_imported
-            
+        return await history_importer.import_thread(thread, report if progress_message else None)
+    except discord.HTTPException:
+        raise
     except Exception as e:
         print(f"Database error during import: {e}")
         raise Exception("Database error during message import")
 
+# Precomputes the default-window summaries; run off-peak by FeedbackBot.digest_task
+digest_scheduler = DigestScheduler(
+    digest_store,
+    summarize=build_thread_summary,
+    prompt_for=thread_prompt,
+    model_for=lambda: summarizer.settings.get("model", ""),
+    timeframes=[timeframe.strip() for timeframe in
+                os.getenv("DIGEST_TIMEFRAMES", ",".join(DEFAULT_TIMEFRAMES)).split(",") if timeframe.strip()],
+    concurrency=int(os.getenv("DIGEST_CONCURRENCY", "2")),
+    stagger=float(os.getenv("DIGEST_STAGGER_SECONDS", "15")),
+)
+
 async def setup(bot):
     await bot.add_cog(ThreadCommands(bot))
     print("Thread Commands cog added!")
\ No newline at end of file
@@ -1,32 +1,59 @@
+import os
 from enum import Enum
 from typing import Dict, Any
 
 class AIProvider(Enum):
     """Available AI providers."""
     OPENAI = "openai"
-    ANTHROPIC = "anthropic"  # For future implementation
-    LOCAL_LLM = "local"      # For future implementation
+    ANTHROPIC = "anthropic"
+    LOCAL_LLM = "local"      # OpenAI-compatible or llama.cpp server (LOCAL_LLM_URL)
 
 # Default provider and model settings
-DEFAULT_PROVIDER = AIProvider.OPENAI
+DEFAULT_PROVIDER = AIProvider(os.getenv("AI_PROVIDER", AIProvider.OPENAI.value))
 DEFAULT_MODEL = "gpt-4"
 
+# Providers tried, in order, when the primary fails, times out or is slow
+# (comma-separated, e.g. "anthropic,local"; none when unset)
+FALLBACK_PROVIDERS = [AIProvider(name.strip()) for name in os.getenv("AI_FALLBACKS", "").split(",") if name.strip()]
+
+# Routing between the primary and fallbacks (see services/ai/router.py)
+ROUTER_SETTINGS: Dict[str, Any] = {
+    "hedge": os.getenv("AI_HEDGE", "true").lower() == "true",
+    "hedge_quantile": 0.95,      # Hedge calls slower than the provider's recent p95
+    "default_hedge_delay": float(os.getenv("AI_HEDGE_DELAY", "15")),  # Until there are enough samples
+    "min_hedge_delay": 1.0,
+    "max_hedges": 1,             # Extra providers one call may be sent to
+    "failure_threshold": int(os.getenv("AI_BREAKER_FAILURES", "3")),  # Consecutive failures that open the circuit
+    "cooldown": float(os.getenv("AI_BREAKER_COOLDOWN", "30")),        # Seconds before a provider is retried
+}
+
 # Provider-specific settings
 PROVIDER_SETTINGS: Dict[AIProvider, Dict[str, Any]] = {
     AIProvider.OPENAI: {
         "model": "gpt-4",
         "temperature": 0.7,
-        "max_tokens": 1000
+        "max_tokens": 1000,
+        "context_window": 8192,  # Prompt + transcript + completion tokens
+        "timeout": 60.0,         # Seconds per request
+        "max_concurrency": 4     # In-flight requests; further calls wait in a fair queue
     },
     AIProvider.ANTHROPIC: {
-        "model": "claude-2",
+        "model": os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest"),
         "temperature": 0.7,
-        "max_tokens": 1000
+        "max_tokens": 1000,
+        "context_window": 200000,
+        "timeout": 60.0,
+        "max_concurrency": 4
     },
     AIProvider.LOCAL_LLM: {
-        "model": "llama2",
+        "model": os.getenv("LOCAL_LLM_MODEL", "llama2"),
+        "api_style": os.getenv("LOCAL_LLM_API", "openai"),  # "openai" or "llamacpp"
         "temperature": 0.7,
-        "max_tokens": 1000
+        "max_tokens": 1000,
+        "context_window": int(os.getenv("LOCAL_LLM_CONTEXT", "4096")),
+        "timeout": 120.0,
+        # Match the server's parallel slots (llama.cpp --parallel)
+        "max_concurrency": int(os.getenv("LOCAL_LLM_SLOTS", "1"))
     }
 }
 
@@ -37,6 +64,13 @@ API_KEY_ENV_VARS = {
     AIProvider.LOCAL_LLM: None  # Local models don't need API keys
 }
 
+# Environment variable names for overriding the API endpoint (e.g. a local stub server)
+BASE_URL_ENV_VARS = {
+    AIProvider.OPENAI: "OPENAI_BASE_URL",
+    AIProvider.ANTHROPIC: "ANTHROPIC_BASE_URL",
+    AIProvider.LOCAL_LLM: "LOCAL_LLM_URL"
+}
+
 def get_provider_settings(provider: AIProvider) -> Dict[str, Any]:
     """Get settings for a specific provider."""
     return PROVIDER_SETTINGS.get(provider, {})
\ No newline at end of file
@@ -0,0 +1,365 @@
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from config.database import db, DatabaseConfig, Thread, Message, SummaryBucket, ImportCheckpoint, Digest
+from config.db_tuning import engine_options, install_sqlite_pragmas
+from config.search_index import SearchHit, search_hit, search_statement
+from services.metrics import instrument_engine, instrument_methods
+
+# Async driver used for each database backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_url(db_url: str) -> URL:
+    """Translate a sync database URL into the matching async driver URL."""
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+@instrument_methods("async")
+class AsyncDatabaseConfig:
+    """
+    Awaitable database operations on SQLAlchemy's AsyncEngine (aiosqlite / asyncpg).
+
+    Mirrors DatabaseConfig for use from coroutines, so queries never block
+    the event loop. It shares the schema, write listeners and ingestion
+    queue of the DatabaseConfig it wraps; multi-statement operations reuse
+    that class's implementations through AsyncSession.run_sync(). The sync
+    API stays available for utility scripts and worker threads.
+    """
+
+    def __init__(self, database: DatabaseConfig):
+        """
+        Args:
+            database: The sync DatabaseConfig for the same database
+        """
+        self.sync = database
+        self.engine = create_async_engine(
+            async_url(database.db_url),
+            **engine_options(database.db_url, database.performance_profile)
+        )
+        if database.performance_profile:
+            install_sqlite_pragmas(self.engine.sync_engine)
+        instrument_engine(self.engine.sync_engine)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    message_row = staticmethod(DatabaseConfig.message_row)
+
+    def add_write_listener(self, listener: Callable[[List[Tuple[str, Dict[str, Any]]]], None]) -> None:
+        """Register a write listener; see DatabaseConfig.add_write_listener."""
+        self.sync.add_write_listener(listener)
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        await self.engine.dispose()
+
+    # --- Threads ---
+
+    async def save_thread(self, thread_id: int, nickname: str, created_by: str,
+                          description: Optional[str] = None) -> bool:
+        """Save a thread to the database."""
+        try:
+            async with self.Session() as session:
+                session.add(Thread(
+                    thread_id=thread_id,
+                    nickname=nickname,
+                    description=description,
+                    created_by=created_by
+                ))
+                await session.commit()
+                return True
+        except IntegrityError:
+            return False
+
+    async def get_thread_by_name(self, nickname: str) -> Optional[Thread]:
+        """Get thread info by nickname."""
+        async with self.Session() as session:
+            return await session.scalar(select(Thread).where(Thread.nickname == nickname))
+
+    async def get_thread_by_id(self, thread_id: int) -> Optional[Thread]:
+        """Get thread info by ID."""
+        async with self.Session() as session:
+            return await session.get(Thread, thread_id)
+
+    async def get_thread_ids(self) -> List[int]:
+        """Get the IDs of all stored threads."""
+        async with self.Session() as session:
+            return list(await session.scalars(select(Thread.thread_id)))
+
+    async def get_threads(self) -> List[Thread]:
+        """Get all threads."""
+        async with self.Session() as session:
+            return list(await session.scalars(select(Thread).order_by(Thread.created_at.desc())))
+
+    async def delete_thread(self, thread_id: int) -> bool:
+        """Delete a thread and its stored messages."""
+        async with self.Session() as session:
+            result = None
+            for statement in DatabaseConfig.delete_thread_statements(thread_id):
+                result = await session.execute(statement)
+            await session.commit()
+            return result.rowcount > 0
+
+    async def set_thread_description(self, thread_id: int, description: Optional[str]) -> bool:
+        """Set or clear a thread's description."""
+        return await self._update_thread(thread_id, description=description)
+
+    async def set_thread_retention(self, thread_id: int, retention_days: Optional[int]) -> bool:
+        """Set or clear (None) a thread's retention override."""
+        return await self._update_thread(thread_id, retention_days=retention_days)
+
+    async def get_thread_retention(self) -> List[Tuple[int, Optional[int]]]:
+        """Get (thread_id, retention_days override) for every stored thread."""
+        async with self.Session() as session:
+            result = await session.execute(select(Thread.thread_id, Thread.retention_days))
+            return [tuple(row) for row in result]
+
+    async def _update_thread(self, thread_id: int, **values: Any) -> bool:
+        async with self.Session() as session:
+            result = await session.execute(update(Thread).where(Thread.thread_id == thread_id).values(**values))
+            await session.commit()
+            return result.rowcount > 0
+
+    # --- Message writes ---
+
+    async def save_message(self, thread_id: int, author: str, content: str,
+                           created_at: datetime, role: Optional[str] = None,
+                           reply_to: Optional[str] = None, edited: bool = False,
+                           discord_message_id: Optional[int] = None,
+                           edited_at: Optional[datetime] = None) -> bool:
+        """Save (upsert) a message; queued while the ingestion queue is running."""
+        return await self._submit("insert", self.message_row(
+            thread_id=thread_id,
+            author=author,
+            role=role,
+            content=content,
+            created_at=created_at,
+            reply_to=reply_to,
+            edited=edited,
+            discord_message_id=discord_message_id,
+            edited_at=edited_at
+        ))
+
+    async def update_message(self, discord_message_id: int, new_content: str, edited_at: datetime) -> bool:
+        """Update the content of a stored message, looked up by its Discord message ID."""
+        return await self._submit("edit", dict(
+            discord_message_id=discord_message_id,
+            content=new_content,
+            edited_at=edited_at
+        ))
+
+    async def delete_message(self, discord_message_id: int) -> bool:
+        """Delete a stored message by its Discord message ID."""
+        return await self._submit("delete", dict(discord_message_id=discord_message_id))
+
+    async def _submit(self, op: str, payload: Dict[str, Any]) -> bool:
+        queue = self.sync.ingestion_queue
+        if queue is not None and queue.running:
+            return await queue.submit(op, payload)
+        return await self.apply_message_ops([(op, payload)]) == 1
+
+    async def insert_messages(self, rows: List[dict]) -> int:
+        """Bulk upsert message rows in a single transaction."""
+        return await self.apply_message_ops([("insert", row) for row in rows])
+
+    async def apply_message_ops(self, ops: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Apply ("insert" | "edit" | "delete", payload) operations in one
+        transaction; see DatabaseConfig.apply_message_ops.
+
+        Token counting and write listeners run in a worker thread.
+        """
+        if not ops:
+            return 0
+        await asyncio.to_thread(DatabaseConfig.fill_token_counts, ops)
+        try:
+            async with self.Session() as session:
+                await session.run_sync(self.sync._apply_ops, ops)
+                await session.commit()
+        except Exception as e:
+            if len(ops) == 1:
+                print(f"Error applying message {ops[0][0]}: {e}")
+                return 0
+        else:
+            await asyncio.to_thread(self.sync._notify_write_listeners, ops)
+            return len(ops)
+
+        applied = 0
+        for op in ops:
+            applied += await self.apply_message_ops([op])
+        return applied
+
+    async def import_message_page(self, thread_id: int, rows: List[dict],
+                                  last_message_id: Optional[int], completed: bool = False) -> int:
+        """Bulk upsert a page of history and advance the import checkpoint in one transaction."""
+        ops = [("insert", row) for row in rows]
+        await asyncio.to_thread(DatabaseConfig.fill_token_counts, ops)
+        async with self.Session() as session:
+            await session.run_sync(self.sync._write_import_page, thread_id, ops, last_message_id, completed)
+            await session.commit()
+        if ops:
+            await asyncio.to_thread(self.sync._notify_write_listeners, ops)
+        return len(rows)
+
+    async def get_orphaned_thread_ids(self, cutoff: datetime) -> List[int]:
+        """Get the IDs of threads that are not stored but still have messages created before the cutoff."""
+        async with self.Session() as session:
+            return list(await session.scalars(DatabaseConfig.orphaned_thread_ids_statement(cutoff)))
+
+    async def delete_messages_before(self, thread_id: int, cutoff: datetime, limit: int) -> int:
+        """Delete up to `limit` of a thread's oldest messages created before the cutoff."""
+        async with self.Session() as session:
+            result = await session.execute(DatabaseConfig.expired_messages_statement(thread_id, cutoff, limit))
+            await session.commit()
+            return result.rowcount
+
+    # --- Message reads ---
+
+    async def get_messages(self, thread_id: int,
+                           start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None) -> List[Message]:
+        """Get messages for a thread with optional date filtering."""
+        async with self.Session() as session:
+            return list(await session.scalars(DatabaseConfig.window_statement(thread_id, start_date, end_date)))
+
+    async def stream_transcript_rows(self, thread_id: int,
+                                     start_date: Optional[datetime] = None,
+                                     end_date: Optional[datetime] = None,
+                                     batch_size: int = 1000) -> AsyncIterator[Tuple[Optional[str], str, str]]:
+        """Stream (role, author, content) tuples for a window, oldest first."""
+        stmt = DatabaseConfig.transcript_statement(
+            thread_id, start_date, end_date
+        ).execution_options(yield_per=batch_size)
+        async with self.Session() as session:
+            result = await session.stream(stmt)
+            async for row in result:
+                yield tuple(row)
+
+    async def search_messages(self, thread_id: int, query: str,
+                              start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None,
+                              limit: int = 10, offset: int = 0) -> List[SearchHit]:
+        """Full-text search of a thread's messages, best match first; see DatabaseConfig.search_messages."""
+        stmt = search_statement(self.sync.search_backend, thread_id, query, start_date, end_date, limit, offset)
+        async with self.Session() as session:
+            result = await session.execute(stmt)
+            return [search_hit(row) for row in result]
+
+    async def get_message_author(self, discord_message_id: int) -> Optional[Tuple[str, datetime]]:
+        """Get (author, created_at) of a stored message by its Discord message ID."""
+        async with self.Session() as session:
+            result = await session.execute(
+                select(Message.author, Message.created_at)
+                .where(Message.discord_message_id == discord_message_id)
+            )
+            row = result.first()
+            return tuple(row) if row else None
+
+    async def window_digest(self, thread_id: int, start_date: datetime, end_date: datetime) -> str:
+        """Digest of the exact set of messages in a window; see DatabaseConfig.window_digest."""
+        async with self.Session() as session:
+            return await session.run_sync(self.sync._window_digest, thread_id, start_date, end_date)
+
+    # --- History imports ---
+
+    async def get_import_checkpoint(self, thread_id: int) -> Optional[ImportCheckpoint]:
+        """Get a thread's history import progress, if an import was ever started."""
+        async with self.Session() as session:
+            return await session.get(ImportCheckpoint, thread_id)
+
+    async def get_incomplete_imports(self) -> List[int]:
+        """Get the IDs of threads whose history import has not finished."""
+        async with self.Session() as session:
+            return list(await session.scalars(
+                select(ImportCheckpoint.thread_id).where(ImportCheckpoint.completed.is_(False))
+            ))
+
+    # --- Summary caches ---
+
+    async def get_clean_summary_buckets(self, thread_id: int, prompt_hash: str,
+                                        bucket_starts: List[datetime]) -> Dict[datetime, Tuple[datetime, str]]:
+        """Get cached summaries that are still valid, as {bucket start: (bucket end, summary)}."""
+        if not bucket_starts:
+            return {}
+        async with self.Session() as session:
+            result = await session.execute(
+                DatabaseConfig.clean_buckets_statement(thread_id, prompt_hash, bucket_starts)
+            )
+            return {bucket_start: (bucket_end, summary) for bucket_start, bucket_end, summary in result}
+
+    async def save_summary_bucket(self, thread_id: int, bucket_start: datetime, bucket_end: datetime,
+                                  prompt_hash: str, summary: str, message_count: int) -> None:
+        """Store (or refresh) the summary of the buckets from bucket_start to bucket_end and mark it clean."""
+        async with self.Session() as session:
+            await session.run_sync(
+                DatabaseConfig._store_summary_bucket, thread_id, bucket_start, bucket_end, prompt_hash,
+                summary, message_count
+            )
+            await session.commit()
+
+    async def delete_summary_buckets_before(self, cutoff: datetime, thread_id: Optional[int] = None) -> int:
+        """Remove cached bucket summaries (of one thread, or all) that start before the cutoff."""
+        stmt = delete(SummaryBucket).where(SummaryBucket.bucket_start < cutoff)
+        if thread_id is not None:
+            stmt = stmt.where(SummaryBucket.thread_id == thread_id)
+        async with self.Session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.rowcount
+
+    async def get_cached_summary(self, cache_key: str) -> Optional[str]:
+        """Get a cached summary and refresh its last-used time."""
+        async with self.Session() as session:
+            summary = await session.run_sync(DatabaseConfig._touch_cached_summary, cache_key)
+            await session.commit()
+            return summary
+
+    async def save_cached_summary(self, cache_key: str, thread_id: int, summary: str,
+                                  max_total_bytes: int) -> None:
+        """Store a summary and evict least recently used entries over the size limit."""
+        async with self.Session() as session:
+            await session.run_sync(
+                DatabaseConfig._store_cached_summary, cache_key, thread_id, summary, max_total_bytes
+            )
+            await session.commit()
+
+    # --- Digests ---
+
+    async def get_digest(self, thread_id: int, window_seconds: int) -> Optional[Digest]:
+        """Get a thread's precomputed summary of a window length, if one was made."""
+        async with self.Session() as session:
+            return await session.get(Digest, (thread_id, window_seconds))
+
+    async def save_digest(self, thread_id: int, window_seconds: int, prompt_hash: str, summary: str,
+                          as_of: datetime, activity: str) -> None:
+        """Store (or replace) a thread's precomputed summary of a window length."""
+        async with self.Session() as session:
+            await session.run_sync(
+                DatabaseConfig._store_digest, thread_id, window_seconds, prompt_hash, summary, as_of, activity
+            )
+            await session.commit()
+
+    async def touch_digest(self, thread_id: int, window_seconds: int, as_of: datetime) -> None:
+        """Move a digest's as_of forward when its window still holds the same messages."""
+        async with self.Session() as session:
+            await session.execute(DatabaseConfig.touch_digest_statement(thread_id, window_seconds, as_of))
+            await session.commit()
+
+    async def delete_digest(self, thread_id: int, window_seconds: int) -> None:
+        """Remove a thread's precomputed summary of a window length, if there is one."""
+        async with self.Session() as session:
+            await session.execute(DatabaseConfig.delete_digest_statement(thread_id, window_seconds))
+            await session.commit()
+
+# Global async database instance for coroutines, sharing the schema of `db`
+async_db = AsyncDatabaseConfig(db)
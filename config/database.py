@@ -1,22 +1,30 @@
+import hashlib
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, update, delete, select, func, and_, or_
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict, Any, Callable, Iterable, Iterator
 from datetime import datetime
 
-from models.database import Base, Thread, Message
+from models.database import Base, Thread, Message, SummaryBucket, CachedSummary, ImportCheckpoint, Digest
+from config.db_tuning import engine_options, install_sqlite_pragmas
+from config.search_index import SearchHit, install_search_index, search_hit, search_statement
+from services.metrics import instrument_engine, instrument_methods
+from utils.tokens import CHARS_PER_TOKEN, count_tokens
 
+@instrument_methods("sync")
 class DatabaseConfig:
     """Database configuration and operations."""
     
-    def __init__(self, db_url: Optional[str] = None):
+    def __init__(self, db_url: Optional[str] = None, performance_profile: bool = True):
         """
         Initialize database with optional custom connection URL.
         
         Args:
             db_url: Database URL. If not provided, uses DATABASE_URL from environment
                    or falls back to SQLite.
+            performance_profile: Apply the SQLite pragmas and PostgreSQL pool
+                   settings from config/db_tuning.py (disable to compare against defaults)
         """
         # Get database URL from environment or use default SQLite
         self.db_url = db_url or os.getenv(
@@ -25,15 +33,32 @@ class DatabaseConfig:
         )
         
         # Create engine and session factory
-        self.engine = create_engine(self.db_url, echo=False)
+        self.performance_profile = performance_profile
+        self.engine = create_engine(self.db_url, **engine_options(self.db_url, performance_profile))
+        if performance_profile:
+            install_sqlite_pragmas(self.engine)
+        instrument_engine(self.engine)
         self.Session = sessionmaker(bind=self.engine)
+
+        # Write-behind queue attached by the bot while it is running
+        self.ingestion_queue = None
+
+        # Callbacks notified with each committed batch of message operations
+        self._write_listeners: List[Callable[[List[Tuple[str, Dict[str, Any]]]], None]] = []
         
         # Ensure instance directory exists for SQLite
         if self.db_url.startswith("sqlite"):
             os.makedirs("instance", exist_ok=True)
         
-        # Create all tables
-        Base.metadata.create_all(self.engine)
+        # Create all tables. New SQLite files use incremental auto-vacuum so
+        # retention cleanup can return freed pages (it must be set before the
+        # first table is created; existing files are converted by migrate_db.py)
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == "sqlite":
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(conn)
+            # "fts5", "tsvector" or None (no index; search scans)
+            self.search_backend = install_search_index(conn)
 
     def save_thread(self, thread_id: int, nickname: str, created_by: str, description: Optional[str] = None) -> bool:
         """Save a thread to the database."""
@@ -61,46 +86,464 @@ class DatabaseConfig:
         with self.Session() as session:
             return session.query(Thread).filter(Thread.thread_id == thread_id).first()
 
+    def get_thread_ids(self) -> List[int]:
+        """Get the IDs of all stored threads."""
+        with self.Session() as session:
+            return [row[0] for row in session.query(Thread.thread_id).all()]
+
+    @staticmethod
+    def delete_thread_statements(thread_id: int) -> list:
+        """
+        Bulk DELETEs removing a thread and everything stored for it, children first.
+
+        Unlike an ORM cascade these never load the thread's messages.
+        """
+        children = (Message, SummaryBucket, CachedSummary, ImportCheckpoint, Digest)
+        return [delete(model).where(model.thread_id == thread_id) for model in children] + [
+            delete(Thread).where(Thread.thread_id == thread_id)
+        ]
+
+    def delete_thread(self, thread_id: int) -> bool:
+        """Delete a thread and its stored messages."""
+        with self.Session() as session:
+            result = None
+            for statement in self.delete_thread_statements(thread_id):
+                result = session.execute(statement)
+            session.commit()
+            return result.rowcount > 0
+
     def get_threads(self) -> List[Thread]:
         """Get all threads."""
         with self.Session() as session:
             return session.query(Thread).order_by(Thread.created_at.desc()).all()
 
+    def set_thread_description(self, thread_id: int, description: Optional[str]) -> bool:
+        """Set or clear a thread's description."""
+        with self.Session() as session:
+            result = session.execute(
+                update(Thread).where(Thread.thread_id == thread_id).values(description=description)
+            )
+            session.commit()
+            return result.rowcount > 0
+
+    def get_thread_retention(self) -> List[Tuple[int, Optional[int]]]:
+        """Get (thread_id, retention_days override) for every stored thread."""
+        with self.Session() as session:
+            return [tuple(row) for row in session.execute(select(Thread.thread_id, Thread.retention_days))]
+
+    def set_thread_retention(self, thread_id: int, retention_days: Optional[int]) -> bool:
+        """Set or clear (None) a thread's retention override."""
+        with self.Session() as session:
+            result = session.execute(
+                update(Thread).where(Thread.thread_id == thread_id).values(retention_days=retention_days)
+            )
+            session.commit()
+            return result.rowcount > 0
+
+    def delete_messages_before(self, thread_id: int, cutoff: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` of a thread's oldest messages created before the cutoff.
+
+        Kept small so each transaction holds the write lock only briefly.
+        Both the inner SELECT and the DELETE use indexes (idx_thread_created_at
+        and the primary key).
+
+        Returns:
+            int: Number of messages deleted
+        """
+        with self.Session() as session:
+            result = session.execute(self.expired_messages_statement(thread_id, cutoff, limit))
+            session.commit()
+            return result.rowcount
+
+    def get_orphaned_thread_ids(self, cutoff: datetime) -> List[int]:
+        """Get the IDs of threads that are not stored but still have messages created before the cutoff."""
+        with self.Session() as session:
+            return list(session.scalars(self.orphaned_thread_ids_statement(cutoff)))
+
+    @staticmethod
+    def orphaned_thread_ids_statement(cutoff: datetime):
+        """
+        SELECT of thread IDs with messages created before the cutoff but no
+        row in `threads` (e.g. traffic from channels that were never, or are
+        no longer, watched). Reads idx_created_at below the cutoff only.
+        """
+        return (
+            select(Message.thread_id)
+            .where(Message.created_at < cutoff, Message.thread_id.not_in(select(Thread.thread_id)))
+            .distinct()
+        )
+
+    @staticmethod
+    def expired_messages_statement(thread_id: int, cutoff: datetime, limit: int):
+        """DELETE of up to `limit` of a thread's oldest messages created before the cutoff."""
+        oldest = (
+            select(Message.id)
+            .where(Message.thread_id == thread_id, Message.created_at < cutoff)
+            .order_by(Message.created_at.asc())
+            .limit(limit)
+        )
+        return delete(Message).where(Message.id.in_(oldest))
+
+    def reclaim_space(self, max_pages: int) -> Optional[int]:
+        """
+        Return up to max_pages free pages to the filesystem (SQLite incremental vacuum).
+
+        Returns:
+            int: Free pages remaining, or None if the database does not support it
+        """
+        if self.engine.dialect.name != "sqlite":
+            return None  # PostgreSQL's autovacuum reuses freed space on its own
+        with self.engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                return None
+            # A plain execute() frees only one page per step; executescript()
+            # runs the pragma to completion
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+            return conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    @staticmethod
+    def message_row(thread_id: int, author: str, content: str,
+                    created_at: datetime, role: Optional[str] = None,
+                    reply_to: Optional[str] = None, edited: bool = False,
+                    discord_message_id: Optional[int] = None,
+                    edited_at: Optional[datetime] = None,
+                    token_count: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Build a complete messages row; bulk inserts need every row to have the same keys.
+
+        token_count is filled in by the writer (off the event loop) when left as None.
+        """
+        return dict(
+            discord_message_id=discord_message_id,
+            thread_id=thread_id,
+            author=author,
+            role=role,
+            content=content,
+            created_at=created_at,
+            reply_to=reply_to,
+            edited=edited,
+            edited_at=edited_at,
+            token_count=token_count
+        )
+
+    def add_write_listener(self, listener: Callable[[List[Tuple[str, Dict[str, Any]]]], None]) -> None:
+        """
+        Register a callback invoked with every committed batch of message
+        operations. Listeners run in the writer thread and must be thread-safe.
+
+        Edit and delete payloads carry "matched" (whether a stored row was
+        affected) and, when matched, that row's thread_id and created_at.
+
+        Writes whose rows are not kept around (e.g. a streamed import) are
+        reported as ("invalidate", {"thread_id": ..., "hours": [...]}): some
+        messages of the thread created in those hours (truncated to the
+        hour) changed, and anything cached about them must be dropped.
+        """
+        self._write_listeners.append(listener)
+
+    def _notify_write_listeners(self, ops: List[Tuple[str, Dict[str, Any]]]) -> None:
+        for listener in self._write_listeners:
+            try:
+                listener(ops)
+            except Exception as e:
+                print(f"Error in message write listener: {e}")
+
+    def _submit(self, op: str, payload: Dict[str, Any]) -> bool:
+        """Hand an operation to the ingestion queue if it is running, else apply it now."""
+        queue = self.ingestion_queue
+        if queue is not None and queue.running:
+            return queue.submit_nowait(op, payload)
+        return self.apply_message_ops([(op, payload)]) == 1
+
     def save_message(self, thread_id: int, author: str, content: str,
                     created_at: datetime, role: Optional[str] = None,
-                    reply_to: Optional[str] = None, edited: bool = False) -> bool:
-        """Save a message to the database."""
-        try:
-            with self.Session() as session:
-                message = Message(
-                    thread_id=thread_id,
-                    author=author,
-                    role=role,
-                    content=content,
-                    created_at=created_at,
-                    reply_to=reply_to,
-                    edited=edited
-                )
-                session.add(message)
-                session.commit()
-                return True
-        except Exception:
-            return False
+                    reply_to: Optional[str] = None, edited: bool = False,
+                    discord_message_id: Optional[int] = None,
+                    edited_at: Optional[datetime] = None) -> bool:
+        """
+        Save (upsert) a message to the database.
+
+        While the bot's ingestion queue is running this only enqueues the row
+        and the background writer inserts it in a batch. Otherwise (utility
+        scripts, tests) the row is written immediately.
+        """
+        row = self.message_row(
+            thread_id=thread_id,
+            author=author,
+            role=role,
+            content=content,
+            created_at=created_at,
+            reply_to=reply_to,
+            edited=edited,
+            discord_message_id=discord_message_id,
+            edited_at=edited_at
+        )
+        return self._submit("insert", row)
+
+    def update_message(self, discord_message_id: int, new_content: str, edited_at: datetime) -> bool:
+        """
+        Update the content of an existing message, looked up by its Discord message ID.
+
+        The original created_at is kept so later edits and deletes still match.
+        """
+        return self._submit("edit", dict(
+            discord_message_id=discord_message_id,
+            content=new_content,
+            edited_at=edited_at
+        ))
+
+    def delete_message(self, discord_message_id: int) -> bool:
+        """
+        Delete a message from the database by its Discord message ID.
+
+        Returns False only if the delete could not be queued or applied.
+        """
+        return self._submit("delete", dict(discord_message_id=discord_message_id))
+
+    def insert_messages(self, rows: List[dict]) -> int:
+        """
+        Bulk upsert message rows in a single transaction.
+
+        Returns:
+            int: Number of rows written
+        """
+        return self.apply_message_ops([("insert", row) for row in rows])
+
+    def insert_message_stream(self, batches: Iterable[List[dict]], single_transaction: bool = True,
+                              on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Bulk upsert an arbitrarily long stream of message_row() batches.
+
+        Only the current batch is held in memory. With single_transaction,
+        every batch is sent on one connection and committed once at the end,
+        so a failure leaves the table untouched. Otherwise each batch commits
+        on its own and on_batch reports progress that is already durable.
+
+        Args:
+            batches: Iterable of message_row() lists, consumed lazily
+            single_transaction: Commit once at the end instead of per batch
+            on_batch: Called with the size of each batch once it is written
+                (committed, unless single_transaction)
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            SQLAlchemyError: If a batch fails; with single_transaction nothing is kept
+        """
+        written = 0
+        # Hours written per thread inside the open transaction; listeners are
+        # told after the commit without keeping the rows themselves around
+        touched: Dict[int, set] = {}
+        with self.Session() as session:
+            for rows in batches:
+                ops = [("insert", row) for row in rows]
+                self._apply_ops(session, ops)
+                if single_transaction:
+                    for row in rows:
+                        touched.setdefault(row["thread_id"], set()).add(
+                            row["created_at"].replace(minute=0, second=0, microsecond=0)
+                        )
+                else:
+                    session.commit()
+                    self._notify_write_listeners(ops)
+                written += len(rows)
+                if on_batch:
+                    on_batch(len(rows))
+            session.commit()
+
+        if touched:
+            self._notify_write_listeners([
+                ("invalidate", {"thread_id": thread_id, "hours": sorted(hours)})
+                for thread_id, hours in sorted(touched.items())
+            ])
+        return written
+
+    def get_import_checkpoint(self, thread_id: int) -> Optional[ImportCheckpoint]:
+        """Get a thread's history import progress, if an import was ever started."""
+        with self.Session() as session:
+            return session.get(ImportCheckpoint, thread_id)
+
+    def get_incomplete_imports(self) -> List[int]:
+        """Get the IDs of threads whose history import has not finished."""
+        with self.Session() as session:
+            rows = session.execute(
+                select(ImportCheckpoint.thread_id).where(ImportCheckpoint.completed.is_(False))
+            )
+            return [thread_id for thread_id, in rows]
+
+    def import_message_page(self, thread_id: int, rows: List[dict],
+                            last_message_id: Optional[int], completed: bool = False) -> int:
+        """
+        Bulk upsert one page of imported history and advance the thread's
+        import checkpoint in the same transaction.
+
+        Because the rows and the checkpoint commit together, an import that
+        is interrupted resumes after the last page that was actually stored.
+
+        Args:
+            thread_id: Thread being imported
+            rows: message_row() dicts for the page (may be empty)
+            last_message_id: Newest Discord message ID processed, stored or skipped
+            completed: Mark the import as finished
+
+        Returns:
+            int: Number of rows written
+        """
+        ops = [("insert", row) for row in rows]
+        with self.Session() as session:
+            self._write_import_page(session, thread_id, ops, last_message_id, completed)
+            session.commit()
+        if ops:
+            self._notify_write_listeners(ops)
+        return len(rows)
+
+    def _write_import_page(self, session, thread_id: int, ops: List[Tuple[str, Dict[str, Any]]],
+                           last_message_id: Optional[int], completed: bool) -> None:
+        self._apply_ops(session, ops)
+        checkpoint = session.get(ImportCheckpoint, thread_id)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(thread_id=thread_id, imported_count=0)
+            session.add(checkpoint)
+        if last_message_id is not None:
+            checkpoint.last_message_id = last_message_id
+        checkpoint.imported_count = (checkpoint.imported_count or 0) + len(ops)
+        checkpoint.completed = completed
+        checkpoint.updated_at = datetime.utcnow()
+
+    def apply_message_ops(self, ops: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Apply queued ("insert" | "edit" | "delete", payload) operations in order,
+        in a single transaction.
+
+        Consecutive inserts are sent as one bulk upsert. If the batch fails as a
+        whole (e.g. one row violates a constraint), the operations are retried
+        individually so one bad row does not discard the rest.
 
-    def update_message(self, message_id: int, new_content: str, edited_at: datetime) -> bool:
-        """Update the content and edited timestamp of an existing message."""
+        Returns:
+            int: Number of operations applied
+        """
+        if not ops:
+            return 0
         try:
             with self.Session() as session:
-                message = session.query(Message).filter(Message.id == message_id).first()
-                if not message:
-                    return False
-                message.content = new_content
-                message.edited = True
-                message.created_at = edited_at  # Update timestamp to edited time
+                self._apply_ops(session, ops)
                 session.commit()
-                return True
-        except Exception:
-            return False
+        except Exception as e:
+            if len(ops) == 1:
+                print(f"Error applying message {ops[0][0]}: {e}")
+                return 0
+        else:
+            self._notify_write_listeners(ops)
+            return len(ops)
+
+        return sum(self.apply_message_ops([op]) for op in ops)
+
+    @staticmethod
+    def fill_token_counts(ops: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Count tokens for inserted and edited content that has no count yet (CPU work)."""
+        for op, payload in ops:
+            if op in ("insert", "edit") and payload.get("token_count") is None:
+                payload["token_count"] = count_tokens(payload["content"])
+
+    def _apply_ops(self, session, ops: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self.fill_token_counts(ops)
+        pending_rows = []
+        for op, payload in ops:
+            if op == "insert":
+                pending_rows.append(payload)
+                continue
+            if pending_rows:
+                self._execute_upsert(session, pending_rows)
+                pending_rows = []
+
+            stmt = self.message_op_statement(op, payload)
+
+            # Tell write listeners which thread and time the affected row belonged to
+            row = session.execute(stmt.returning(Message.thread_id, Message.created_at)).first()
+            payload["matched"] = row is not None
+            if row:
+                payload["thread_id"], payload["created_at"] = row
+
+        if pending_rows:
+            self._execute_upsert(session, pending_rows)
+
+        # Stale cached bucket summaries are flagged in the same transaction
+        touched = {
+            (payload["thread_id"], payload["created_at"].replace(minute=0, second=0, microsecond=0))
+            for op, payload in ops if op == "insert" or payload["matched"]
+        }
+        for statement in self.dirty_buckets_statements(touched):
+            session.execute(statement)
+
+    @staticmethod
+    def message_op_statement(op: str, payload: Dict[str, Any]):
+        """UPDATE ("edit") or DELETE ("delete") of one stored message by its Discord message ID."""
+        if op == "edit":
+            return (
+                update(Message)
+                .where(Message.discord_message_id == payload["discord_message_id"])
+                .values(
+                    content=payload["content"],
+                    edited=True,
+                    edited_at=payload["edited_at"],
+                    token_count=payload["token_count"]
+                )
+            )
+        if op == "delete":
+            return delete(Message).where(Message.discord_message_id == payload["discord_message_id"])
+        raise ValueError(f"Unknown message operation: {op}")
+
+    def _execute_upsert(self, session, rows: List[dict]) -> None:
+        # Core executemany on the session's connection: the ORM bulk path
+        # splits rows by which values are None and can fall back to one
+        # statement per row
+        session.connection().execute(self._upsert_statement(), rows)
+
+    def _upsert_statement(self):
+        """
+        INSERT that updates the existing row when the Discord message ID is
+        already stored, so re-imports and edit-before-insert races are idempotent.
+        """
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            return insert(Message)
+
+        stmt = dialect_insert(Message)
+        return stmt.on_conflict_do_update(
+            index_elements=[Message.discord_message_id],
+            set_={
+                "content": stmt.excluded.content,
+                "role": stmt.excluded.role,
+                "edited": stmt.excluded.edited,
+                "edited_at": stmt.excluded.edited_at,
+                "token_count": stmt.excluded.token_count,
+            }
+        )
+
+    @staticmethod
+    def window_statement(thread_id: int,
+                         start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         columns: Optional[tuple] = None):
+        """
+        SELECT for a thread's messages in a time window, oldest first.
+
+        Selects full Message rows unless `columns` is given. Served entirely
+        by idx_thread_created_at (no scan, no sort); the query-plan check in
+        utils/query_plans.py guards this.
+        """
+        stmt = select(*(columns or (Message,))).where(Message.thread_id == thread_id)
+        if start_date:
+            stmt = stmt.where(Message.created_at >= start_date)
+        if end_date:
+            stmt = stmt.where(Message.created_at <= end_date)
+        return stmt.order_by(Message.created_at.asc())
 
     def get_messages(self, thread_id: int,
                     start_date: Optional[datetime] = None,
@@ -110,36 +553,273 @@ class DatabaseConfig:
         Returns a list of Message objects.
         """
         with self.Session() as session:
-            query = session.query(Message).filter(Message.thread_id == thread_id)
+            return list(session.scalars(self.window_statement(thread_id, start_date, end_date)))
 
-            if start_date:
-                query = query.filter(Message.created_at >= start_date)
-            if end_date:
-                query = query.filter(Message.created_at <= end_date)
+    def iter_transcript_rows(self, thread_id: int,
+                             start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None,
+                             batch_size: int = 1000,
+                             token_counts: bool = False) -> Iterator[Tuple[Any, ...]]:
+        """
+        Stream (role, author, content) tuples for a window, oldest first.
 
-            return query.order_by(Message.created_at.asc()).all()
-            
-    def delete_message(self, thread_id: int, author: str, created_at: datetime) -> bool:
+        Only the columns the transcript needs are selected and no ORM objects
+        are built. Rows are fetched batch_size at a time (a server-side cursor
+        on PostgreSQL), so memory does not grow with the window. Blocking;
+        consume it from a worker thread.
+
+        With token_counts=True each tuple also carries the message's stored
+        token count (estimated from its length for rows from before token
+        counting).
         """
-        Delete a message from the database by matching thread_id, author, and created_at.
-        Returns True if a message was deleted, False otherwise.
+        stmt = self.transcript_statement(thread_id, start_date, end_date, token_counts)
+        with self.Session() as session:
+            result = session.execute(stmt, execution_options={"yield_per": batch_size})
+            for row in result:
+                yield tuple(row)
+
+    @staticmethod
+    def transcript_statement(thread_id: int,
+                             start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None,
+                             token_counts: bool = False):
+        """SELECT of the transcript columns of a window; see iter_transcript_rows."""
+        columns = (Message.role, Message.author, Message.content)
+        if token_counts:
+            columns += (func.coalesce(Message.token_count, func.length(Message.content) / CHARS_PER_TOKEN + 1),)
+        return DatabaseConfig.window_statement(thread_id, start_date, end_date, columns=columns)
+
+    def search_messages(self, thread_id: int, query: str,
+                        start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None,
+                        limit: int = 10, offset: int = 0) -> List[SearchHit]:
         """
-        try:
-            with self.Session() as session:
-                message = session.query(Message).filter(
-                    Message.thread_id == thread_id,
-                    Message.author == author,
-                    Message.created_at == created_at
-                ).first()
-                
-                if message:
-                    session.delete(message)
-                    session.commit()
-                    return True
-                return False
-        except Exception as e:
-            print(f"Error deleting message: {e}")
-            return False
+        Full-text search of a thread's messages, best match first.
+
+        Served by the FTS5 table (SQLite) or the GIN-indexed tsvector column
+        (PostgreSQL) from config/search_index.py.
+
+        Args:
+            query: Words, "phrases", -excluded words and OR (see parse_query)
+            limit: Page size
+            offset: Matches to skip
+
+        Raises:
+            ValueError: If the query has no words to look for
+        """
+        stmt = search_statement(self.search_backend, thread_id, query, start_date, end_date, limit, offset)
+        with self.Session() as session:
+            return [search_hit(row) for row in session.execute(stmt)]
+
+    def get_message_author(self, discord_message_id: int) -> Optional[Tuple[str, datetime]]:
+        """Get (author, created_at) of a stored message by its Discord message ID."""
+        with self.Session() as session:
+            row = session.execute(
+                select(Message.author, Message.created_at)
+                .where(Message.discord_message_id == discord_message_id)
+            ).first()
+            return tuple(row) if row else None
+
+    def get_clean_summary_buckets(self, thread_id: int, prompt_hash: str,
+                                  bucket_starts: List[datetime]) -> Dict[datetime, Tuple[datetime, str]]:
+        """Get cached summaries that are still valid, as {bucket start: (bucket end, summary)}."""
+        if not bucket_starts:
+            return {}
+        with self.Session() as session:
+            rows = session.execute(self.clean_buckets_statement(thread_id, prompt_hash, bucket_starts))
+            return {bucket_start: (bucket_end, summary) for bucket_start, bucket_end, summary in rows}
+
+    @staticmethod
+    def clean_buckets_statement(thread_id: int, prompt_hash: str, bucket_starts: List[datetime]):
+        return select(SummaryBucket.bucket_start, SummaryBucket.bucket_end, SummaryBucket.summary).where(
+            SummaryBucket.thread_id == thread_id,
+            SummaryBucket.prompt_hash == prompt_hash,
+            SummaryBucket.bucket_start.in_(bucket_starts),
+            # Rows from before ranges were stored cannot be dirtied reliably
+            SummaryBucket.bucket_end.is_not(None),
+            SummaryBucket.dirty.is_(False)
+        )
+
+    def save_summary_bucket(self, thread_id: int, bucket_start: datetime, bucket_end: datetime,
+                            prompt_hash: str, summary: str, message_count: int) -> None:
+        """Store (or refresh) the summary of the buckets from bucket_start to bucket_end and mark it clean."""
+        with self.Session() as session:
+            self._store_summary_bucket(session, thread_id, bucket_start, bucket_end, prompt_hash,
+                                       summary, message_count)
+            session.commit()
+
+    @staticmethod
+    def _store_summary_bucket(session, thread_id: int, bucket_start: datetime, bucket_end: datetime,
+                              prompt_hash: str, summary: str, message_count: int) -> None:
+        bucket = session.query(SummaryBucket).filter(
+            SummaryBucket.thread_id == thread_id,
+            SummaryBucket.bucket_start == bucket_start,
+            SummaryBucket.prompt_hash == prompt_hash
+        ).first()
+        if bucket is None:
+            bucket = SummaryBucket(thread_id=thread_id, bucket_start=bucket_start, prompt_hash=prompt_hash)
+            session.add(bucket)
+        bucket.bucket_end = bucket_end
+        bucket.summary = summary
+        bucket.message_count = message_count
+        bucket.dirty = False
+        bucket.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def dirty_buckets_statements(hours: Iterable[Tuple[int, datetime]]) -> list:
+        """
+        One UPDATE per thread flagging the cached summaries whose bucket range
+        contains any of the given (thread_id, hour) pairs. Ranges start and
+        end on whole hours, so the hour a message was created in is enough.
+        """
+        by_thread: Dict[int, set] = {}
+        for thread_id, hour in hours:
+            by_thread.setdefault(thread_id, set()).add(hour)
+        return [
+            update(SummaryBucket)
+            .where(
+                SummaryBucket.thread_id == thread_id,
+                or_(*(and_(SummaryBucket.bucket_start <= hour, SummaryBucket.bucket_end > hour)
+                      for hour in sorted(thread_hours)))
+            )
+            .values(dirty=True)
+            for thread_id, thread_hours in sorted(by_thread.items())
+        ]
+
+    def delete_summary_buckets_before(self, cutoff: datetime, thread_id: Optional[int] = None) -> int:
+        """Remove cached bucket summaries (of one thread, or all) that start before the cutoff."""
+        stmt = delete(SummaryBucket).where(SummaryBucket.bucket_start < cutoff)
+        if thread_id is not None:
+            stmt = stmt.where(SummaryBucket.thread_id == thread_id)
+        with self.Session() as session:
+            result = session.execute(stmt)
+            session.commit()
+            return result.rowcount
+
+    def window_digest(self, thread_id: int, start_date: datetime, end_date: datetime) -> str:
+        """
+        Digest of the exact set of messages in a window, including edit versions.
+        Any insert, edit or delete inside the window changes it.
+        """
+        with self.Session() as session:
+            return self._window_digest(session, thread_id, start_date, end_date)
+
+    @staticmethod
+    def window_digest_statement(thread_id: int, start_date: datetime, end_date: datetime):
+        """SELECT of the row IDs, Discord IDs and edit times window_digest() hashes."""
+        return DatabaseConfig.window_statement(
+            thread_id, start_date, end_date,
+            columns=(Message.id, Message.discord_message_id, Message.edited_at)
+        )
+
+    @staticmethod
+    def _window_digest(session, thread_id: int, start_date: datetime, end_date: datetime) -> str:
+        digest = hashlib.sha256()
+        rows = session.execute(DatabaseConfig.window_digest_statement(thread_id, start_date, end_date))
+        for row_id, discord_message_id, edited_at in rows:
+            digest.update(f"{row_id}:{discord_message_id}:{edited_at};".encode("ascii"))
+        return digest.hexdigest()
+
+    def get_cached_summary(self, cache_key: str) -> Optional[str]:
+        """Get a cached summary and refresh its last-used time."""
+        with self.Session() as session:
+            summary = self._touch_cached_summary(session, cache_key)
+            session.commit()
+            return summary
+
+    @staticmethod
+    def _touch_cached_summary(session, cache_key: str) -> Optional[str]:
+        entry = session.get(CachedSummary, cache_key)
+        if entry is None:
+            return None
+        entry.last_used_at = datetime.utcnow()
+        return entry.summary
+
+    def save_cached_summary(self, cache_key: str, thread_id: int, summary: str,
+                            max_total_bytes: int) -> None:
+        """
+        Store a summary, then evict least recently used entries until the
+        table holds at most max_total_bytes of summaries.
+        """
+        with self.Session() as session:
+            self._store_cached_summary(session, cache_key, thread_id, summary, max_total_bytes)
+            session.commit()
+
+    @staticmethod
+    def _store_cached_summary(session, cache_key: str, thread_id: int, summary: str,
+                              max_total_bytes: int) -> None:
+        session.merge(CachedSummary(
+            cache_key=cache_key,
+            thread_id=thread_id,
+            summary=summary,
+            size_bytes=len(summary.encode("utf-8")),
+            last_used_at=datetime.utcnow()
+        ))
+        session.flush()
+
+        total = session.execute(select(func.coalesce(func.sum(CachedSummary.size_bytes), 0))).scalar()
+        if total > max_total_bytes:
+            oldest = session.execute(
+                select(CachedSummary.cache_key, CachedSummary.size_bytes)
+                .order_by(CachedSummary.last_used_at.asc())
+            )
+            evict = []
+            for key, size in oldest:
+                if total <= max_total_bytes or key == cache_key:
+                    break
+                evict.append(key)
+                total -= size
+            if evict:
+                session.execute(delete(CachedSummary).where(CachedSummary.cache_key.in_(evict)))
+
+    def get_digest(self, thread_id: int, window_seconds: int) -> Optional[Digest]:
+        """Get a thread's precomputed summary of a window length, if one was made."""
+        with self.Session() as session:
+            return session.get(Digest, (thread_id, window_seconds))
+
+    def save_digest(self, thread_id: int, window_seconds: int, prompt_hash: str, summary: str,
+                    as_of: datetime, activity: str) -> None:
+        """Store (or replace) a thread's precomputed summary of a window length."""
+        with self.Session() as session:
+            self._store_digest(session, thread_id, window_seconds, prompt_hash, summary, as_of, activity)
+            session.commit()
+
+    def touch_digest(self, thread_id: int, window_seconds: int, as_of: datetime) -> None:
+        """Move a digest's as_of forward when its window still holds the same messages."""
+        with self.Session() as session:
+            session.execute(self.touch_digest_statement(thread_id, window_seconds, as_of))
+            session.commit()
+
+    def delete_digest(self, thread_id: int, window_seconds: int) -> None:
+        """Remove a thread's precomputed summary of a window length, if there is one."""
+        with self.Session() as session:
+            session.execute(self.delete_digest_statement(thread_id, window_seconds))
+            session.commit()
+
+    @staticmethod
+    def delete_digest_statement(thread_id: int, window_seconds: int):
+        return delete(Digest).where(Digest.thread_id == thread_id, Digest.window_seconds == window_seconds)
+
+    @staticmethod
+    def touch_digest_statement(thread_id: int, window_seconds: int, as_of: datetime):
+        return (
+            update(Digest)
+            .where(Digest.thread_id == thread_id, Digest.window_seconds == window_seconds)
+            .values(as_of=as_of)
+        )
+
+    @staticmethod
+    def _store_digest(session, thread_id: int, window_seconds: int, prompt_hash: str, summary: str,
+                      as_of: datetime, activity: str) -> None:
+        session.merge(Digest(
+            thread_id=thread_id,
+            window_seconds=window_seconds,
+            prompt_hash=prompt_hash,
+            summary=summary,
+            as_of=as_of,
+            activity=activity,
+            created_at=datetime.utcnow()
+        ))
 
 # Create a global database instance
 db = DatabaseConfig()
\ No newline at end of file
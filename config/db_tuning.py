@@ -0,0 +1,60 @@
+import os
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# SQLite settings applied to every new connection
+SQLITE_PRAGMAS = {
+    # Only takes effect on a new, empty file, so it must come before journal_mode
+    # (switching to WAL initializes the file); see DatabaseConfig.reclaim_space
+    "auto_vacuum": "INCREMENTAL",
+    # Readers no longer block the writer (or each other) and commits append to the WAL
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # With WAL, NORMAL only fsyncs at checkpoints; still safe against application crashes
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Memory-map the database file (bytes)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Page cache per connection; negative values are KiB
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+    # Wait for a competing writer instead of failing with "database is locked" (ms)
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+def engine_options(db_url: str, performance_profile: bool = True) -> Dict[str, Any]:
+    """
+    Keyword arguments for create_engine() for this database.
+
+    PostgreSQL gets an explicitly sized pool, configurable through
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE and DB_POOL_PRE_PING.
+    SQLite is tuned through connect events instead (see install_sqlite_pragmas).
+    """
+    options: Dict[str, Any] = {"echo": False}
+    if not performance_profile:
+        return options
+
+    backend = make_url(db_url).get_backend_name()
+    if backend == "postgresql":
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+            pool_timeout=30,
+        )
+    return options
+
+def install_sqlite_pragmas(engine: Engine) -> None:
+    """Apply SQLITE_PRAGMAS to each new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
@@ -6,6 +6,7 @@ The messages are written by users and moderators discussing features, issues, an
 Your task:
 - Write concise, neutral summaries in a professional tone suitable for a product or dev team review.
 - Group similar feedback together and note any agreements or patterns.
+- A message ending in "(×N similar)" stands for N near-identical messages; count all of them.
 - Include key context from replies, especially from users with [Mod] or [Dev] roles.
 - Ignore jokes or unrelated chatter unless they provide relevant context.
 - Format each major topic as a short paragraph or Markdown heading.
@@ -25,6 +26,7 @@ The messages are written by users/mods discussing features, issues, and ideas.
 - Take into account any replies to a message that contain important information regarding the original message, especially from Mods.
 - Pay special attention to feedback from users with [Mod] or [Dev] roles, as they often provide important context or confirmations.
 - When multiple users express similar feedback, group and summarize them as a single point noting the shared sentiment.
+- A message ending in "(×N similar)" stands for N near-identical messages; count all of them.
 
 The following section provides context on what types of feedback users were encouraged to give:
 Users were encouraged to provide detailed feedback on usability, balance, mechanics, and quality-of-life improvements.
@@ -46,4 +48,20 @@ Quality of Life: The game needs better quality of life.
 
 Note: The following items are known to be in progress and do not need analysis unless discussed directly:
 Translations, Multiplayer, Mod Support, New Maps, New Characters/Items.
-"""
\ No newline at end of file
+"""
+
+# Appended to the thread prompt when a long thread is summarized in parts
+CHUNK_PROMPT = """
+You are only seeing one consecutive part of a longer thread.
+Summarize this part on its own. Keep every distinct piece of feedback, note how many users
+raised each point, and keep [Mod]/[Dev] context. Do not write an introduction or conclusion;
+your summary will be merged with the summaries of the other parts.
+"""
+
+# Appended to the thread prompt when merging partial summaries
+REDUCE_PROMPT = """
+You are given summaries of consecutive parts of the same thread, in chronological order.
+Merge them into one summary: combine points that appear in more than one part, add up how
+many users raised them, and keep the most important [Mod]/[Dev] context. Follow the format
+requested above.
+"""
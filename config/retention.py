@@ -0,0 +1,30 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+class RetentionPolicy:
+    """
+    How long stored messages are kept.
+
+    Every thread uses the default unless its `retention_days` column is set.
+    Both the cleanup task and history imports take their cutoff from here.
+    """
+
+    def __init__(self, default_days: int = 30):
+        """
+        Args:
+            default_days: Days to keep messages of threads without an override
+        """
+        self.default_days = default_days
+
+    def days_for(self, retention_days: Optional[int] = None) -> int:
+        """Retention in days for a thread with the given override (None for the default)."""
+        return retention_days if retention_days else self.default_days
+
+    def cutoff(self, retention_days: Optional[int] = None, now: Optional[datetime] = None) -> datetime:
+        """Oldest created_at (naive UTC) still kept for a thread with the given override."""
+        now = now or datetime.utcnow()
+        return now - timedelta(days=self.days_for(retention_days))
+
+# Process-wide retention policy
+retention_policy = RetentionPolicy(default_days=int(os.getenv("MESSAGE_RETENTION_DAYS", "30")))
@@ -0,0 +1,227 @@
+"""
+Full-text search index over stored messages.
+
+SQLite uses an FTS5 table over `messages` (external content, so the text is
+not stored twice), kept in sync by insert, update and delete triggers.
+PostgreSQL uses a generated `tsvector` column with a GIN index, which the
+database keeps current on every write. Either way every write path (live
+messages, edits, deletes, imports, retention cleanup) is covered without
+the application doing anything.
+
+Both use English stemming, so "crashes" finds "crashing".
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import DateTime, and_, bindparam, or_, select, text
+
+from models.database import Message
+
+FTS_TABLE = "messages_fts"
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', content)) STORED""",
+    "CREATE INDEX IF NOT EXISTS idx_messages_search ON messages USING GIN (search_vector)",
+]
+
+# Longest snippet shown per result, in characters
+SNIPPET_CHARS = 200
+
+# A "quoted phrase" (optionally -"excluded"), or a single word
+QUERY_TERM_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+@dataclass
+class SearchHit:
+    """One message matching a search."""
+    message_id: int                    # Row ID in the messages table
+    discord_message_id: Optional[int]  # None for messages imported from logs
+    author: str
+    role: Optional[str]
+    created_at: datetime
+    snippet: str                       # Matched words wrapped in **
+
+def install_search_index(conn) -> Optional[str]:
+    """
+    Create the search index and its triggers if they do not exist yet.
+
+    An index created on a database that already has messages is built
+    from them once.
+
+    Returns:
+        str: "fts5" or "tsvector", or None if this database has no
+            full-text support (search then falls back to LIKE)
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        if not conn.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar():
+            print("SQLite was built without FTS5; !search will scan messages instead of using an index.")
+            return None
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first()
+        for statement in SQLITE_DDL:
+            conn.exec_driver_sql(statement)
+        if not exists and conn.exec_driver_sql("SELECT 1 FROM messages LIMIT 1").first():
+            print("Building the full-text search index for existing messages...")
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        return "fts5"
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            conn.exec_driver_sql(statement)
+        return "tsvector"
+    return None
+
+def drop_search_index(conn) -> None:
+    """Drop the SQLite FTS table (PostgreSQL's column goes with the messages table)."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+def parse_query(query: str) -> List[List[str]]:
+    """
+    Split a search into its terms.
+
+    Words must all appear; "quoted phrases" must appear as written; a
+    leading - excludes a word or phrase; OR separates alternatives.
+
+    Returns:
+        list: [required terms per alternative..., excluded terms], i.e. the
+            last list holds the exclusions
+
+    Raises:
+        ValueError: If the search has no words to look for
+    """
+    alternatives: List[List[str]] = [[]]
+    excluded: List[str] = []
+    for match in QUERY_TERM_PATTERN.finditer(query):
+        negate, phrase, word = match.groups()
+        if word is not None:
+            if word.upper() == "OR":
+                alternatives.append([])
+                continue
+            negate, phrase = ("-", word[1:]) if word.startswith("-") else ("", word)
+        if not re.search(r"\w", phrase):
+            continue
+        (excluded if negate else alternatives[-1]).append(phrase)
+
+    alternatives = [terms for terms in alternatives if terms]
+    if not alternatives:
+        raise ValueError("Search for at least one word.")
+    return alternatives + [excluded]
+
+def fts5_query(query: str) -> str:
+    """
+    Translate a search (see parse_query) into an FTS5 MATCH expression.
+
+    Every term is quoted, so user input can never be read as FTS5 syntax.
+    """
+    *alternatives, excluded = parse_query(query)
+
+    def quote(term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
+
+    expression = " OR ".join(f"({' AND '.join(map(quote, terms))})" for terms in alternatives)
+    for term in excluded:
+        expression = f"({expression}) NOT {quote(term)}"
+    return expression
+
+def search_statement(backend: Optional[str], thread_id: int, query: str,
+                     start_date: Optional[datetime], end_date: Optional[datetime],
+                     limit: int, offset: int):
+    """
+    SELECT of a thread's messages matching a search, best match first, as
+    (id, discord_message_id, author, role, created_at, snippet) rows.
+
+    Raises:
+        ValueError: If the search has no words to look for
+    """
+    filters = ""
+    params = {"thread_id": thread_id, "limit": limit, "offset": offset}
+    if start_date:
+        filters += " AND m.created_at >= :start_date"
+        params["start_date"] = start_date
+    if end_date:
+        filters += " AND m.created_at <= :end_date"
+        params["end_date"] = end_date
+
+    if backend == "fts5":
+        params["query"] = fts5_query(query)
+        stmt = text(f"""
+            SELECT m.id, m.discord_message_id, m.author, m.role, m.created_at,
+                   snippet({FTS_TABLE}, 0, '**', '**', '…', 24) AS snippet
+            FROM {FTS_TABLE} JOIN messages AS m ON m.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :query AND m.thread_id = :thread_id{filters}
+            ORDER BY bm25({FTS_TABLE}), m.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """)
+    elif backend == "tsvector":
+        parse_query(query)  # Same validation as SQLite; PostgreSQL parses the text itself
+        params["query"] = query
+        # Highlighting is slow, so only the page's rows are highlighted
+        stmt = text(f"""
+            SELECT m.id, m.discord_message_id, m.author, m.role, m.created_at,
+                   ts_headline('english', m.content, m.query,
+                               'StartSel=**, StopSel=**, MaxWords=24, MinWords=8, MaxFragments=1') AS snippet
+            FROM (
+                SELECT m.*, query, ts_rank_cd(m.search_vector, query) AS rank
+                FROM messages AS m, websearch_to_tsquery('english', :query) AS query
+                WHERE m.search_vector @@ query AND m.thread_id = :thread_id{filters}
+                ORDER BY rank DESC, m.created_at DESC
+                LIMIT :limit OFFSET :offset
+            ) AS m
+            ORDER BY m.rank DESC, m.created_at DESC
+        """)
+    else:
+        # No index: every term must appear somewhere in the text, newest first
+        *alternatives, excluded = parse_query(query)
+        conditions = [
+            Message.thread_id == thread_id,
+            or_(*(and_(*(Message.content.ilike(f"%{term}%") for term in terms)) for terms in alternatives)),
+        ]
+        conditions += [~Message.content.ilike(f"%{term}%") for term in excluded]
+        if start_date:
+            conditions.append(Message.created_at >= start_date)
+        if end_date:
+            conditions.append(Message.created_at <= end_date)
+        return (
+            select(Message.id, Message.discord_message_id, Message.author, Message.role,
+                   Message.created_at, Message.content)
+            .where(and_(*conditions))
+            .order_by(Message.created_at.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+
+    # Dates are typed so they are bound, and read back on SQLite, in the stored format
+    binds = [bindparam(name, value, type_=DateTime if isinstance(value, datetime) else None)
+             for name, value in params.items()]
+    return stmt.bindparams(*binds).columns(created_at=DateTime)
+
+def search_hit(row) -> SearchHit:
+    """Build a SearchHit from a search_statement() row."""
+    message_id, discord_message_id, author, role, created_at, snippet = row
+    snippet = " ".join(snippet.split())
+    if len(snippet) > SNIPPET_CHARS:
+        snippet = snippet[:SNIPPET_CHARS - 1].rstrip()
+        if snippet.count("**") % 2:
+            snippet += "**"
+        snippet += "…"
+    return SearchHit(message_id, discord_message_id, author, role, created_at, snippet)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship
 
 # Create the SQLAlchemy base class
@@ -13,17 +13,23 @@ class Thread(Base):
     thread_id = Column(Integer, primary_key=True)
     nickname = Column(String, unique=True, nullable=False)
     description = Column(String, nullable=True)  # New field for thread description/context
+    retention_days = Column(Integer, nullable=True)  # Overrides the default retention period
     created_by = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to messages
     messages = relationship("Message", back_populates="thread", cascade="all, delete-orphan")
+    summary_buckets = relationship("SummaryBucket", cascade="all, delete-orphan")
+    cached_summaries = relationship("CachedSummary", cascade="all, delete-orphan")
+    import_checkpoint = relationship("ImportCheckpoint", uselist=False, cascade="all, delete-orphan")
+    digests = relationship("Digest", cascade="all, delete-orphan")
 
 class Message(Base):
     """Message model for storing Discord messages."""
     __tablename__ = 'messages'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    discord_message_id = Column(BigInteger, nullable=True)  # Null for rows migrated from logs
     thread_id = Column(Integer, ForeignKey('threads.thread_id'), nullable=False)
     author = Column(String, nullable=False)
     role = Column(String)  # Store user role (e.g., "Mod", "Dev", etc.)
@@ -31,12 +37,73 @@ class Message(Base):
     created_at = Column(DateTime, nullable=False)
     reply_to = Column(String)
     edited = Column(Boolean, default=False)
+    edited_at = Column(DateTime, nullable=True)
+    token_count = Column(Integer, nullable=True)  # Computed once at ingestion
 
     # Relationship to thread
     thread = relationship("Thread", back_populates="messages")
 
     # Indexes for faster querying
     __table_args__ = (
-        Index('idx_thread_id', 'thread_id'),
+        # Summary windows filter on thread_id and a created_at range and sort by
+        # created_at, so a composite index serves both the filter and the order
+        Index('idx_thread_created_at', 'thread_id', 'created_at'),
+        # Retention cleanup filters on created_at across all threads
         Index('idx_created_at', 'created_at'),
-    )
\ No newline at end of file
+        Index('idx_discord_message_id', 'discord_message_id', unique=True),
+    )
+
+class SummaryBucket(Base):
+    """Cached partial summary of a run of consecutive time buckets of a thread."""
+    __tablename__ = 'summary_buckets'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    bucket_end = Column(DateTime, nullable=True)  # End (exclusive) of the last bucket covered
+    prompt_hash = Column(String, nullable=False)  # Prompt (incl. thread description) and model
+    summary = Column(String, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    dirty = Column(Boolean, default=False, nullable=False)  # Messages changed since summarized
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_bucket_lookup', 'thread_id', 'bucket_start', 'prompt_hash', unique=True),
+    )
+
+class CachedSummary(Base):
+    """Finished summary keyed by a digest of everything that produced it."""
+    __tablename__ = 'summary_cache'
+
+    cache_key = Column(String, primary_key=True)  # Thread, window, message-set digest, prompt and model
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), nullable=False)
+    summary = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_summary_cache_last_used', 'last_used_at'),
+    )
+
+class ImportCheckpoint(Base):
+    """Progress of a thread's history import, so an interrupted import can resume."""
+    __tablename__ = 'import_checkpoints'
+
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), primary_key=True)
+    last_message_id = Column(BigInteger, nullable=True)  # Newest Discord message ID already processed
+    imported_count = Column(Integer, default=0, nullable=False)
+    completed = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Digest(Base):
+    """Summary of a default window, precomputed off-peak by the digest scheduler."""
+    __tablename__ = 'digests'
+
+    thread_id = Column(Integer, ForeignKey('threads.thread_id'), primary_key=True)
+    window_seconds = Column(Integer, primary_key=True)  # Window length, e.g. 86400 for 24h
+    prompt_hash = Column(String, nullable=False)  # Prompt (incl. thread description) and model
+    summary = Column(String, nullable=False)
+    as_of = Column(DateTime, nullable=False)  # End of the summarized window
+    activity = Column(String, nullable=False)  # window_digest() of the window's messages when it was made
+    created_at = Column(DateTime, default=datetime.utcnow)
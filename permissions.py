@@ -1,3 +1,4 @@
+from typing import Optional
 from discord import Member
 
 DEV_ROLES = ["Developer", "Dev"]
@@ -23,3 +24,12 @@ def is_privileged(member: Member) -> bool:
 def can_manage_threads(member: Member) -> bool:
     """Check if member can manage threads (Dev, Mod, or Owner)."""
     return is_privileged(member)
+
+def get_user_role(member: Member) -> Optional[str]:
+    """Determine the highest priority role for a user."""
+    roles = getattr(member, "roles", [])  # Users outside the guild have no roles
+    if any(role.name in DEV_ROLES for role in roles):
+        return "Dev"
+    if any(role.name in MOD_ROLES for role in roles):
+        return "Mod"
+    return None
@@ -0,0 +1,140 @@
+from typing import Any, AsyncIterator, Dict, List
+
+import aiohttp
+
+from .base import AIProvider, ProviderError
+from .http_session import close_shared_sessions, get_shared_session, sse_events
+
+API_VERSION = "2023-06-01"
+
+class AnthropicProvider(AIProvider):
+    """
+    Anthropic implementation of the AI provider interface, over the Messages
+    API (POST /v1/messages) with a pooled keep-alive session.
+    """
+
+    def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-latest",
+                 base_url: str = "https://api.anthropic.com", timeout: float = 60.0,
+                 connect_timeout: float = 10.0, max_concurrency: int = 4,
+                 max_tokens: int = 1000, temperature: float = 0.7):
+        """
+        Initialize Anthropic provider.
+
+        Args:
+            api_key: Anthropic API key
+            model: Model to use
+            base_url: API endpoint, without the /v1 suffix
+            timeout: Seconds to wait for a response, or between streamed events
+            connect_timeout: Seconds to wait for a connection
+            max_concurrency: Maximum number of in-flight requests
+            max_tokens: Completion token limit
+            temperature: Sampling temperature
+        """
+        super().__init__(max_concurrency=max_concurrency)
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/").removesuffix("/v1")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_concurrency
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def _request(self, messages: List[str], prompt: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "headers": {"x-api-key": self.api_key, "anthropic-version": API_VERSION},
+            "json": {
+                "model": self.model,
+                "system": prompt,
+                "messages": [{"role": "user", "content": "\n".join(messages)}],
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "stream": stream,
+            },
+        }
+
+    async def _generate(self, messages: List[str], prompt: str) -> str:
+        """
+        Generate a summary with one non-streaming request.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+
+        Returns:
+            str: Generated summary
+
+        Raises:
+            ProviderError: If the API call fails
+        """
+        session = get_shared_session(self.base_url, self.max_connections)
+        timeout = aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+        try:
+            async with session.post("/v1/messages", timeout=timeout,
+                                    **self._request(messages, prompt, stream=False)) as response:
+                data = await response.json(content_type=None)
+                if response.status != 200:
+                    raise ProviderError(self._error_message(response.status, data))
+            usage = data.get("usage", {})
+            self.record_usage(usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+            text = "".join(block.get("text", "") for block in data["content"] if block.get("type") == "text")
+            return text.strip()
+
+        except ProviderError as e:
+            print(f"Error generating summary with Anthropic: {e}")
+            raise
+        except Exception as e:
+            print(f"Error generating summary with Anthropic: {e}")
+            raise ProviderError(f"Anthropic: {e or type(e).__name__}") from e
+
+    async def _stream(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a summary from the Messages API as tokens arrive.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+
+        Yields:
+            str: Consecutive pieces of the summary
+
+        Raises:
+            ProviderError: If the API call fails
+        """
+        session = get_shared_session(self.base_url, self.max_connections)
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=self.timeout)
+        prompt_tokens = 0
+        try:
+            async with session.post("/v1/messages", timeout=timeout,
+                                    **self._request(messages, prompt, stream=True)) as response:
+                if response.status != 200:
+                    raise ProviderError(self._error_message(response.status,
+                                                            await response.json(content_type=None)))
+                async for event in sse_events(response):
+                    kind = event.get("type")
+                    if kind == "message_start":
+                        prompt_tokens = event["message"].get("usage", {}).get("input_tokens", 0)
+                    elif kind == "message_delta":
+                        # Sent once, just before message_stop, with the final count
+                        self.record_usage(prompt_tokens, event.get("usage", {}).get("output_tokens", 0))
+                    elif kind == "error":
+                        raise ProviderError(f"Anthropic: {event['error'].get('message', 'stream error')}")
+                    elif kind == "content_block_delta":
+                        piece = event["delta"].get("text")
+                        if piece:
+                            yield piece
+
+        except ProviderError as e:
+            print(f"Error streaming summary with Anthropic: {e}")
+            raise
+        except Exception as e:
+            print(f"Error streaming summary with Anthropic: {e}")
+            raise ProviderError(f"Anthropic: {e or type(e).__name__}") from e
+
+    @staticmethod
+    def _error_message(status: int, data: Any) -> str:
+        error = data.get("error", {}) if isinstance(data, dict) else {}
+        return f"Anthropic: HTTP {status} {error.get('type', '')}: {error.get('message', '')}".rstrip(": ")
+
+    async def close(self) -> None:
+        await close_shared_sessions()
@@ -1,19 +1,214 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Deque, Hashable, List, Optional
+
+from services.metrics import ai_call_latency, ai_tokens
+
+# Who is waiting on the current AI call (e.g. the moderator who ran !sum).
+# Set it once per command; tasks spawned from there inherit it.
+current_requester: ContextVar[Hashable] = ContextVar("current_requester", default=None)
+
+class ProviderError(Exception):
+    """An AI provider call failed. The message is safe to show to moderators."""
+
+class FairLimiter:
+    """
+    Concurrency limiter with a fair wait queue.
+
+    At most `limit` calls run at once. Waiters are grouped by requester and
+    admitted round-robin across requesters (FIFO within a requester), so one
+    moderator summarizing a huge thread cannot starve another one's !sum.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("Concurrency limit must be at least 1")
+        self.limit = limit
+        self._active = 0
+        self._waiters: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def active(self) -> int:
+        """Number of calls currently holding a slot."""
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        """Number of calls waiting for a slot."""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+
+        key = current_requester.get()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just before cancellation; pass it on
+                self.release()
+            else:
+                self._remove_waiter(key, future)
+            raise
+
+    def release(self) -> None:
+        # Hand the slot directly to the next requester in round-robin order
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _remove_waiter(self, key: Hashable, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(key)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[key]
+
+    async def __aenter__(self) -> "FairLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
 
 class AIProvider(ABC):
     """Abstract base class for AI providers."""
-    
-    @abstractmethod
-    async def generate_summary(self, messages: List[str], prompt: str) -> str:
+
+    def __init__(self, max_concurrency: int = 4):
+        """
+        Args:
+            max_concurrency: Maximum number of in-flight requests to this provider
+        """
+        self.limiter = FairLimiter(max_concurrency)
+
+    @property
+    def name(self) -> str:
+        """Provider label used in metrics, e.g. "openai" for OpenAIProvider."""
+        return type(self).__name__.replace("Provider", "").lower()
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Count the tokens a call used, as reported by the provider's API."""
+        ai_tokens.inc(prompt_tokens, provider=self.name, kind="prompt")
+        ai_tokens.inc(completion_tokens, provider=self.name, kind="completion")
+
+    async def generate_summary(self, messages: List[str], prompt: str,
+                               timeout: Optional[float] = None) -> str:
         """
         Generate a summary from a list of messages using the provided prompt.
-        
+
+        Waits for a free slot in the provider's fair queue, then calls the
+        provider. Never blocks the event loop.
+
         Args:
             messages: List of formatted messages to summarize
             prompt: System prompt to guide the summary generation
-            
+            timeout: Seconds the call may take once it has a slot (default: no limit)
+
         Returns:
             str: Generated summary
+
+        Raises:
+            ProviderError: If the provider fails
+            asyncio.TimeoutError: If the call takes longer than `timeout`
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self.limiter:
+                result = await asyncio.wait_for(self._generate(messages, prompt), timeout)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"  # e.g. the losing side of a hedged request
+            raise
+        finally:
+            ai_call_latency.observe(time.perf_counter() - started,
+                                    provider=self.name, mode="generate", outcome=outcome)
+
+    async def stream_summary(self, messages: List[str], prompt: str,
+                             on_admitted: Optional[Callable[[], None]] = None) -> AsyncIterator[str]:
+        """
+        Generate a summary incrementally, yielding text as the provider produces it.
+
+        Holds a slot in the provider's fair queue until the stream is finished
+        or closed.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+            on_admitted: Called once the stream has a slot, so callers can start
+                timing it from there rather than from when it joined the queue
+
+        Yields:
+            str: Consecutive pieces of the summary
+
+        Raises:
+            ProviderError: If the provider fails
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self.limiter:
+                if on_admitted is not None:
+                    on_admitted()
+                leading = True
+                async for piece in self._stream(messages, prompt):
+                    # Match _generate(), whose summaries have leading whitespace stripped
+                    if leading:
+                        piece = piece.lstrip()
+                        if not piece:
+                            continue
+                        leading = False
+                    yield piece
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "closed"  # The consumer stopped reading
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            ai_call_latency.observe(time.perf_counter() - started,
+                                    provider=self.name, mode="stream", outcome=outcome)
+
+    @abstractmethod
+    async def _generate(self, messages: List[str], prompt: str) -> str:
         """
-        pass
\ No newline at end of file
+        Provider-specific summary call. Must be truly asynchronous (an async
+        client, or blocking work moved to an executor), and raise
+        ProviderError rather than return error text.
+        """
+        pass
+
+    async def _stream(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        """
+        Provider-specific streaming call. Providers without a streaming API
+        inherit this default, which yields the whole summary at once.
+        """
+        yield await self._generate(messages, prompt)
+
+    async def close(self) -> None:
+        """Release network resources held by the provider."""
+        pass
@@ -0,0 +1,37 @@
+import json
+from typing import Any, AsyncIterator, Dict
+
+import aiohttp
+
+# One pooled keep-alive session per server, shared by every provider instance
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+def get_shared_session(base_url: str, max_connections: int) -> aiohttp.ClientSession:
+    """
+    Return the process-wide HTTP session for a model server.
+
+    Connections are kept alive between calls, so each summary skips the TCP
+    and TLS handshakes; the pool is capped at `max_connections`.
+    """
+    session = _sessions.get(base_url)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=max_connections, keepalive_timeout=300)
+        session = _sessions[base_url] = aiohttp.ClientSession(base_url=base_url, connector=connector)
+    return session
+
+async def close_shared_sessions() -> None:
+    """Close every pooled session (call on shutdown)."""
+    while _sessions:
+        _, session = _sessions.popitem()
+        await session.close()
+
+async def sse_events(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """Decode the JSON payloads of a server-sent event stream."""
+    async for raw in response.content:
+        line = raw.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return
+        yield json.loads(payload)
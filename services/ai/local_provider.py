@@ -0,0 +1,160 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from .base import AIProvider, ProviderError
+from .http_session import close_shared_sessions, get_shared_session, sse_events
+
+class LocalLLMProvider(AIProvider):
+    """
+    Provider for a model server on the local network.
+
+    Speaks either the OpenAI-compatible chat API (llama.cpp server, vLLM,
+    Ollama, LM Studio: POST /v1/chat/completions) or llama.cpp's native
+    completion API (POST /completion). Both are streamed as server-sent
+    events. max_concurrency should match the server's parallel slots
+    (llama.cpp --parallel); further calls wait in the fair queue instead of
+    piling up on the server.
+    """
+
+    API_STYLES = ("openai", "llamacpp")
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8080", model: str = "llama2",
+                 api_style: str = "openai", timeout: float = 120.0, connect_timeout: float = 5.0,
+                 max_concurrency: int = 1, max_tokens: int = 1000, temperature: float = 0.7):
+        """
+        Initialize the local model provider.
+
+        Args:
+            base_url: Server address, without the /v1 suffix
+            model: Model name sent to OpenAI-compatible servers
+            api_style: "openai" for /v1/chat/completions, "llamacpp" for /completion
+            timeout: Seconds to wait for a response, or between streamed events
+            connect_timeout: Seconds to wait for a connection
+            max_concurrency: Parallel requests, normally the server's slot count
+            max_tokens: Completion token limit
+            temperature: Sampling temperature
+        """
+        if api_style not in self.API_STYLES:
+            raise ValueError(f"Unknown local LLM API style: {api_style} (expected one of {self.API_STYLES})")
+        super().__init__(max_concurrency=max_concurrency)
+        self.base_url = base_url.rstrip("/").removesuffix("/v1")
+        self.model = model
+        self.api_style = api_style
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_concurrency
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    @property
+    def name(self) -> str:
+        return "local"
+
+    def _request(self, messages: List[str], prompt: str, stream: bool) -> Dict[str, Any]:
+        transcript = "\n".join(messages)
+        if self.api_style == "llamacpp":
+            return {
+                "path": "/completion",
+                "json": {
+                    "prompt": f"{prompt}\n\n{transcript}\n\nSummary:\n",
+                    "n_predict": self.max_tokens,
+                    "temperature": self.temperature,
+                    "cache_prompt": True,
+                    "stream": stream,
+                },
+            }
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": transcript}
+            ],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": stream,
+        }
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        return {"path": "/v1/chat/completions", "json": body}
+
+    def _record_usage(self, data: Dict[str, Any]) -> None:
+        usage = data.get("usage")
+        if usage:
+            self.record_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        elif "tokens_evaluated" in data:
+            # llama.cpp native API
+            self.record_usage(data.get("tokens_evaluated", 0), data.get("tokens_predicted", 0))
+
+    async def _generate(self, messages: List[str], prompt: str) -> str:
+        """
+        Generate a summary with one non-streaming request.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+
+        Returns:
+            str: Generated summary
+
+        Raises:
+            ProviderError: If the server cannot be reached or returns an error
+        """
+        request = self._request(messages, prompt, stream=False)
+        session = get_shared_session(self.base_url, self.max_connections)
+        timeout = aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+        try:
+            async with session.post(request["path"], json=request["json"], timeout=timeout) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            self._record_usage(data)
+            if self.api_style == "llamacpp":
+                return data["content"].strip()
+            return data["choices"][0]["message"]["content"].strip()
+
+        except Exception as e:
+            print(f"Error generating summary with local LLM: {e}")
+            raise ProviderError(f"local model server: {e or type(e).__name__}") from e
+
+    async def _stream(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a summary as the server produces it.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+
+        Yields:
+            str: Consecutive pieces of the summary
+
+        Raises:
+            ProviderError: If the server cannot be reached or returns an error
+        """
+        request = self._request(messages, prompt, stream=True)
+        session = get_shared_session(self.base_url, self.max_connections)
+        # No total limit: a long summary may stream for minutes, but the
+        # server must not go silent for longer than the timeout
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=self.timeout)
+        try:
+            async with session.post(request["path"], json=request["json"], timeout=timeout) as response:
+                response.raise_for_status()
+                async for data in sse_events(response):
+                    self._record_usage(data)
+                    piece = self._piece(data)
+                    if piece:
+                        yield piece
+
+        except Exception as e:
+            print(f"Error streaming summary with local LLM: {e}")
+            raise ProviderError(f"local model server: {e or type(e).__name__}") from e
+
+    def _piece(self, data: Dict[str, Any]) -> Optional[str]:
+        if self.api_style == "llamacpp":
+            return data.get("content")
+        choices = data.get("choices")
+        if not choices:
+            return None
+        return choices[0].get("delta", {}).get("content")
+
+    async def close(self) -> None:
+        await close_shared_sessions()
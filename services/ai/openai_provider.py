@@ -1,44 +1,120 @@
-from typing import List
-from openai import OpenAI
-from .base import AIProvider
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
+from .base import AIProvider, ProviderError
+
+# One pooled async client per (api_key, base_url), shared by every provider instance
+_clients: Dict[Tuple[str, Optional[str]], AsyncOpenAI] = {}
+
+def get_shared_client(api_key: str, base_url: Optional[str] = None,
+                      timeout: float = 60.0) -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client for this key and endpoint."""
+    key = (api_key, base_url)
+    if key not in _clients:
+        _clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
+    return _clients[key]
+
+async def close_shared_clients() -> None:
+    """Close every pooled OpenAI client (call on shutdown)."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.close()
 
 class OpenAIProvider(AIProvider):
     """OpenAI implementation of the AI provider interface."""
-    
-    def __init__(self, api_key: str, model: str = "gpt-4"):
+
+    def __init__(self, api_key: str, model: str = "gpt-4",
+                 base_url: Optional[str] = None, timeout: float = 60.0,
+                 max_concurrency: int = 4, max_tokens: int = 1000,
+                 temperature: float = 0.7):
         """
         Initialize OpenAI provider.
-        
+
         Args:
             api_key: OpenAI API key
             model: Model to use (default: gpt-4)
+            base_url: Alternative API endpoint, e.g. a local stub server
+            timeout: Request timeout in seconds
+            max_concurrency: Maximum number of in-flight requests
+            max_tokens: Completion token limit
+            temperature: Sampling temperature
         """
-        self.client = OpenAI(api_key=api_key)
+        super().__init__(max_concurrency=max_concurrency)
+        self.client = get_shared_client(api_key, base_url, timeout)
         self.model = model
-        
-    async def generate_summary(self, messages: List[str], prompt: str) -> str:
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    async def _generate(self, messages: List[str], prompt: str) -> str:
         """
         Generate a summary using OpenAI's chat completion API.
-        
+
         Args:
             messages: List of formatted messages to summarize
             prompt: System prompt to guide the summary generation
-            
+
         Returns:
             str: Generated summary
+
+        Raises:
+            ProviderError: If the API call fails
         """
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": prompt},
                     {"role": "user", "content": "\n".join(messages)}
                 ],
-                max_tokens=1000,
-                temperature=0.7
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
             )
+            if response.usage:
+                self.record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             return response.choices[0].message.content.strip()
-            
+
         except Exception as e:
             print(f"Error generating summary with OpenAI: {e}")
-            return f"Error generating summary: {str(e)}"
\ No newline at end of file
+            raise ProviderError(f"OpenAI: {e}") from e
+
+    async def _stream(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a summary from OpenAI's chat completion API as tokens arrive.
+
+        Args:
+            messages: List of formatted messages to summarize
+            prompt: System prompt to guide the summary generation
+
+        Yields:
+            str: Consecutive pieces of the summary
+
+        Raises:
+            ProviderError: If the API call fails
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": "\n".join(messages)}
+                ],
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True,
+                # The last event then carries the token usage
+                stream_options={"include_usage": True}
+            )
+            async for event in stream:
+                if event.usage:
+                    self.record_usage(event.usage.prompt_tokens, event.usage.completion_tokens)
+                if not event.choices:
+                    continue
+                piece = event.choices[0].delta.content
+                if piece:
+                    yield piece
+
+        except Exception as e:
+            print(f"Error streaming summary with OpenAI: {e}")
+            raise ProviderError(f"OpenAI: {e}") from e
+
+    async def close(self) -> None:
+        await close_shared_clients()
@@ -0,0 +1,310 @@
+import asyncio
+import time
+from collections import deque
+from typing import (Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional,
+                    Tuple)
+
+from services.metrics import ai_circuit_open, ai_router_events
+from .base import AIProvider, ProviderError
+
+# Marks the end of a streamed summary in a route's piece queue
+_END = object()
+# Marks the point where a stream got a slot in its provider's queue
+_ADMITTED = object()
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a provider that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and the
+    provider is skipped. Once `cooldown` seconds have passed a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """"closed", "open" or "half-open"."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be made now. Claims the trial call when half-open."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> bool:
+        """Count a failed call. Returns True if this opened the circuit."""
+        self.failures += 1
+        if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._trial = False
+            return True
+        return False
+
+    def record_abandoned(self) -> None:
+        """A call was cancelled before it finished; it proves nothing either way."""
+        self._trial = False
+
+class LatencyTracker:
+    """Latencies of a provider's recent successful calls."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of recent latencies, or None until min_samples calls have finished."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class Route:
+    """A provider the router can send calls to, with its own timeout and health."""
+
+    def __init__(self, provider: AIProvider, timeout: float, breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            provider: The provider
+            timeout: Seconds a call may take once it has a slot in the provider's
+                queue; for streams, the longest wait for the next piece
+            breaker: Circuit breaker (default: 3 failures, 30 second cooldown)
+        """
+        self.provider = provider
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        # Time to a full summary, and time to the first piece of a stream
+        self.latency = {"generate": LatencyTracker(), "stream": LatencyTracker()}
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+class ProviderRouter:
+    """
+    Sends each summary call to a primary provider with ordered fallbacks.
+
+    Per call:
+    - Providers whose circuit breaker is open are skipped.
+    - A provider that fails or times out is replaced by the next one at once.
+    - If the provider has not answered after its recent p95 latency, the call
+      is hedged: the next provider is asked too, the first answer wins, and
+      the other request is cancelled. Only the slowest ~5% of calls are
+      duplicated, which is what cuts the tail.
+
+    Streams are hedged and failed over on their first piece; once text has
+    been shown, the stream stays with that provider.
+
+    Has the same generate_summary/stream_summary/close interface as a single
+    AIProvider, so the summarizer does not care which one it holds.
+    """
+
+    def __init__(self, routes: List[Route], hedge: bool = True, hedge_quantile: float = 0.95,
+                 default_hedge_delay: float = 15.0, min_hedge_delay: float = 1.0, max_hedges: int = 1):
+        """
+        Args:
+            routes: Primary first, then fallbacks in order
+            hedge: Whether to hedge slow calls (failover on errors happens regardless)
+            hedge_quantile: Latency quantile after which a call is hedged
+            default_hedge_delay: Hedge delay until a provider has enough latency samples
+            min_hedge_delay: Never hedge sooner than this, in seconds
+            max_hedges: Extra providers one call may be hedged to
+        """
+        if not routes:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.routes = routes
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedges = max_hedges
+        ai_circuit_open.set_function(
+            lambda: {route.name: float(route.breaker.state == "open") for route in self.routes})
+
+    def hedge_delay(self, route: Route, mode: str) -> Optional[float]:
+        """Seconds to wait on `route` before hedging, or None to not hedge."""
+        if not self.hedge or len(self.routes) < 2:
+            return None
+        delay = route.latency[mode].quantile(self.hedge_quantile)
+        if delay is None:
+            delay = self.default_hedge_delay
+        return min(max(delay, self.min_hedge_delay), route.timeout)
+
+    async def generate_summary(self, messages: List[str], prompt: str) -> str:
+        """
+        Generate a summary with the first provider to answer.
+
+        Raises:
+            ProviderError: If every provider failed or is unavailable
+        """
+        _, summary = await self._race(lambda route: self._generate(route, messages, prompt), "generate")
+        return summary
+
+    async def stream_summary(self, messages: List[str], prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a summary from the first provider to produce text.
+
+        Raises:
+            ProviderError: If every provider failed before producing text, or
+                the chosen one fails partway through
+        """
+        route, (first, queue, producer) = await self._race(
+            lambda route: self._open_stream(route, messages, prompt), "stream")
+        try:
+            piece = first
+            while piece is not _END:
+                yield piece
+                piece = await self._next_piece(route, queue)
+        finally:
+            producer.cancel()
+
+    async def _race(self, attempt: Callable[[Route], Awaitable[Any]], mode: str) -> Tuple[Route, Any]:
+        """
+        Run `attempt` on the routes in order, hedging and failing over as
+        described in the class docstring, and return the first success.
+        """
+        remaining = iter(self.routes)
+        running: Dict[asyncio.Task, Route] = {}
+        errors: List[str] = []
+        hedges = 0
+        hedge_at: Optional[float] = None
+
+        def launch(event: Optional[str]) -> bool:
+            nonlocal hedge_at
+            hedge_at = None
+            for route in remaining:
+                if not route.breaker.allow():
+                    errors.append(f"{route.name}: temporarily disabled after repeated failures")
+                    continue
+                if event:
+                    ai_router_events.inc(provider=route.name, event=event)
+                running[asyncio.create_task(attempt(route))] = route
+                delay = self.hedge_delay(route, mode)
+                if delay is not None and hedges < self.max_hedges:
+                    hedge_at = time.monotonic() + delay
+                return True
+            return False
+
+        launch(None)
+        try:
+            while running:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges += 1
+                    launch("hedge")
+                    continue
+                for task in done:
+                    route = running.pop(task)
+                    if task.exception() is None:
+                        return route, task.result()
+                    errors.append(f"{route.name}: {task.exception()}")
+                if not running:
+                    launch("failover")
+        finally:
+            # Cancel the losers of a hedge (or everything, if we were cancelled)
+            for task in running:
+                task.cancel()
+        raise ProviderError("No AI provider could generate the summary (" + "; ".join(errors) + ")")
+
+    async def _generate(self, route: Route, messages: List[str], prompt: str) -> str:
+        started = time.perf_counter()
+        try:
+            summary = await route.provider.generate_summary(messages, prompt, timeout=route.timeout)
+        except asyncio.CancelledError:
+            route.breaker.record_abandoned()
+            raise
+        except asyncio.TimeoutError:
+            self._failed(route)
+            raise ProviderError(f"no response within {route.timeout:g} s") from None
+        except Exception:
+            self._failed(route)
+            raise
+        route.breaker.record_success()
+        route.latency["generate"].observe(time.perf_counter() - started)
+        return summary
+
+    async def _open_stream(self, route: Route, messages: List[str],
+                           prompt: str) -> Tuple[str, asyncio.Queue, asyncio.Task]:
+        """
+        Start a stream on `route` and wait for its first piece. The stream is
+        read by its own task into a queue, so it can be abandoned cleanly if
+        another provider wins.
+
+        Like generate calls, the timeout starts once the provider has a slot:
+        waiting behind other calls in its queue is not a failure.
+        """
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        pieces = route.provider.stream_summary(messages, prompt,
+                                               on_admitted=lambda: queue.put_nowait(_ADMITTED))
+        producer = asyncio.create_task(self._pump(pieces, queue))
+        try:
+            signal = await queue.get()
+            if signal is not _ADMITTED:
+                queue.put_nowait(signal)  # Ended before it was admitted; the only item
+            first = await self._next_piece(route, queue)
+        except BaseException as e:
+            producer.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                route.breaker.record_abandoned()
+            raise
+        route.breaker.record_success()
+        route.latency["stream"].observe(time.perf_counter() - started)
+        return first, queue, producer
+
+    async def _next_piece(self, route: Route, queue: asyncio.Queue) -> Any:
+        """Next piece (or _END) from a stream's queue, within the route's timeout."""
+        try:
+            piece = await asyncio.wait_for(queue.get(), route.timeout)
+        except asyncio.TimeoutError:
+            self._failed(route)
+            raise ProviderError(f"no response within {route.timeout:g} s") from None
+        if isinstance(piece, Exception):
+            self._failed(route)
+            raise piece
+        return piece
+
+    @staticmethod
+    async def _pump(pieces: AsyncIterator[str], queue: asyncio.Queue) -> None:
+        try:
+            async for piece in pieces:
+                queue.put_nowait(piece)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    def _failed(self, route: Route) -> None:
+        if route.breaker.record_failure():
+            print(f"AI provider {route.name} failed {route.breaker.failures} times in a row; "
+                  f"skipping it for {route.breaker.cooldown:g} s")
+            ai_router_events.inc(provider=route.name, event="circuit_open")
+
+    async def close(self) -> None:
+        """Release every provider's pooled connections."""
+        for route in self.routes:
+            await route.provider.close()
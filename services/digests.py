@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, time, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from config.async_database import async_db
+from models.database import Digest
+from services.ai.base import current_requester
+from services.metrics import digest_jobs, digest_lookups
+from services.token_index import token_index
+from utils.time_utils import parse_timeframe
+
+# Windows precomputed for every watched thread: the !sum default and a week
+DEFAULT_TIMEFRAMES = ("24h", "1w")
+
+# Digest jobs share the AI providers' fair queue as one requester, so a
+# moderator's !sum is admitted between them instead of after all of them
+REQUESTER = "digest-scheduler"
+
+def window_seconds(timeframe: Optional[str]) -> int:
+    """Length of a !sum timeframe in seconds (7d and 1w are the same window)."""
+    start, end = parse_timeframe(timeframe)
+    return round((end - start).total_seconds())
+
+def prompt_hash(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+def digest_times(hours: str) -> List[time]:
+    """Parse comma-separated UTC hours ("3,5") into run times for tasks.loop."""
+    return [time(hour=int(hour), tzinfo=timezone.utc) for hour in hours.split(",") if hour.strip()]
+
+class DigestStore:
+    """
+    Precomputed summaries, one per thread and window length.
+
+    A digest is served while it is younger than `max_age` and was made with
+    the thread's current prompt and model. It covers the window ending at
+    its `as_of` time; callers say so rather than present it as current.
+    `activity` is the window_digest() of the messages it summarizes, so the
+    scheduler can tell whether the window has changed since.
+    """
+
+    def __init__(self, database, max_age: timedelta = timedelta(hours=24)):
+        """
+        Args:
+            database: AsyncDatabaseConfig instance holding the digests table
+            max_age: How long after it was made a digest is still served
+        """
+        self.db = database
+        self.max_age = max_age
+
+    async def get(self, thread_id: int, timeframe: Optional[str], prompt: str, model: str) -> Optional[Digest]:
+        """The digest to answer a !sum with, or None if there is no usable one."""
+        digest = await self.db.get_digest(thread_id, window_seconds(timeframe))
+        usable = (
+            digest is not None
+            and digest.prompt_hash == prompt_hash(prompt, model)
+            and datetime.utcnow() - digest.as_of <= self.max_age
+        )
+        digest_lookups.inc(result="hit" if usable else "miss")
+        return digest if usable else None
+
+    async def put(self, thread_id: int, timeframe: Optional[str], prompt: str, model: str,
+                  summary: str, as_of: datetime, activity: str) -> None:
+        await self.db.save_digest(thread_id, window_seconds(timeframe), prompt_hash(prompt, model),
+                                  summary, as_of, activity)
+
+    async def touch(self, thread_id: int, timeframe: Optional[str], as_of: datetime) -> None:
+        """Mark a digest as still covering the window ending at `as_of`."""
+        await self.db.touch_digest(thread_id, window_seconds(timeframe), as_of)
+
+    async def delete(self, thread_id: int, timeframe: Optional[str]) -> None:
+        """Drop a thread's digest of a window, e.g. once the window holds no messages."""
+        await self.db.delete_digest(thread_id, window_seconds(timeframe))
+
+class DigestScheduler:
+    """
+    Precomputes the default-window summaries of every stored thread, so
+    common !sum requests are answered from the digest store and AI load
+    moves out of interactive hours.
+
+    Per run:
+    - A window holding exactly the messages its digest was made from (none
+      new, edited, deleted or aged out) with the same prompt and model is
+      skipped; the digest still describes it, so its `as_of` moves forward
+      and it keeps being served.
+    - A window with no messages has nothing to summarize: its digest is
+      deleted, so !sum reports the quiet window instead of an old summary.
+    - The remaining jobs start `stagger` seconds apart, at most
+      `concurrency` at a time, so a run never floods the AI provider.
+    - A failed job keeps the thread's previous digest and is retried on
+      the next run.
+    """
+
+    def __init__(self, store: DigestStore,
+                 summarize: Callable[[object, str, str], Awaitable[str]],
+                 prompt_for: Callable[[object], str],
+                 model_for: Callable[[], str],
+                 timeframes: Sequence[str] = DEFAULT_TIMEFRAMES,
+                 concurrency: int = 2, stagger: float = 15.0):
+        """
+        Args:
+            store: Where digests are kept
+            summarize: Produces a thread's summary for (thread, timeframe, prompt);
+                raises on failure
+            prompt_for: The summary prompt of a thread
+            model_for: Name of the model summaries are currently made with
+            timeframes: !sum timeframes to precompute
+            concurrency: Jobs running at once
+            stagger: Seconds between job starts
+        """
+        self.store = store
+        self.db = store.db
+        self.summarize = summarize
+        self.prompt_for = prompt_for
+        self.model_for = model_for
+        self.timeframes = tuple(timeframes)
+        self.concurrency = concurrency
+        self.stagger = stagger
+        self._running = False
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Refresh the digests of every stored thread.
+
+        Returns:
+            dict: Number of jobs computed, skipped, empty and failed
+        """
+        counts = {"computed": 0, "skipped": 0, "empty": 0, "failed": 0}
+        if self._running:
+            print("Previous digest run is still going; skipping this one")
+            return counts
+        self._running = True
+        tasks: List[asyncio.Task] = []
+        try:
+            jobs = []
+            model = self.model_for()
+            for thread in await self.db.get_threads():
+                prompt = self.prompt_for(thread)
+                for timeframe in self.timeframes:
+                    start, as_of = parse_timeframe(timeframe)
+                    count, _ = await token_index.window_stats(thread.thread_id, start, as_of)
+                    if not count:
+                        await self.store.delete(thread.thread_id, timeframe)
+                        counts["empty"] += 1
+                        continue
+                    digest = await self.db.get_digest(thread.thread_id, window_seconds(timeframe))
+                    if (digest is not None and digest.prompt_hash == prompt_hash(prompt, model)
+                            and digest.activity == await self.db.window_digest(thread.thread_id, start, as_of)):
+                        await self.store.touch(thread.thread_id, timeframe, as_of)
+                        counts["skipped"] += 1
+                        continue
+                    jobs.append((thread, timeframe, prompt))
+
+            print(f"Digest run: {len(jobs)} to compute, {counts['skipped']} unchanged, {counts['empty']} empty")
+            slots = asyncio.Semaphore(self.concurrency)
+            for i, job in enumerate(jobs):
+                if i:
+                    await asyncio.sleep(self.stagger)
+                await slots.acquire()
+                tasks.append(asyncio.create_task(self._run_job(slots, model, *job)))
+            for outcome in await asyncio.gather(*tasks):
+                counts[outcome] += 1
+        finally:
+            # Only does anything if the run itself was cancelled (shutdown)
+            for task in tasks:
+                task.cancel()
+            self._running = False
+
+        for outcome in ("skipped", "empty"):
+            if counts[outcome]:
+                digest_jobs.inc(counts[outcome], outcome=outcome)
+        print(f"Digest run finished: {counts['computed']} computed, {counts['skipped']} skipped, "
+              f"{counts['empty']} empty, {counts['failed']} failed")
+        return counts
+
+    async def _run_job(self, slots: asyncio.Semaphore, model: str, thread, timeframe: str,
+                       prompt: str) -> str:
+        current_requester.set(REQUESTER)
+        try:
+            # Taken before summarizing, so a message arriving meanwhile makes
+            # the next run recompute rather than skip
+            start, as_of = parse_timeframe(timeframe)
+            activity = await self.db.window_digest(thread.thread_id, start, as_of)
+            count, _ = await token_index.window_stats(thread.thread_id, start, as_of)
+            if not count:
+                # Emptied while the job waited its turn (messages aged out or were deleted)
+                await self.store.delete(thread.thread_id, timeframe)
+                outcome = "empty"
+            else:
+                summary = await self.summarize(thread, timeframe, prompt)
+                await self.store.put(thread.thread_id, timeframe, prompt, model, summary, as_of, activity)
+                outcome = "computed"
+        except Exception as e:
+            print(f"Error precomputing {timeframe} digest for thread {thread.nickname}: {e}")
+            outcome = "failed"
+        finally:
+            slots.release()
+        digest_jobs.inc(outcome=outcome)
+        return outcome
+
+# Precomputed summaries checked by !sum before generating one
+digest_store = DigestStore(async_db, max_age=timedelta(hours=float(os.getenv("DIGEST_MAX_AGE_HOURS", "24"))))
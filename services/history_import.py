@@ -0,0 +1,151 @@
+import asyncio
+import time
+from datetime import timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+from config.async_database import async_db
+from config.retention import RetentionPolicy, retention_policy
+from permissions import get_user_role
+from services.reply_resolver import reply_resolver
+
+# Called with the number of messages imported so far
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+class HistoryImporter:
+    """
+    Resumable bulk import of Discord thread history.
+
+    History is read oldest first and written one page per transaction with
+    a bulk upsert. Each page also advances the thread's row in
+    import_checkpoints, so an interrupted import continues after the last
+    stored message instead of starting over, and re-imported rows are
+    deduplicated by Discord message ID. The next page is fetched from
+    Discord while the previous one is being written. Several threads can be
+    imported at once, up to a global limit.
+    """
+
+    def __init__(self, database, policy: RetentionPolicy = retention_policy, page_size: int = 500,
+                 max_concurrent_imports: int = 3, progress_interval: float = 5.0):
+        """
+        Args:
+            database: AsyncDatabaseConfig instance the pages are written to
+            policy: Retention policy; messages it would delete are not imported
+            page_size: Messages written per transaction
+            max_concurrent_imports: Threads imported at the same time
+            progress_interval: Minimum seconds between progress callbacks
+        """
+        self.db = database
+        self.policy = policy
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self._slots = asyncio.Semaphore(max_concurrent_imports)
+        self._active: Dict[int, asyncio.Task] = {}
+
+    async def import_thread(self, thread: discord.Thread,
+                            progress: Optional[ProgressCallback] = None) -> int:
+        """
+        Import a thread's history, resuming from its checkpoint if one exists.
+
+        A second call for a thread that is already being imported waits for
+        the running import instead of starting another.
+
+        Args:
+            thread: Thread to import
+            progress: Optional coroutine called with the running count,
+                      at most once per progress_interval
+
+        Returns:
+            int: Number of messages imported by this run
+        """
+        task = self._active.get(thread.id)
+        if task is None:
+            task = asyncio.create_task(self._import(thread, progress))
+            self._active[thread.id] = task
+            task.add_done_callback(lambda _: self._active.pop(thread.id, None))
+        return await asyncio.shield(task)
+
+    async def resume_incomplete(self, bot: discord.Client) -> None:
+        """Resume imports that were interrupted, e.g. by a restart."""
+        thread_ids = await self.db.get_incomplete_imports()
+        if not thread_ids:
+            return
+        print(f"Resuming history import for {len(thread_ids)} threads")
+
+        async def resume(thread_id: int) -> None:
+            try:
+                thread = bot.get_channel(thread_id) or await bot.fetch_channel(thread_id)
+                count = await self.import_thread(thread)
+                print(f"Resumed import of thread {thread_id}: {count} messages")
+            except (discord.NotFound, discord.Forbidden):
+                print(f"Cannot resume import of thread {thread_id}: thread is not accessible")
+            except Exception as e:
+                print(f"Error resuming import of thread {thread_id}: {e}")
+
+        await asyncio.gather(*(resume(thread_id) for thread_id in thread_ids))
+
+    async def _import(self, thread: discord.Thread, progress: Optional[ProgressCallback]) -> int:
+        async with self._slots:
+            checkpoint = await self.db.get_import_checkpoint(thread.id)
+            stored = await self.db.get_thread_by_id(thread.id)
+            cutoff = self.policy.cutoff(stored.retention_days if stored else None).replace(tzinfo=timezone.utc)
+            # Start after whichever is newer: the checkpoint or the retention cutoff
+            after_id = discord.utils.time_snowflake(cutoff)
+            if checkpoint and checkpoint.last_message_id:
+                after_id = max(after_id, checkpoint.last_message_id)
+
+            imported = 0
+            rows: List[Dict[str, Any]] = []
+            last_id: Optional[int] = None
+            pending_write: Optional[asyncio.Task] = None
+            last_report = time.monotonic()
+
+            async def write(page: List[Dict[str, Any]], page_last_id: Optional[int],
+                            completed: bool = False) -> None:
+                nonlocal pending_write, imported
+                # Keep at most one write in flight so pages commit in order
+                if pending_write is not None:
+                    imported += await pending_write
+                pending_write = asyncio.create_task(
+                    self.db.import_message_page(thread.id, page, page_last_id, completed)
+                )
+
+            try:
+                async for msg in thread.history(limit=None, after=discord.Object(id=after_id),
+                                                oldest_first=True):
+                    last_id = msg.id
+                    reply_resolver.remember(msg)
+                    if not msg.author.bot and msg.content.strip():
+                        rows.append(self.db.message_row(
+                            thread_id=thread.id,
+                            author=str(msg.author),
+                            role=get_user_role(msg.author),
+                            content=msg.content.strip(),
+                            created_at=msg.created_at,
+                            reply_to=await reply_resolver.label(msg),
+                            edited=msg.edited_at is not None,
+                            edited_at=msg.edited_at,
+                            discord_message_id=msg.id
+                        ))
+
+                    if len(rows) >= self.page_size:
+                        await write(rows, last_id)
+                        rows = []
+
+                    now = time.monotonic()
+                    if progress and now - last_report >= self.progress_interval:
+                        last_report = now
+                        await progress(imported + len(rows))
+
+                await write(rows, last_id, completed=True)
+                imported += await pending_write
+                pending_write = None
+                return imported
+            finally:
+                if pending_write is not None and not pending_write.done():
+                    # Let the in-flight page commit so the checkpoint stays consistent
+                    await asyncio.gather(pending_write, return_exceptions=True)
+
+# Process-wide importer; the concurrency limit applies across all imports
+history_importer = HistoryImporter(async_db)
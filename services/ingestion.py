@@ -0,0 +1,209 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+class IngestionQueue:
+    """
+    Write-behind queue for incoming Discord messages.
+
+    Event handlers push inserts, edits and deletes onto a bounded in-memory
+    queue and return immediately. A background writer task drains the queue in batches and
+    hands each batch to the database in a worker thread, so the event loop
+    never waits on a commit.
+    """
+
+    def __init__(self, database, max_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, put_timeout: float = 5.0):
+        """
+        Initialize the ingestion queue.
+
+        Args:
+            database: DatabaseConfig instance that performs the bulk inserts
+            max_size: Maximum number of operations waiting to be written
+            batch_size: Flush as soon as this many operations are pending
+            flush_interval: Flush at least this often (seconds) while operations are pending
+            put_timeout: How long put() waits for free space before dropping an operation
+        """
+        self.db = database
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        # Operations submitted while stop() drains the queue, written after it
+        self._late: List[Tuple[str, Dict[str, Any]]] = []
+
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        """
+        True while the queue accepts operations and we are on its event loop.
+
+        This includes the time stop() spends draining the queue, so writes made
+        meanwhile are still applied after the ones already queued.
+        """
+        if self._writer is None or (self._writer.done() and not self._closing):
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    @property
+    def depth(self) -> int:
+        """Number of operations currently waiting to be written."""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop."""
+        if self._writer and not self._writer.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._writer = self._loop.create_task(self._run())
+        self.db.ingestion_queue = self
+
+    async def stop(self) -> None:
+        """Stop accepting operations and flush everything still in the queue."""
+        if self._writer is None:
+            return
+        self._closing = True
+        # The sentinel is queued behind pending operations, so they are all written first
+        await self._queue.put(None)
+        await self._writer
+        # Then whatever arrived while draining, in arrival order
+        while self._late:
+            batch, self._late = self._late, []
+            await self._flush(batch)
+        if self.db.ingestion_queue is self:
+            self.db.ingestion_queue = None
+        self._writer = None
+        self._closing = False
+        print(f"Ingestion queue stopped: {self.stats}")
+
+    async def put(self, **fields: Any) -> bool:
+        """
+        Enqueue a message row, waiting for space if the queue is full.
+
+        Accepts the same keyword arguments as DatabaseConfig.save_message.
+
+        Returns:
+            bool: False if the row was dropped because the queue stayed full
+        """
+        return await self.submit("insert", self.db.message_row(**fields))
+
+    async def put_edit(self, discord_message_id: int, content: str, edited_at: datetime) -> bool:
+        """Enqueue a content update for a stored message."""
+        return await self.submit("edit", dict(
+            discord_message_id=discord_message_id,
+            content=content,
+            edited_at=edited_at
+        ))
+
+    async def put_delete(self, discord_message_id: int) -> bool:
+        """Enqueue the removal of a stored message."""
+        return await self.submit("delete", dict(discord_message_id=discord_message_id))
+
+    async def submit(self, op: str, payload: Dict[str, Any]) -> bool:
+        """
+        Enqueue a database operation, waiting up to put_timeout for free space.
+
+        Inserts, edits and deletes share one queue so they are applied in the
+        order Discord delivered them.
+        """
+        if not self.running:
+            # Stopped or never started: write through instead of losing the row
+            written = await asyncio.to_thread(self.db.apply_message_ops, [(op, payload)])
+            return written == 1
+        if self._closing:
+            self._late.append((op, payload))
+            self.stats["enqueued"] += 1
+            return True
+        try:
+            await asyncio.wait_for(self._queue.put((op, payload)), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self._drop(op, payload, "full")
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def submit_nowait(self, op: str, payload: Dict[str, Any]) -> bool:
+        """
+        Enqueue a database operation without waiting.
+
+        Never writes on the calling thread, so it is safe on the event loop.
+
+        Returns:
+            bool: False if the queue is full or not running and the operation was dropped
+        """
+        if not self.running:
+            self._drop(op, payload, "not running")
+            return False
+        if self._closing:
+            self._late.append((op, payload))
+            self.stats["enqueued"] += 1
+            return True
+        try:
+            self._queue.put_nowait((op, payload))
+        except asyncio.QueueFull:
+            self._drop(op, payload, "full")
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def _drop(self, op: str, payload: Dict[str, Any], reason: str) -> None:
+        self.stats["dropped"] += 1
+        print(f"Ingestion queue {reason}, dropped {op} for message {payload.get('discord_message_id')}")
+
+    async def _run(self) -> None:
+        """Drain the queue, flushing by batch size or by flush interval."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch: List[Tuple[str, Dict[str, Any]]] = [item]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Write one batch in a worker thread and update the counters."""
+        try:
+            written = await asyncio.to_thread(self.db.apply_message_ops, batch)
+        except Exception as e:
+            print(f"Error writing ingestion batch: {e}")
+            written = 0
+        self.stats["batches"] += 1
+        self.stats["written"] += written
+        self.stats["failed"] += len(batch) - written
@@ -0,0 +1,500 @@
+import functools
+from bisect import bisect_left
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import event
+
+# Default histogram buckets in seconds, from fast DB calls to slow AI calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Statements slower than this are counted and kept in recent_slow_queries (ms)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+
+LabelValues = Tuple[str, ...]
+
+INF_LABEL = 'le="+Inf"'
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        return iter(())
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+class Gauge(_Metric):
+    """
+    Value read at scrape time from a callback. The callback returns a number,
+    or a {label value: number} dict for a gauge with one label.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callback: Optional[Callable[[], Union[float, Dict[str, float]]]] = None
+
+    def set_function(self, callback: Callable[[], Union[float, Dict[str, float]]]) -> None:
+        self._callback = callback
+
+    def values(self) -> Dict[LabelValues, float]:
+        if self._callback is None:
+            return {}
+        try:
+            value = self._callback()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return {}
+        if isinstance(value, dict):
+            return {(str(label),): float(v) for label, v in value.items()}
+        return {(): float(value)}
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.total = 0.0
+        self.count = 0
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, by default) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    def time(self, **labels: Any) -> "_Timer":
+        """Context manager observing the duration of its body."""
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[LabelValues, Dict[str, float]]:
+        """Per label set: count, sum, and p50/p95 estimated from the buckets."""
+        with self._lock:
+            series = {key: (list(s.counts), s.total, s.count) for key, s in self._series.items()}
+        return {
+            key: {"count": count, "sum": total,
+                  "p50": self._quantile(counts, count, 0.5), "p95": self._quantile(counts, count, 0.95)}
+            for key, (counts, total, count) in series.items()
+        }
+
+    def _quantile(self, counts: List[int], count: int, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            series = {key: (list(s.counts), s.total, s.count) for key, s in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+class MetricsRegistry:
+    """Named metrics, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry and the bot's metrics
+metrics = MetricsRegistry()
+
+event_latency = metrics.histogram(
+    "feedback_event_handler_seconds", "Time spent in Discord event handlers", ["event"])
+db_call_latency = metrics.histogram(
+    "feedback_db_call_seconds", "Duration of DatabaseConfig / AsyncDatabaseConfig method calls", ["api", "method"])
+db_statement_latency = metrics.histogram(
+    "feedback_db_statement_seconds", "Duration of individual SQL statements", ["statement"])
+db_slow_statements = metrics.counter(
+    "feedback_db_slow_statements_total", f"SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)", ["statement"])
+ingestion_depth = metrics.gauge(
+    "feedback_ingestion_queue_depth", "Message operations waiting for the ingestion writer")
+ingestion_operations = metrics.gauge(
+    "feedback_ingestion_operations", "Ingestion queue counters since start", ["stat"])
+ai_call_latency = metrics.histogram(
+    "feedback_ai_call_seconds", "AI provider call duration, including time waiting for a slot",
+    ["provider", "mode", "outcome"])
+ai_tokens = metrics.counter(
+    "feedback_ai_tokens_total", "Tokens reported by AI providers", ["provider", "kind"])
+ai_router_events = metrics.counter(
+    "feedback_ai_router_events_total", "Hedged requests, failovers and circuit breaker trips", ["provider", "event"])
+ai_circuit_open = metrics.gauge(
+    "feedback_ai_circuit_open", "1 while a provider's circuit breaker is open", ["provider"])
+dedup_latency = metrics.histogram(
+    "feedback_dedup_seconds", "Time to read, collapse near-duplicates in and pack one transcript window")
+dedup_messages = metrics.counter(
+    "feedback_dedup_messages_total", "Transcript messages before and after near-duplicate collapsing", ["stage"])
+dedup_tokens = metrics.counter(
+    "feedback_dedup_tokens_total", "Transcript tokens before and after near-duplicate collapsing", ["stage"])
+digest_jobs = metrics.counter(
+    "feedback_digest_jobs_total", "Scheduled digest jobs by outcome (computed, skipped, empty, failed)", ["outcome"])
+digest_lookups = metrics.counter(
+    "feedback_digest_lookups_total", "!sum requests answered from a precomputed digest (hit) or not (miss)", ["result"])
+bucket_sections = metrics.counter(
+    "feedback_bucket_sections_total", "Sections of long summaries reused from the bucket cache or summarized", ["outcome"])
+summary_cache_lookups = metrics.counter(
+    "feedback_summary_cache_lookups_total", "Finished-summary cache lookups by result (memory_hit, db_hit, miss)", ["result"])
+thread_status_lookups = metrics.counter(
+    "feedback_thread_status_lookups_total", "Thread statuses for !listThreads by source (gateway, cache, fetch)", ["source"])
+reply_lookups = metrics.counter(
+    "feedback_reply_lookups_total", "Reply targets resolved from memory, the database, or missed (API path)", ["result"])
+reply_fetches = metrics.counter(
+    "feedback_reply_fetches_total", "Discord history calls made to resolve reply targets, by outcome", ["outcome"])
+discord_request_latency = metrics.histogram(
+    "feedback_discord_request_seconds", "Discord REST requests made by the bot, by route", ["route"])
+
+# Most recent slow statements: (time, milliseconds, statement text)
+recent_slow_queries: Deque[Tuple[datetime, float, str]] = deque(maxlen=20)
+
+def statement_kind(statement: str) -> str:
+    """First SQL keyword of a statement (SELECT, INSERT, ...), for low-cardinality labels."""
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA") else "OTHER"
+
+def instrument_engine(engine) -> None:
+    """Time every statement on a (sync) Engine and record slow ones."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        kind = statement_kind(statement)
+        db_statement_latency.observe(elapsed, statement=kind)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_statements.inc(statement=kind)
+            text = " ".join(statement.split())[:300]
+            recent_slow_queries.append((datetime.utcnow(), elapsed * 1000, text))
+            print(f"Slow query ({elapsed * 1000:.0f} ms): {text}")
+
+def instrument_methods(api: str) -> Callable[[type], type]:
+    """
+    Class decorator timing every public method into feedback_db_call_seconds.
+    Generators are left alone: their time is spent by the consumer.
+    """
+    def decorate(cls: type) -> type:
+        for name, member in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(member):
+                continue
+            if inspect.isgeneratorfunction(member) or inspect.isasyncgenfunction(member):
+                continue
+            setattr(cls, name, _timed_method(member, api, name))
+        return cls
+    return decorate
+
+def _timed_method(func: Callable, api: str, name: str) -> Callable:
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                db_call_latency.observe(time.perf_counter() - started, api=api, method=name)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_call_latency.observe(time.perf_counter() - started, api=api, method=name)
+    return wrapper
+
+def timed_event(handler: Optional[Callable] = None, *, event: Optional[str] = None) -> Callable:
+    """
+    Decorator recording a Discord event handler's duration.
+
+    Args:
+        handler: The coroutine function to time
+        event: Label to record under (default: the handler's name)
+    """
+    if handler is None:
+        return functools.partial(timed_event, event=event)
+    label = event or handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            event_latency.observe(time.perf_counter() - started, event=label)
+    return wrapper
+
+def instrument_discord_http(client) -> None:
+    """
+    Time every REST request a discord.py client makes, labelled by route
+    template (e.g. "GET /channels/{channel_id}" for fetch_channel).
+    """
+    http = client.http
+    if getattr(http, "_metrics_installed", False):
+        return
+    request = http.request
+
+    @functools.wraps(request)
+    async def timed_request(route, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await request(route, *args, **kwargs)
+        finally:
+            discord_request_latency.observe(time.perf_counter() - started,
+                                            route=f"{route.method} {route.path}")
+
+    http.request = timed_request
+    http._metrics_installed = True
+
+class MetricsServer:
+    """Serves the registry at /metrics over HTTP (for a local Prometheus scrape)."""
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        self._runner = None
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> None:
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(body=self.registry.render().encode("utf-8"),
+                                headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms" if seconds < 10 else f"{seconds:.1f} s"
+
+def _percent(part: float, total: float) -> str:
+    return f"{part / total * 100:.0f}%" if total else "0%"
+
+def _histogram_lines(histogram: Histogram, limit: int, label: Callable[[LabelValues], str]) -> List[str]:
+    # Label sets ordered by total time spent, largest first
+    rows = sorted(histogram.snapshot().items(), key=lambda item: item[1]["sum"], reverse=True)
+    return [
+        f"• {label(key)}: {stats['count']:.0f} × avg {_ms(stats['sum'] / stats['count'])}, "
+        f"p95 {_ms(stats['p95'])}"
+        for key, stats in rows[:limit] if stats["count"]
+    ]
+
+def stats_summary(limit: int = 5) -> str:
+    """Human-readable digest of the metrics for the !stats command."""
+    sections = ["📊 **Bot Stats**"]
+
+    events = _histogram_lines(event_latency, 10, lambda key: key[0])
+    sections.append("**Event handlers**\n" + ("\n".join(events) or "• none yet"))
+
+    queue = ingestion_operations.values()
+    depth = ingestion_depth.values().get((), 0)
+    sections.append(
+        f"**Ingestion queue**\n• depth {depth:.0f}, written {queue.get(('written',), 0):.0f}, "
+        f"dropped {queue.get(('dropped',), 0):.0f}, failed {queue.get(('failed',), 0):.0f}"
+    )
+
+    db_lines = _histogram_lines(db_call_latency, limit, lambda key: f"{key[0]}.{key[1]}")
+    slow = sum(db_slow_statements.values().values())
+    db_lines.append(f"• {slow:.0f} statements over {SLOW_QUERY_MS:g} ms")
+    if recent_slow_queries:
+        when, elapsed, text = recent_slow_queries[-1]
+        db_lines.append(f"• last slow: {elapsed:.0f} ms at {when:%H:%M:%S} UTC `{text[:120]}`")
+    sections.append(f"**Database** (top {limit} by total time)\n" + "\n".join(db_lines))
+
+    ai_lines = _histogram_lines(ai_call_latency, limit, lambda key: f"{key[0]} {key[1]} ({key[2]})")
+    tokens = ai_tokens.values()
+    for provider in sorted({key[0] for key in tokens}):
+        ai_lines.append(f"• {provider} tokens: {tokens.get((provider, 'prompt'), 0):.0f} prompt, "
+                        f"{tokens.get((provider, 'completion'), 0):.0f} completion")
+    events = ai_router_events.values()
+    if events:
+        ai_lines.append("• routing: " + ", ".join(
+            f"{provider} {event} {count:.0f}" for (provider, event), count in sorted(events.items())))
+    tripped = [provider for (provider,), value in ai_circuit_open.values().items() if value]
+    if tripped:
+        ai_lines.append(f"• circuit open: {', '.join(sorted(tripped))}")
+    collapsed = dedup_messages.values()
+    if collapsed:
+        tokens = dedup_tokens.values()
+        tokens_in, tokens_out = tokens.get(("input",), 0), tokens.get(("output",), 0)
+        stage = dedup_latency.snapshot().get((), {})
+        ai_lines.append(
+            f"• near-duplicates: {collapsed.get(('input',), 0):.0f} → {collapsed.get(('output',), 0):.0f} messages, "
+            f"prompt tokens -{(1 - tokens_out / tokens_in) * 100 if tokens_in else 0:.0f}%, "
+            f"p95 {_ms(stage.get('p95', 0))} per window"
+        )
+    buckets = bucket_sections.values()
+    if buckets:
+        ai_lines.append(f"• bucket cache: {buckets.get(('reused',), 0):.0f} sections reused, "
+                        f"{buckets.get(('summarized',), 0):.0f} summarized")
+    jobs = digest_jobs.values()
+    if jobs:
+        lookups = digest_lookups.values()
+        ai_lines.append(
+            f"• digests: {jobs.get(('computed',), 0):.0f} computed, {jobs.get(('skipped',), 0):.0f} skipped, "
+            f"{jobs.get(('empty',), 0):.0f} empty, {jobs.get(('failed',), 0):.0f} failed; !sum served {lookups.get(('hit',), 0):.0f} of "
+            f"{sum(lookups.values()):.0f} from digests"
+        )
+    sections.append("**AI calls**\n" + ("\n".join(ai_lines) or "• none yet"))
+
+    cache_lines = []
+    lookups = summary_cache_lookups.values()
+    if lookups:
+        total = sum(lookups.values())
+        misses = lookups.get(("miss",), 0)
+        cache_lines.append(
+            f"• summaries: {total:.0f} lookups, {_percent(total - misses, total)} served without AI calls "
+            f"(memory {lookups.get(('memory_hit',), 0):.0f}, database {lookups.get(('db_hit',), 0):.0f})"
+        )
+    lookups = thread_status_lookups.values()
+    if lookups:
+        total = sum(lookups.values())
+        fetches = lookups.get(("fetch",), 0)
+        cache_lines.append(
+            f"• thread statuses: {total:.0f} lookups, {_percent(total - fetches, total)} without an API call "
+            f"(gateway {lookups.get(('gateway',), 0):.0f}, cache {lookups.get(('cache',), 0):.0f})"
+        )
+    lookups = reply_lookups.values()
+    if lookups:
+        total = sum(lookups.values())
+        fetches = sum(reply_fetches.values().values())
+        cache_lines.append(
+            f"• reply targets: {total:.0f} lookups, {_percent(total - fetches, total)} without an API call "
+            f"(memory {lookups.get(('memory_hit',), 0):.0f}, database {lookups.get(('db_hit',), 0):.0f}, "
+            f"{fetches:.0f} history fetches)"
+        )
+    sections.append("**Caches**\n" + ("\n".join(cache_lines) or "• none yet"))
+
+    rest = _histogram_lines(discord_request_latency, limit, lambda key: f"`{key[0]}`")
+    sections.append(f"**Discord REST** (top {limit})\n" + ("\n".join(rest) or "• none yet"))
+
+    return "\n\n".join(sections)
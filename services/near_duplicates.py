@@ -0,0 +1,188 @@
+"""
+Near-duplicate collapsing for transcripts.
+
+Feedback threads repeat themselves ("+1", "same here", the same complaint
+reworded slightly). Before a transcript is sent to the AI, each message is
+fingerprinted with a 64-bit SimHash of its word pairs, and messages nearly
+identical to an earlier one are dropped; the earlier one is kept in place
+with a count, e.g. "user: same here (×14 similar)".
+
+Candidates are found with locality-sensitive hashing: the fingerprint is cut
+into 4 bands of 16 bits, and any two fingerprints at most 3 bits apart share
+at least one band exactly, so each message is compared only with messages in
+its band buckets rather than with every earlier one. Candidates are confirmed
+with the Jaccard similarity of their word-pair sets, so messages that differ
+in one meaningful word ("too long" / "too short") are kept apart.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Fingerprint bits two messages may differ in (must be below BANDS for the banding to find them)
+MAX_DISTANCE = 3
+# Word-pair Jaccard similarity required to treat two messages as duplicates
+MIN_SIMILARITY = 0.8
+
+# SimHash bit counts are summed in 16-bit lanes of one big integer; at most
+# this many features per message are used so a lane cannot overflow
+LANE_BITS = 16
+MAX_FEATURES = 4096
+# 1 in the lowest bit of every lane, and in the highest bit of every lane
+_LANE_ONES = sum(1 << (bit * LANE_BITS) for bit in range(FINGERPRINT_BITS))
+_LANE_HIGH_BITS = _LANE_ONES << (LANE_BITS - 1)
+# Turns a lane's high byte (0x80 or 0x00 once masked) into a binary digit
+_HIGH_BYTE_DIGITS = bytes.maketrans(b"\x80\x00", b"10")
+
+WORD_PATTERN = re.compile(r"[\w+']+")
+
+def message_features(content: str) -> FrozenSet[str]:
+    """
+    Features a message is compared on: its lowercased word pairs, so word
+    order counts; its words if it has fewer than three; the stripped text if
+    it has none (e.g. emoji).
+    """
+    words = WORD_PATTERN.findall(content.lower())
+    if len(words) >= 3:
+        return frozenset(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if not words:
+        stripped = content.strip()
+        return frozenset([stripped]) if stripped else frozenset()
+    return frozenset(words)
+
+@lru_cache(maxsize=65536)
+def _feature_lanes(feature: str) -> int:
+    """A feature's 64-bit hash with each bit spread into its own 16-bit lane."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+    lanes = 0
+    for bit in range(FINGERPRINT_BITS):
+        if digest >> bit & 1:
+            lanes |= 1 << (bit * LANE_BITS)
+    return lanes
+
+def simhash(features: FrozenSet[str]) -> int:
+    """64-bit SimHash: bit i is set when most features' hashes have bit i set."""
+    if len(features) > MAX_FEATURES:
+        features = sorted(features)[:MAX_FEATURES]
+    total = sum(map(_feature_lanes, features))
+    # Lane i holds how many features have bit i set. Adding 2**15 - (n // 2 + 1)
+    # to every lane sets the lane's top bit exactly when its count exceeds
+    # n / 2, for all 64 lanes in one addition; the top bits are then read
+    # out as a binary string, most significant lane first.
+    threshold = (1 << (LANE_BITS - 1)) - (len(features) // 2 + 1)
+    high = (total + threshold * _LANE_ONES) & _LANE_HIGH_BITS
+    digits = high.to_bytes(FINGERPRINT_BITS * LANE_BITS // 8, "big")[::2].translate(_HIGH_BYTE_DIGITS)
+    return int(digits, 2)
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+@dataclass
+class _Cluster:
+    line: int              # Index of the representative line
+    fingerprint: int
+    features: FrozenSet[str]
+    size: int = 1
+
+@dataclass
+class CollapseResult:
+    """Transcript lines after collapsing, with before/after sizes."""
+    lines: List[str] = field(default_factory=list)
+    token_counts: List[int] = field(default_factory=list)
+    messages_in: int = 0
+    tokens_in: int = 0
+
+    @property
+    def messages_out(self) -> int:
+        return len(self.lines)
+
+    @property
+    def tokens_out(self) -> int:
+        return sum(self.token_counts)
+
+class NearDuplicateCollapser:
+    """
+    Collapses near-duplicate messages of one transcript, in order.
+
+    Messages from users with a role ([Mod], [Dev]) are always kept as they
+    are; they often confirm or answer the feedback around them.
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE, min_similarity: float = MIN_SIMILARITY):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for banded lookup")
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+
+    def collapse(self, rows: Iterable[Tuple[Optional[str], str, str, int]],
+                 format_line, suffix_tokens: int = 4) -> CollapseResult:
+        """
+        Collapse near-duplicates in (role, author, content, token_count) rows.
+
+        Args:
+            rows: Messages, oldest first
+            format_line: Builds a transcript line from (role, author, content)
+            suffix_tokens: Tokens added for the "(×N similar)" note
+
+        Returns:
+            CollapseResult with one line per kept message
+        """
+        result = CollapseResult()
+        clusters: List[_Cluster] = []
+        bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        # Exact repeats ("+1") skip fingerprinting altogether
+        by_features: Dict[FrozenSet[str], _Cluster] = {}
+
+        for role, author, content, token_count in rows:
+            result.messages_in += 1
+            result.tokens_in += token_count
+            if role:
+                result.lines.append(format_line(role, author, content))
+                result.token_counts.append(token_count)
+                continue
+
+            features = message_features(content)
+            match = by_features.get(features)
+            if match is None:
+                fingerprint = simhash(features)
+                keys = [(fingerprint >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+                match = self._find(clusters, bands, keys, fingerprint, features)
+            if match is not None:
+                match.size += 1
+                continue
+
+            index = len(clusters)
+            cluster = by_features[features] = _Cluster(len(result.lines), fingerprint, features)
+            clusters.append(cluster)
+            for band, key in zip(bands, keys):
+                band.setdefault(key, []).append(index)
+            result.lines.append(format_line(role, author, content))
+            result.token_counts.append(token_count)
+
+        for cluster in clusters:
+            if cluster.size > 1:
+                result.lines[cluster.line] += f" (×{cluster.size} similar)"
+                result.token_counts[cluster.line] += suffix_tokens
+        return result
+
+    def _find(self, clusters: List[_Cluster], bands: List[Dict[int, List[int]]], keys: List[int],
+              fingerprint: int, features: FrozenSet[str]) -> Optional[_Cluster]:
+        seen = set()
+        for band, key in zip(bands, keys):
+            for index in band.get(key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                cluster = clusters[index]
+                if (bin(cluster.fingerprint ^ fingerprint).count("1") <= self.max_distance
+                        and jaccard(cluster.features, features) >= self.min_similarity):
+                    return cluster
+        return None
@@ -0,0 +1,133 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import discord
+
+from config.async_database import async_db
+from services.metrics import reply_fetches, reply_lookups
+
+# (author, created_at) of a message, or None if it no longer exists
+ReplyTarget = Optional[Tuple[str, datetime]]
+
+class ReplyResolver:
+    """
+    Resolves the message a reply points to without a REST call per reply.
+
+    Lookups go through three tiers:
+    1. An LRU of recently seen message IDs (fed by on_message and imports)
+    2. The messages table, by Discord message ID
+    3. The Discord API, as a last resort. One history(around=...) call
+       fetches the target together with its neighbours, which are added to
+       the LRU; concurrent lookups of the same message share one call and
+       at most `max_concurrent_fetches` calls run at a time.
+    """
+
+    def __init__(self, database, max_entries: int = 10000, fetch_window: int = 50,
+                 max_concurrent_fetches: int = 2):
+        """
+        Args:
+            database: AsyncDatabaseConfig instance used for the second tier
+            max_entries: Message IDs kept in the LRU
+            fetch_window: Messages requested around a target from the API
+            max_concurrent_fetches: API lookups allowed in flight at once
+        """
+        self.db = database
+        self.max_entries = max_entries
+        self.fetch_window = fetch_window
+        self._cache: "OrderedDict[int, ReplyTarget]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+
+    def remember(self, message: discord.Message) -> None:
+        """Record a message so later replies to it resolve from memory."""
+        self._store(message.id, (str(message.author), message.created_at))
+
+    async def label(self, message: discord.Message) -> Optional[str]:
+        """
+        Describe the message `message` replies to, as stored in reply_to.
+
+        Returns:
+            "author (YYYY-mm-dd HH:MM:SS)", or None if the message is not a
+            reply or its target no longer exists
+        """
+        reference = message.reference
+        if reference is None or reference.message_id is None:
+            return None
+
+        if isinstance(reference.resolved, discord.Message):
+            self.remember(reference.resolved)
+            target = (str(reference.resolved.author), reference.resolved.created_at)
+        else:
+            target = await self.resolve(reference.message_id, message.channel)
+
+        if target is None:
+            return None
+        author, created_at = target
+        return f"{author} ({created_at.strftime('%Y-%m-%d %H:%M:%S')})"
+
+    async def resolve(self, message_id: int, channel: discord.abc.Messageable) -> ReplyTarget:
+        """Look up a message's author and time, trying memory, then the database, then the API."""
+        if message_id in self._cache:
+            self._cache.move_to_end(message_id)
+            reply_lookups.inc(result="memory_hit")
+            return self._cache[message_id]
+
+        target = await self.db.get_message_author(message_id)
+        if target is not None:
+            reply_lookups.inc(result="db_hit")
+            self._store(message_id, target)
+            return target
+
+        reply_lookups.inc(result="miss")
+        pending = self._inflight.get(message_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[message_id] = future
+        try:
+            target = await self._fetch(message_id, channel)
+            future.set_result(target)
+            return target
+        except Exception as e:
+            print(f"Error resolving reply target {message_id}: {e}")
+            future.set_result(None)
+            return None
+        finally:
+            # If this lookup was cancelled, lookups waiting on it get no target
+            # rather than waiting forever
+            if not future.done():
+                future.set_result(None)
+            del self._inflight[message_id]
+
+    async def _fetch(self, message_id: int, channel: discord.abc.Messageable) -> ReplyTarget:
+        async with self._fetch_slots:
+            # Another lookup may have fetched this message's neighbourhood meanwhile
+            if message_id in self._cache:
+                return self._cache[message_id]
+
+            async for msg in channel.history(limit=self.fetch_window, around=discord.Object(id=message_id)):
+                self.remember(msg)
+
+        if message_id not in self._cache:
+            # Deleted; remember that so later replies to it skip the API
+            reply_fetches.inc(outcome="not_found")
+            self._store(message_id, None)
+        else:
+            reply_fetches.inc(outcome="found")
+        return self._cache[message_id]
+
+    def clear(self) -> None:
+        """Forget every remembered message."""
+        self._cache.clear()
+
+    def _store(self, message_id: int, target: ReplyTarget) -> None:
+        self._cache[message_id] = target
+        self._cache.move_to_end(message_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+# Process-wide resolver shared by live ingestion and history imports
+reply_resolver = ReplyResolver(async_db)
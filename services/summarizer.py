@@ -1,20 +1,82 @@
+import asyncio
 import os
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from services.ai.base import AIProvider
 from services.ai.openai_provider import OpenAIProvider
-from config.ai_config import AIProvider as ProviderType, get_provider_settings, API_KEY_ENV_VARS
+from services.ai.anthropic_provider import AnthropicProvider
+from services.ai.local_provider import LocalLLMProvider
+from services.ai.router import CircuitBreaker, ProviderRouter, Route
+from config.ai_config import (AIProvider as ProviderType, DEFAULT_PROVIDER, FALLBACK_PROVIDERS,
+                              ROUTER_SETTINGS, get_provider_settings, API_KEY_ENV_VARS, BASE_URL_ENV_VARS)
+from config.prompts import CHUNK_PROMPT, REDUCE_PROMPT
+from utils.tokens import count_tokens, pack_lines
+
+# Tokens reserved for the part header and tokenizer differences between
+# our counts and the provider's
+PROMPT_MARGIN_TOKENS = 128
 
 class SummarizerService:
     """Service for generating summaries using configured AI provider."""
     
-    def __init__(self, provider_type: ProviderType = ProviderType.OPENAI):
+    def __init__(self, provider_type: ProviderType = DEFAULT_PROVIDER,
+                 fallbacks: Optional[List[ProviderType]] = None,
+                 max_window_tokens: int = 1_500_000, fan_in: int = 4, map_concurrency: int = 4):
         """
         Initialize the summarizer service.
         
         Args:
-            provider_type: Type of AI provider to use (default: OPENAI)
+            provider_type: Type of AI provider to use (default: AI_PROVIDER, else OPENAI)
+            fallbacks: Providers to fail over and hedge to, in order
+                (default: AI_FALLBACKS)
+            max_window_tokens: Refuse windows larger than this instead of making
+                hundreds of calls
+            fan_in: Number of partial summaries merged by each reduce call
+            map_concurrency: Maximum parallel calls for one hierarchical summary
+        """
+        self.fallbacks = FALLBACK_PROVIDERS if fallbacks is None else fallbacks
+        self._configure(provider_type)
+        self.max_window_tokens = max_window_tokens
+        self.fan_in = fan_in
+        self.map_concurrency = map_concurrency
+
+    def _configure(self, provider_type: ProviderType) -> None:
+        """
+        Route calls to `provider_type`, then to each configured fallback.
+
+        Fallbacks that cannot be initialized (e.g. no API key) are skipped.
+        Chunks are sized for the smallest context window among the routed
+        providers, so any of them can take any call.
         """
-        self.provider = self._initialize_provider(provider_type)
+        routed = {provider_type: self._initialize_provider(provider_type)}
+        for fallback in self.fallbacks:
+            if fallback in routed:
+                continue
+            try:
+                routed[fallback] = self._initialize_provider(fallback)
+            except ValueError as e:
+                print(f"Skipping fallback AI provider {fallback.value}: {e}")
+
+        routes = [self._route(routed_type, provider) for routed_type, provider in routed.items()]
+        self.provider_type = provider_type
+        self.provider = ProviderRouter(
+            routes,
+            hedge=ROUTER_SETTINGS["hedge"],
+            hedge_quantile=ROUTER_SETTINGS["hedge_quantile"],
+            default_hedge_delay=ROUTER_SETTINGS["default_hedge_delay"],
+            min_hedge_delay=ROUTER_SETTINGS["min_hedge_delay"],
+            max_hedges=ROUTER_SETTINGS["max_hedges"]
+        )
+        self.settings: Dict[str, Any] = dict(get_provider_settings(provider_type))
+        self.settings["context_window"] = min(
+            get_provider_settings(routed_type).get("context_window", 8192) for routed_type in routed
+        )
+        print(f"AI providers: {' -> '.join(route.name for route in routes)}")
+
+    @staticmethod
+    def _route(provider_type: ProviderType, provider: AIProvider) -> Route:
+        settings = get_provider_settings(provider_type)
+        breaker = CircuitBreaker(ROUTER_SETTINGS["failure_threshold"], ROUTER_SETTINGS["cooldown"])
+        return Route(provider, timeout=settings.get("timeout", 60.0), breaker=breaker)
         
     def _initialize_provider(self, provider_type: ProviderType) -> AIProvider:
         """
@@ -31,15 +93,42 @@ class SummarizerService:
         """
         settings = get_provider_settings(provider_type)
         api_key_var = API_KEY_ENV_VARS.get(provider_type)
+        base_url_var = BASE_URL_ENV_VARS.get(provider_type)
         
         if provider_type == ProviderType.OPENAI:
             if not api_key_var or not os.getenv(api_key_var):
                 raise ValueError(f"Missing API key for {provider_type.value}. Set {api_key_var} environment variable.")
             return OpenAIProvider(
                 api_key=os.getenv(api_key_var),
-                model=settings.get("model", "gpt-4")
+                model=settings.get("model", "gpt-4"),
+                base_url=os.getenv(base_url_var) if base_url_var else None,
+                timeout=settings.get("timeout", 60.0),
+                max_concurrency=settings.get("max_concurrency", 4),
+                max_tokens=settings.get("max_tokens", 1000),
+                temperature=settings.get("temperature", 0.7)
+            )
+        elif provider_type == ProviderType.ANTHROPIC:
+            if not api_key_var or not os.getenv(api_key_var):
+                raise ValueError(f"Missing API key for {provider_type.value}. Set {api_key_var} environment variable.")
+            return AnthropicProvider(
+                api_key=os.getenv(api_key_var),
+                model=settings.get("model", "claude-3-5-sonnet-latest"),
+                base_url=os.getenv(base_url_var) or "https://api.anthropic.com",
+                timeout=settings.get("timeout", 60.0),
+                max_concurrency=settings.get("max_concurrency", 4),
+                max_tokens=settings.get("max_tokens", 1000),
+                temperature=settings.get("temperature", 0.7)
+            )
+        elif provider_type == ProviderType.LOCAL_LLM:
+            return LocalLLMProvider(
+                base_url=os.getenv(base_url_var) or "http://127.0.0.1:8080",
+                model=settings.get("model", "llama2"),
+                api_style=settings.get("api_style", "openai"),
+                timeout=settings.get("timeout", 120.0),
+                max_concurrency=settings.get("max_concurrency", 1),
+                max_tokens=settings.get("max_tokens", 1000),
+                temperature=settings.get("temperature", 0.7)
             )
-        # Add other provider initializations here as they're implemented
         else:
             raise ValueError(f"Unsupported AI provider: {provider_type.value}")
     
@@ -49,6 +138,9 @@ class SummarizerService:
                              provider_type: Optional[ProviderType] = None) -> str:
         """
         Generate a summary using the configured AI provider.
+
+        Transcripts that fit in one chunk are sent in a single call; longer
+        ones are summarized hierarchically (see generate_hierarchical_summary).
         
         Args:
             messages: List of formatted messages to summarize
@@ -59,7 +151,195 @@ class SummarizerService:
             str: Generated summary
         """
         if provider_type and provider_type != self.provider_type:
-            # Switch provider if a different one is requested
-            self.provider = self._initialize_provider(provider_type)
-            
-        return await self.provider.generate_summary(messages, prompt)
\ No newline at end of file
+            # Switch primary provider if a different one is requested
+            self._configure(provider_type)
+
+        # Tokenizing a long transcript is CPU work; keep it off the event loop
+        chunks = await asyncio.to_thread(self.chunk_messages, messages, self.chunk_budget(prompt))
+        return await self.summarize_chunks(chunks, prompt)
+
+    async def summarize_chunks(self, chunks: List[List[str]], prompt: str) -> str:
+        """Summarize pre-packed chunks: one call if they fit in one, map-reduce otherwise."""
+        if len(chunks) <= 1:
+            return await self.provider.generate_summary(chunks[0] if chunks else [], prompt)
+        return await self.generate_hierarchical_summary(chunks, prompt)
+
+    async def stream_chunks(self, chunks: List[List[str]], prompt: str) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of summarize_chunks().
+
+        A single chunk is streamed directly. For map-reduce, the partial
+        summaries are computed as usual and only the final merge is streamed.
+        """
+        if len(chunks) <= 1:
+            async for piece in self.provider.stream_summary(chunks[0] if chunks else [], prompt):
+                yield piece
+            return
+
+        slots = asyncio.Semaphore(self.map_concurrency)
+        total = len(chunks)
+
+        async def summarize_chunk(index: int, lines: List[str]) -> str:
+            header = f"(Part {index + 1} of {total})"
+            return await self._call([header, *lines], f"{prompt}\n{CHUNK_PROMPT}", slots)
+
+        leaves = [asyncio.create_task(summarize_chunk(i, lines)) for i, lines in enumerate(chunks)]
+        async for piece in self._stream_reduce(leaves, prompt, slots):
+            yield piece
+
+    async def stream_merge(self, partials: List[str], prompt: str) -> AsyncIterator[str]:
+        """Streaming counterpart of merge_summaries()."""
+        slots = asyncio.Semaphore(self.map_concurrency)
+        async for piece in self._stream_reduce(self._ready(partials), prompt, slots):
+            yield piece
+
+    def chunk_budget(self, prompt: str) -> int:
+        """Input tokens available for transcript lines in one chunk call."""
+        context_window = self.settings.get("context_window", 8192)
+        completion_tokens = self.settings.get("max_tokens", 1000)
+        prompt_tokens = count_tokens(f"{prompt}\n{CHUNK_PROMPT}")
+        return max(context_window - completion_tokens - prompt_tokens - PROMPT_MARGIN_TOKENS, 256)
+
+    def check_window_size(self, window_tokens: int) -> None:
+        """
+        Fail fast on windows too large to summarize in reasonable time.
+
+        Raises:
+            ValueError: With a message suitable for showing to the moderator
+        """
+        if window_tokens > self.max_window_tokens:
+            raise ValueError(
+                f"This timeframe contains about {window_tokens:,} tokens, more than the "
+                f"{self.max_window_tokens:,} token limit. Try a shorter timeframe."
+            )
+
+    def chunk_messages(self, messages: List[str], budget: int) -> List[List[str]]:
+        """Split messages into consecutive chunks of at most `budget` tokens."""
+        return pack_lines(messages, budget)
+
+    async def generate_hierarchical_summary(self, chunks: List[List[str]], prompt: str) -> str:
+        """
+        Map-reduce summarization for transcripts that exceed the model context.
+
+        Every chunk is summarized concurrently (capped by map_concurrency and
+        the provider's own limit). Partial summaries are merged fan_in at a
+        time, recursively, until one remains. Each merge starts as soon as its
+        own inputs are ready rather than waiting for the whole level, so total
+        latency grows with the depth of the tree, not the number of messages.
+
+        Args:
+            chunks: Consecutive groups of formatted messages
+            prompt: System prompt to guide the summary generation
+
+        Returns:
+            str: Generated summary
+        """
+        slots = asyncio.Semaphore(self.map_concurrency)
+        total = len(chunks)
+
+        async def summarize_chunk(index: int, lines: List[str]) -> str:
+            header = f"(Part {index + 1} of {total})"
+            return await self._call([header, *lines], f"{prompt}\n{CHUNK_PROMPT}", slots)
+
+        leaves = [asyncio.create_task(summarize_chunk(i, lines)) for i, lines in enumerate(chunks)]
+        return await self._reduce_tree(leaves, prompt, slots)
+
+    async def summarize_section(self, chunks: List[List[str]], prompt: str, label: str) -> Optional[str]:
+        """
+        Partial summary of one section of a thread, e.g. a cached time bucket.
+
+        The result is meant to be merged with other sections by
+        merge_summaries(), not shown on its own.
+
+        Args:
+            chunks: The section's formatted messages, packed under chunk_budget()
+            prompt: System prompt to guide the summary generation
+            label: Line describing the section, placed before its messages
+
+        Returns:
+            The partial summary, or None if the section has no messages (e.g.
+            they were deleted after the window was sized)
+        """
+        if not chunks:
+            return None
+        if len(chunks) == 1:
+            return await self.provider.generate_summary([label, *chunks[0]], f"{prompt}\n{CHUNK_PROMPT}")
+        return await self.generate_hierarchical_summary(chunks, prompt)
+
+    async def merge_summaries(self, partials: List[str], prompt: str) -> str:
+        """Merge partial summaries, in chronological order, into one final summary."""
+        slots = asyncio.Semaphore(self.map_concurrency)
+        if len(partials) == 1:
+            return await self._call(self._merge_lines(partials), f"{prompt}\n{REDUCE_PROMPT}", slots)
+
+        return await self._reduce_tree(self._ready(partials), prompt, slots)
+
+    @staticmethod
+    def _ready(partials: List[str]) -> List[asyncio.Future]:
+        """Wrap finished partial summaries as futures for the reduce tree."""
+        loop = asyncio.get_running_loop()
+        leaves = []
+        for partial in partials:
+            ready = loop.create_future()
+            ready.set_result(partial)
+            leaves.append(ready)
+        return leaves
+
+    async def _call(self, lines: List[str], system_prompt: str, slots: asyncio.Semaphore) -> str:
+        async with slots:
+            return await self.provider.generate_summary(lines, system_prompt)
+
+    async def _reduce_tree(self, leaves: List[asyncio.Future], prompt: str,
+                           slots: asyncio.Semaphore) -> str:
+        """Merge pending partial summaries fan_in at a time until one remains."""
+        pending = list(leaves)
+        try:
+            level = self._reduce_levels(leaves, prompt, slots, pending, until=1)
+            return await level[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _stream_reduce(self, leaves: List[asyncio.Future], prompt: str,
+                             slots: asyncio.Semaphore) -> AsyncIterator[str]:
+        """Like _reduce_tree(), but stream the final merge call."""
+        pending = list(leaves)
+        try:
+            level = self._reduce_levels(leaves, prompt, slots, pending, until=self.fan_in)
+            lines = self._merge_lines(await asyncio.gather(*level))
+            async with slots:
+                async for piece in self.provider.stream_summary(lines, f"{prompt}\n{REDUCE_PROMPT}"):
+                    yield piece
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _reduce_levels(self, level: List[asyncio.Future], prompt: str, slots: asyncio.Semaphore,
+                       pending: List[asyncio.Future], until: int) -> List[asyncio.Future]:
+        """
+        Schedule merges level by level until at most `until` results remain.
+        Each merge awaits only its own children. New tasks are added to
+        `pending` so the caller can cancel them on failure.
+        """
+
+        async def merge(children: List[asyncio.Future]) -> str:
+            lines = self._merge_lines(await asyncio.gather(*children))
+            return await self._call(lines, f"{prompt}\n{REDUCE_PROMPT}", slots)
+
+        while len(level) > until:
+            groups = [level[i:i + self.fan_in] for i in range(0, len(level), self.fan_in)]
+            # A trailing group of one has nothing to merge; pass it up a level
+            level = [
+                group[0] if len(group) == 1 else asyncio.create_task(merge(group))
+                for group in groups
+            ]
+            pending.extend(level)
+        return level
+
+    @staticmethod
+    def _merge_lines(partials: List[str]) -> List[str]:
+        return [f"Part {i + 1} summary:\n{partial}" for i, partial in enumerate(partials)]
+
+    async def close(self) -> None:
+        """Release the providers' pooled connections."""
+        await self.provider.close()
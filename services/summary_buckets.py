@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.async_database import async_db
+from services.metrics import bucket_sections
+from services.token_index import token_index
+from services.transcript import read_chunks
+from utils.time_utils import to_naive_utc
+
+EPOCH = datetime(1970, 1, 1)
+
+@dataclass
+class _Section:
+    """Consecutive non-empty buckets of a window summarized (or reused) as one partial."""
+    start: datetime            # First message time covered (inclusive)
+    end: datetime              # Last message time covered (inclusive)
+    cacheable: bool            # Every bucket is complete, inside the window and in the past
+    buckets: List[datetime] = field(default_factory=list)
+    tokens: int = 0
+    summary: Optional[str] = None  # Set when reused from the cache
+
+class BucketSummaryCache:
+    """
+    Incremental summaries built from cached partial summaries of time buckets.
+
+    Each thread's timeline is cut into fixed buckets (e.g. 6 hours). Runs of
+    consecutive buckets that lie completely inside a requested window and in
+    the past are summarized together, as many as fit one chunk, and stored in
+    summary_buckets keyed by the run's first bucket with the run's end. Later
+    windows reuse a stored run whenever it lies completely inside them and
+    only summarize the buckets around it, so overlapping and repeated windows
+    cost about their new traffic. Every message write marks the stored runs
+    containing it dirty in the write's own transaction. Partial
+    buckets at the window edges and the still-open current bucket are always
+    summarized fresh.
+    """
+
+    def __init__(self, database, bucket_hours: int = 6):
+        """
+        Args:
+            database: AsyncDatabaseConfig instance holding the bucket table
+            bucket_hours: Bucket size in hours
+        """
+        self.db = database
+        self.bucket_size = timedelta(hours=bucket_hours)
+        # Bumped whenever a bucket is dirtied, so a summary computed from rows
+        # that changed while the LLM call was running is not stored as clean
+        self._generations: Dict[Tuple[int, datetime], int] = {}
+        self._lock = threading.Lock()
+        database.add_write_listener(self.record)
+
+    def bucket_start(self, dt: datetime) -> datetime:
+        """Start of the bucket containing dt (naive UTC)."""
+        offset = to_naive_utc(dt) - EPOCH
+        return EPOCH + (offset // self.bucket_size) * self.bucket_size
+
+    def record(self, ops: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Note the buckets touched by a committed batch (runs in the writer thread).
+
+        The stored summaries covering them were already flagged dirty in the
+        batch's own transaction; this only invalidates summaries still being
+        computed from the old rows.
+        """
+        touched = set()
+        for op, payload in ops:
+            if op == "invalidate":
+                touched.update((payload["thread_id"], self.bucket_start(hour)) for hour in payload["hours"])
+                continue
+            if op != "insert" and not payload.get("matched"):
+                continue
+            touched.add((payload["thread_id"], self.bucket_start(payload["created_at"])))
+
+        with self._lock:
+            for key in touched:
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _generation(self, thread_id: int, bucket_start: datetime) -> int:
+        with self._lock:
+            return self._generations.get((thread_id, bucket_start), 0)
+
+    async def summarize_window(self, thread_id: int, start: datetime, end: datetime,
+                               prompt: str, summarizer) -> Optional[str]:
+        """
+        Summarize a window, reusing clean cached bucket summaries.
+
+        Args:
+            thread_id: Thread to summarize
+            start: Window start (inclusive)
+            end: Window end (inclusive)
+            prompt: System prompt (thread description included)
+            summarizer: SummarizerService used for section and merge calls
+
+        Returns:
+            The merged summary, or None if the window has no messages
+        """
+        partials = await self.section_summaries(thread_id, start, end, prompt, summarizer)
+        if partials is None:
+            return None
+        return await summarizer.merge_summaries(partials, prompt)
+
+    async def section_summaries(self, thread_id: int, start: datetime, end: datetime,
+                                prompt: str, summarizer) -> Optional[List[str]]:
+        """
+        Partial summaries of the sections of a window, in order, ready for
+        merge_summaries() or stream_merge(). Arguments as for summarize_window().
+
+        Returns:
+            One summary per non-empty section, or None if the window has no messages
+        """
+        start, end = to_naive_utc(start), to_naive_utc(end)
+        model = summarizer.settings.get("model", "")
+        prompt_hash = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+        budget = summarizer.chunk_budget(prompt)
+        now = datetime.utcnow()
+
+        # (bucket start, section start, section end inclusive, cacheable, tokens)
+        buckets = []
+        bucket = self.bucket_start(start)
+        while bucket <= end:
+            bucket_end = bucket + self.bucket_size
+            section_start = max(bucket, start)
+            section_end = end if bucket_end > end else bucket_end - timedelta(microseconds=1)
+            cacheable = bucket >= start and bucket_end <= end and bucket_end <= now
+
+            count, tokens = await token_index.window_stats(thread_id, section_start, section_end)
+            if count:
+                buckets.append((bucket, section_start, section_end, cacheable, tokens))
+            bucket = bucket_end
+
+        if not buckets:
+            return None
+
+        cached = await self.db.get_clean_summary_buckets(
+            thread_id, prompt_hash, [bucket for bucket, _, _, cacheable, _ in buckets if cacheable]
+        )
+
+        sections: List[_Section] = []
+        run: Optional[_Section] = None
+        reused_until = None
+        for bucket, section_start, section_end, cacheable, tokens in buckets:
+            if reused_until is not None and bucket < reused_until:
+                continue
+            stored = cached.get(bucket) if cacheable else None
+            if stored is not None and stored[0] <= end and stored[0] <= now:
+                run = None
+                reused_until = stored[0]
+                sections.append(_Section(section_start, reused_until - timedelta(microseconds=1),
+                                         True, [bucket], summary=stored[1]))
+                continue
+            if run is not None and run.cacheable == cacheable and run.tokens + tokens <= budget:
+                run.end = section_end
+                run.buckets.append(bucket)
+                run.tokens += tokens
+                continue
+            run = _Section(section_start, section_end, cacheable, [bucket], tokens)
+            sections.append(run)
+
+        reused = sum(1 for section in sections if section.summary is not None)
+        bucket_sections.inc(reused, outcome="reused")
+        bucket_sections.inc(len(sections) - reused, outcome="summarized")
+
+        async def summarize(section: _Section) -> Optional[str]:
+            if section.summary is not None:
+                return section.summary
+
+            generations = [self._generation(thread_id, bucket) for bucket in section.buckets]
+            chunks = await read_chunks(thread_id, section.start, section.end, budget)
+            label = (f"(Messages from {section.start:%Y-%m-%d %H:%M} "
+                     f"to {section.end:%Y-%m-%d %H:%M} UTC)")
+            summary = await summarizer.summarize_section(chunks, prompt, label)
+            if summary is None:
+                return None
+
+            unchanged = generations == [self._generation(thread_id, bucket) for bucket in section.buckets]
+            if section.cacheable and unchanged:
+                message_count = sum(len(chunk) for chunk in chunks)
+                await self.db.save_summary_bucket(thread_id, section.buckets[0],
+                                                  section.buckets[-1] + self.bucket_size,
+                                                  prompt_hash, summary, message_count)
+            return summary
+
+        partials = await asyncio.gather(*(summarize(section) for section in sections))
+        # Sections whose messages were deleted since the window was sized drop out
+        partials = [partial for partial in partials if partial is not None]
+        return partials or None
+
+# Process-wide bucket cache, kept current by the ingestion writer
+summary_buckets = BucketSummaryCache(async_db, bucket_hours=int(os.getenv("SUMMARY_BUCKET_HOURS", "6")))
@@ -0,0 +1,76 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from config.async_database import async_db
+from services.metrics import summary_cache_lookups
+
+class SummaryResultCache:
+    """
+    Two-tier cache of finished summaries.
+
+    Keys are content-addressed: thread, window length, a digest of the
+    window's message IDs and edit versions, the prompt (thread description
+    included) and the model. An edit or delete inside the window changes the
+    digest, so stale entries are never served and need no explicit
+    invalidation. Hits come from an in-memory LRU first, then from the
+    summary_cache table, which is trimmed by total size.
+    """
+
+    def __init__(self, database, memory_entries: int = 256, max_total_bytes: int = 5_000_000):
+        """
+        Args:
+            database: AsyncDatabaseConfig instance holding the summary_cache table
+            memory_entries: Entries kept in the in-memory LRU
+            max_total_bytes: Size limit for the persistent tier
+        """
+        self.db = database
+        self.memory_entries = memory_entries
+        self.max_total_bytes = max_total_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+
+    async def make_key(self, thread_id: int, start: datetime, end: datetime,
+                       prompt: str, model: str) -> str:
+        """Build the cache key for a window; reads only message IDs and edit times."""
+        digest = await self.db.window_digest(thread_id, start, end)
+        window_seconds = int((end - start).total_seconds())
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = f"{thread_id}|{window_seconds}|{digest}|{prompt_hash}|{model}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        summary = self._memory.get(key)
+        if summary is not None:
+            self._memory.move_to_end(key)
+            summary_cache_lookups.inc(result="memory_hit")
+            return summary
+
+        summary = await self.db.get_cached_summary(key)
+        if summary is None:
+            summary_cache_lookups.inc(result="miss")
+            return None
+        summary_cache_lookups.inc(result="db_hit")
+        self._remember(key, summary)
+        return summary
+
+    async def put(self, key: str, thread_id: int, summary: str) -> None:
+        self._remember(key, summary)
+        await self.db.save_cached_summary(key, thread_id, summary, self.max_total_bytes)
+
+    def clear_memory(self) -> None:
+        """Forget the in-memory entries; the database table is left alone."""
+        self._memory.clear()
+
+    def _remember(self, key: str, summary: str) -> None:
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+# Process-wide summary cache
+summary_cache = SummaryResultCache(
+    async_db,
+    max_total_bytes=int(os.getenv("SUMMARY_CACHE_MAX_BYTES", "5000000"))
+)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+from services.metrics import thread_status_lookups
+from utils.thread_store import watched_threads
+
+# Status of a watched thread, as shown by !listThreads
+ACTIVE = "active"
+ARCHIVED = "archived"
+MISSING = "missing"      # Deleted, or the ID is not a thread
+FORBIDDEN = "forbidden"  # The bot can no longer see it
+UNKNOWN = "unknown"      # The lookup failed; not cached
+
+STATUS_ICONS = {ACTIVE: "🟢", ARCHIVED: "🟡", MISSING: "🔴", FORBIDDEN: "🔴", UNKNOWN: "⚪"}
+
+class ThreadStatusService:
+    """
+    Reports whether watched threads still exist without a REST call per thread.
+
+    Lookups go through three tiers:
+    1. The gateway cache, which holds every active thread the bot can see
+    2. A TTL cache of statuses, kept current by thread update and delete
+       events and filled by earlier fetches
+    3. The Discord API, only for threads whose status is still unknown.
+       Fetches run concurrently, at most `max_concurrent_fetches` at a
+       time so a long list does not burst into the rate limit, and
+       concurrent lookups of the same thread share one call.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_concurrent_fetches: int = 4):
+        """
+        Args:
+            ttl: Seconds a fetched status is trusted without an event confirming it
+            max_concurrent_fetches: API lookups allowed in flight at once
+        """
+        self.ttl = ttl
+        self._cache: Dict[int, Tuple[str, float]] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+
+    def update(self, thread: discord.Thread) -> None:
+        """Record the status of a thread object seen in an event or response."""
+        self._store(thread.id, ARCHIVED if thread.archived else ACTIVE)
+
+    def on_raw_update(self, payload: discord.RawThreadUpdateEvent) -> None:
+        """Apply a thread update event, which fires for uncached threads too."""
+        if payload.thread_id not in watched_threads:
+            return
+        archived = payload.data.get("thread_metadata", {}).get("archived")
+        if archived is not None:
+            self._store(payload.thread_id, ARCHIVED if archived else ACTIVE)
+
+    def on_raw_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        """Apply a thread delete event."""
+        if payload.thread_id in watched_threads:
+            self._store(payload.thread_id, MISSING)
+
+    async def statuses(self, guild: discord.Guild, thread_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Status of each thread, fetching only the ones neither cache knows.
+
+        Returns:
+            dict: Thread ID to ACTIVE, ARCHIVED, MISSING, FORBIDDEN or UNKNOWN
+        """
+        result: Dict[int, str] = {}
+        unknown = []
+        for thread_id in thread_ids:
+            status = self._cached(guild, thread_id)
+            if status is None:
+                unknown.append(thread_id)
+            else:
+                result[thread_id] = status
+
+        fetched = await asyncio.gather(*(self._resolve(guild, thread_id) for thread_id in unknown))
+        result.update(zip(unknown, fetched))
+        return result
+
+    def _cached(self, guild: discord.Guild, thread_id: int) -> Optional[str]:
+        channel = guild.get_channel_or_thread(thread_id)
+        if isinstance(channel, discord.Thread):
+            thread_status_lookups.inc(source="gateway")
+            return ARCHIVED if channel.archived else ACTIVE
+
+        entry = self._cache.get(thread_id)
+        if entry is not None:
+            status, expires = entry
+            if time.monotonic() < expires:
+                thread_status_lookups.inc(source="cache")
+                return status
+            del self._cache[thread_id]
+        return None
+
+    async def _resolve(self, guild: discord.Guild, thread_id: int) -> str:
+        pending = self._inflight.get(thread_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[thread_id] = future
+        try:
+            status = await self._fetch(guild, thread_id)
+            future.set_result(status)
+            return status
+        except Exception as e:
+            print(f"Error checking status of thread {thread_id}: {e}")
+            future.set_result(UNKNOWN)
+            return UNKNOWN
+        finally:
+            # If this lookup was cancelled, lookups waiting on it report UNKNOWN
+            # rather than waiting forever
+            if not future.done():
+                future.set_result(UNKNOWN)
+            del self._inflight[thread_id]
+
+    async def _fetch(self, guild: discord.Guild, thread_id: int) -> str:
+        async with self._fetch_slots:
+            thread_status_lookups.inc(source="fetch")
+            try:
+                channel = await guild.fetch_channel(thread_id)
+            except discord.NotFound:
+                status = MISSING
+            except discord.Forbidden:
+                status = FORBIDDEN
+            else:
+                if not isinstance(channel, discord.Thread):
+                    status = MISSING
+                else:
+                    status = ARCHIVED if channel.archived else ACTIVE
+        self._store(thread_id, status)
+        return status
+
+    def clear(self) -> None:
+        """Forget every cached status."""
+        self._cache.clear()
+
+    def _store(self, thread_id: int, status: str) -> None:
+        self._cache[thread_id] = (status, time.monotonic() + self.ttl)
+
+# Process-wide status cache, kept current by thread events
+thread_status = ThreadStatusService(ttl=float(os.getenv("THREAD_STATUS_TTL", "600")))
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, func
+
+from config.database import db, Message
+from utils.tokens import CHARS_PER_TOKEN, MESSAGE_OVERHEAD_TOKENS
+from utils.time_utils import to_naive_utc
+
+class _ThreadPrefix:
+    """Message timestamps of one thread with running token totals."""
+    __slots__ = ("times", "prefix", "ids")
+
+    def __init__(self):
+        self.times: List[datetime] = []
+        self.prefix: List[int] = [0]  # prefix[k] = tokens in the first k messages
+        self.ids: Set[int] = set()
+
+    def append(self, created_at: datetime, tokens: int, discord_message_id: Optional[int]) -> None:
+        self.times.append(created_at)
+        self.prefix.append(self.prefix[-1] + tokens + MESSAGE_OVERHEAD_TOKENS)
+        if discord_message_id is not None:
+            self.ids.add(discord_message_id)
+
+    def bounds(self, start: datetime, end: datetime) -> Tuple[int, int]:
+        """Index range [i, j) of messages with start <= created_at <= end."""
+        return bisect_left(self.times, to_naive_utc(start)), bisect_right(self.times, to_naive_utc(end))
+
+class ThreadTokenIndex:
+    """
+    Per-thread prefix sums over stored message token counts.
+
+    Answers "how many tokens are in this window" with two binary searches and
+    packs a window into chunks under a token budget without re-tokenizing.
+    A thread is loaded from the database on first use and then kept current
+    from the ingestion writer: in-order inserts are appended, anything else
+    (edits, deletes, late or duplicate messages) drops the thread so it is
+    reloaded on the next query.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self._threads: Dict[int, _ThreadPrefix] = {}
+        # Bumped on every write to a thread so a reload racing a write is not cached
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        database.add_write_listener(self.record)
+
+    def record(self, ops: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Apply a committed batch of message operations (runs in the writer thread)."""
+        with self._lock:
+            for op, payload in ops:
+                if op in ("edit", "delete") and not payload.get("matched"):
+                    continue  # Edit or delete of a message we never stored
+                thread_id = payload["thread_id"]
+
+                self._versions[thread_id] = self._versions.get(thread_id, 0) + 1
+                entry = self._threads.get(thread_id)
+                if entry is None:
+                    continue
+                if op == "insert" and self._try_append(entry, payload):
+                    continue
+                del self._threads[thread_id]
+
+    @staticmethod
+    def _try_append(entry: _ThreadPrefix, payload: Dict[str, Any]) -> bool:
+        discord_message_id = payload.get("discord_message_id")
+        created_at = to_naive_utc(payload["created_at"])
+        if discord_message_id is None or discord_message_id in entry.ids:
+            return False
+        if entry.times and created_at < entry.times[-1]:
+            return False
+        entry.append(created_at, payload["token_count"], discord_message_id)
+        return True
+
+    def invalidate(self, thread_id: Optional[int] = None) -> None:
+        """Forget one thread (or all) after writes that bypass the ingestion path."""
+        with self._lock:
+            if thread_id is None:
+                self._threads.clear()
+                for key in self._versions:
+                    self._versions[key] += 1
+            else:
+                self._threads.pop(thread_id, None)
+                self._versions[thread_id] = self._versions.get(thread_id, 0) + 1
+
+    async def window_stats(self, thread_id: int, start: datetime, end: datetime) -> Tuple[int, int]:
+        """
+        Returns:
+            Tuple of (message count, token count) for the window, including
+            the per-line transcript overhead
+        """
+        entry = await self._entry(thread_id)
+        with self._lock:
+            i, j = entry.bounds(start, end)
+            return j - i, entry.prefix[j] - entry.prefix[i]
+
+    async def pack_window(self, thread_id: int, start: datetime, end: datetime,
+                          budget: int) -> List[int]:
+        """
+        Pack the window's messages, in order, into chunks of at most `budget` tokens.
+
+        Returns:
+            List of message counts, one per chunk. A single message larger
+            than the budget gets a chunk of its own.
+        """
+        entry = await self._entry(thread_id)
+        sizes: List[int] = []
+        with self._lock:
+            pos, end_index = entry.bounds(start, end)
+            prefix = entry.prefix
+            while pos < end_index:
+                limit = prefix[pos] + budget
+                nxt = bisect_right(prefix, limit, pos + 1, end_index + 1) - 1
+                if nxt <= pos:
+                    nxt = pos + 1
+                sizes.append(nxt - pos)
+                pos = nxt
+        return sizes
+
+    async def _entry(self, thread_id: int) -> _ThreadPrefix:
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            version = self._versions.get(thread_id, 0)
+        if entry is not None:
+            return entry
+
+        entry = await asyncio.to_thread(self._load, thread_id)
+        with self._lock:
+            if self._versions.get(thread_id, 0) == version:
+                self._threads[thread_id] = entry
+        return entry
+
+    def _load(self, thread_id: int) -> _ThreadPrefix:
+        """Build a thread's prefix sums from the stored per-message token counts."""
+        # Rows from before token counting fall back to a length-based estimate
+        tokens = func.coalesce(Message.token_count, func.length(Message.content) / CHARS_PER_TOKEN + 1)
+        stmt = (
+            select(Message.created_at, tokens, Message.discord_message_id)
+            .where(Message.thread_id == thread_id)
+            .order_by(Message.created_at.asc())
+        )
+        entry = _ThreadPrefix()
+        with self.db.Session() as session:
+            for created_at, token_count, discord_message_id in session.execute(stmt):
+                entry.append(to_naive_utc(created_at), int(token_count), discord_message_id)
+        return entry
+
+# Process-wide token index, kept current by the ingestion writer
+token_index = ThreadTokenIndex(db)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from config.database import db
+from services.metrics import dedup_latency, dedup_messages, dedup_tokens
+from services.near_duplicates import NearDuplicateCollapser
+from services.token_index import token_index
+from utils.tokens import MESSAGE_OVERHEAD_TOKENS, pack_lines
+
+# Collapse near-duplicate messages ("+1", "same here") before they reach the AI
+COLLAPSE_DUPLICATES = os.getenv("COLLAPSE_DUPLICATES", "true").lower() == "true"
+
+collapser = NearDuplicateCollapser()
+
+def format_message(role: Optional[str], author: str, content: str) -> str:
+    """Format one stored message as a transcript line for the AI."""
+    role_prefix = f"[{role}] " if role else ""
+    return f"{role_prefix}{author}: {content}"
+
+def iter_transcript(thread_id: int, start: datetime, end: datetime) -> Iterator[str]:
+    """Stream a window's transcript lines, oldest first, without loading ORM objects."""
+    for role, author, content in db.iter_transcript_rows(thread_id, start, end):
+        yield format_message(role, author, content)
+
+def _group_lines(lines: Iterator[str], chunk_sizes: List[int], budget: int) -> List[List[str]]:
+    """Cut streamed lines into chunks of the precomputed sizes (runs in a worker thread)."""
+    chunks: List[List[str]] = []
+    sizes = iter(chunk_sizes)
+    size = next(sizes, 0)
+    current: List[str] = []
+    for line in lines:
+        current.append(line)
+        if len(current) == size:
+            chunks.append(current)
+            current = []
+            size = next(sizes, 0)
+
+    if current or size:
+        # Rows changed between sizing and reading; pack them directly instead
+        return pack_lines([line for chunk in chunks for line in chunk] + current, budget)
+    return chunks
+
+def _read_collapsed(thread_id: int, start: datetime, end: datetime,
+                    budget: int) -> Tuple[List[List[str]], int]:
+    """Read a window with near-duplicates collapsed and pack it (runs in a worker thread)."""
+    started = time.perf_counter()
+    rows = db.iter_transcript_rows(thread_id, start, end, token_counts=True)
+    result = collapser.collapse(rows, format_message)
+    chunks = pack_lines(result.lines, budget, result.token_counts)
+    elapsed = time.perf_counter() - started
+
+    tokens_in = result.tokens_in + MESSAGE_OVERHEAD_TOKENS * result.messages_in
+    tokens_out = result.tokens_out + MESSAGE_OVERHEAD_TOKENS * result.messages_out
+    dedup_latency.observe(elapsed)
+    dedup_messages.inc(result.messages_in, stage="input")
+    dedup_messages.inc(result.messages_out, stage="output")
+    dedup_tokens.inc(tokens_in, stage="input")
+    dedup_tokens.inc(tokens_out, stage="output")
+    if result.messages_out < result.messages_in:
+        print(f"Collapsed near-duplicates in thread {thread_id}: {result.messages_in} -> "
+              f"{result.messages_out} messages, {tokens_in} -> {tokens_out} tokens "
+              f"in {elapsed * 1000:.0f} ms")
+    return chunks, tokens_out
+
+async def read_collapsed(thread_id: int, start: datetime, end: datetime,
+                         budget: int) -> Tuple[List[List[str]], int]:
+    """
+    Read a window with near-duplicates collapsed, packed into chunks of at
+    most `budget` tokens.
+
+    Returns:
+        Tuple of (chunks, token count of what is left after collapsing,
+        including the per-line transcript overhead)
+    """
+    return await asyncio.to_thread(_read_collapsed, thread_id, start, end, budget)
+
+async def read_chunks(thread_id: int, start: datetime, end: datetime, budget: int,
+                      chunk_sizes: Optional[List[int]] = None) -> List[List[str]]:
+    """
+    Read a window's messages as transcript lines packed into chunks of at most
+    `budget` tokens, using stored token counts instead of re-tokenizing.
+    Near-duplicate messages are collapsed first unless COLLAPSE_DUPLICATES
+    is off.
+
+    Args:
+        thread_id: Thread to read
+        start: Window start (inclusive)
+        end: Window end (inclusive)
+        budget: Token budget per chunk
+        chunk_sizes: Packing already computed by token_index.pack_window
+            (not used when collapsing, which changes the sizes)
+    """
+    if COLLAPSE_DUPLICATES:
+        chunks, _ = await read_collapsed(thread_id, start, end, budget)
+        return chunks
+    if chunk_sizes is None:
+        chunk_sizes = await token_index.pack_window(thread_id, start, end, budget)
+    return await asyncio.to_thread(_group_lines, iter_transcript(thread_id, start, end), chunk_sizes, budget)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+class StubServer:
+    """
+    A model server on a free local port that answers with canned handlers.
+
+    Use as an async context manager; `url` is the server's base address and
+    `requests` collects the JSON body of every request it received.
+    """
+
+    def __init__(self, routes: Dict[str, Handler]):
+        """
+        Args:
+            routes: Handler per POST path, e.g. {"/v1/chat/completions": handler}
+        """
+        self.requests: List[Dict[str, Any]] = []
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_post(path, self._recording(handler))
+        self._server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self._server.make_url("")).rstrip("/")
+
+    def _recording(self, handler: Handler) -> Handler:
+        async def record(request: web.Request) -> web.StreamResponse:
+            self.requests.append(await request.json())
+            return await handler(request)
+        return record
+
+    async def __aenter__(self) -> "StubServer":
+        await self._server.start_server()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._server.close()
+
+def respond(body: Dict[str, Any], status: int = 200, delay: float = 0.0) -> Handler:
+    """Handler answering with a JSON body, optionally after a delay."""
+    async def handler(request: web.Request) -> web.Response:
+        await asyncio.sleep(delay)
+        return web.json_response(body, status=status)
+    return handler
+
+def stream(events: Iterable[Any], done: bool = True, delay: float = 0.0,
+           stall_after: Optional[int] = None) -> Handler:
+    """
+    Handler answering with server-sent events.
+
+    Args:
+        events: JSON payloads, one per event; (event name, payload) pairs add an event line
+        done: Finish with "data: [DONE]" like the OpenAI API
+        delay: Seconds to wait before each event
+        stall_after: Stop sending (without closing) after this many events
+    """
+    async def handler(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for sent, event in enumerate(events):
+            if sent == stall_after:
+                await asyncio.sleep(3600)
+            await asyncio.sleep(delay)
+            name, payload = event if isinstance(event, tuple) else (None, event)
+            lines = f"event: {name}\n" if name else ""
+            await response.write(f"{lines}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        if done:
+            await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    return handler
+
+def chat_completion(text: str, prompt_tokens: int = 10, completion_tokens: int = 5) -> Dict[str, Any]:
+    """An OpenAI-style chat completion body."""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+def chat_chunks(pieces: Iterable[str], prompt_tokens: int = 10, completion_tokens: int = 5) -> List[Dict[str, Any]]:
+    """OpenAI-style streamed chat completion chunks, ending with a usage-only chunk."""
+    def chunk(choices: List[Dict[str, Any]], usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        return {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                "model": "stub", "choices": choices, "usage": usage}
+
+    chunks = [chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+    chunks += [chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]) for piece in pieces]
+    chunks.append(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+    chunks.append(chunk([], {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                             "total_tokens": prompt_tokens + completion_tokens}))
+    return chunks
+
+async def collect(pieces) -> List[str]:
+    """Read a summary stream to the end."""
+    return [piece async for piece in pieces]
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from services.ai.anthropic_provider import AnthropicProvider
+from services.ai.base import ProviderError
+from services.metrics import ai_tokens
+from stubs import StubServer, collect, respond, stream
+
+PATH = "/v1/messages"
+
+def provider(server: StubServer, **options) -> AnthropicProvider:
+    return AnthropicProvider(api_key="test", model="stub", base_url=server.url, **options)
+
+def tokens(kind: str) -> float:
+    return ai_tokens.values().get(("anthropic", kind), 0)
+
+def message(text: str, input_tokens: int = 10, output_tokens: int = 5):
+    return {"id": "msg_stub", "type": "message", "role": "assistant",
+            "content": [{"type": "text", "text": text}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}}
+
+def stream_events(pieces, input_tokens: int = 10, output_tokens: int = 5):
+    events = [("message_start", {"type": "message_start",
+                                 "message": {"usage": {"input_tokens": input_tokens, "output_tokens": 1}}}),
+              ("content_block_start", {"type": "content_block_start", "index": 0,
+                                       "content_block": {"type": "text", "text": ""}})]
+    events += [("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                        "delta": {"type": "text_delta", "text": piece}}) for piece in pieces]
+    events += [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+               ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                  "usage": {"output_tokens": output_tokens}}),
+               ("message_stop", {"type": "message_stop"})]
+    return events
+
+def test_generate_returns_the_stripped_summary_and_counts_tokens():
+    async def scenario():
+        async with StubServer({PATH: respond(message("\n All good. ", 30, 7))}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                summary = await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+            assert summary == "All good."
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (30, 7)
+            assert server.requests[0]["system"] == "Summarize"
+            assert server.requests[0]["stream"] is False
+
+    asyncio.run(scenario())
+
+def test_server_error_raises_provider_error_with_the_api_message():
+    async def scenario():
+        error = {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}
+        async with StubServer({PATH: respond(error, status=529)}) as server:
+            ai = provider(server)
+            try:
+                with pytest.raises(ProviderError, match="HTTP 529 overloaded_error: Overloaded"):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_slow_server_raises_provider_error():
+    async def scenario():
+        async with StubServer({PATH: respond(message("late"), delay=5)}) as server:
+            ai = provider(server, timeout=0.2)
+            try:
+                with pytest.raises(ProviderError, match="Anthropic"):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_stream_yields_text_deltas_and_counts_tokens():
+    async def scenario():
+        events = stream_events([" ", " First", " point."], 40, 9)
+        async with StubServer({PATH: stream(events, done=False)}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                pieces = await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+            assert pieces == ["First", " point."]
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (40, 9)
+
+    asyncio.run(scenario())
+
+def test_stream_error_event_raises_provider_error():
+    async def scenario():
+        events = stream_events(["Partial"])[:3] + [
+            ("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})]
+        async with StubServer({PATH: stream(events, done=False)}) as server:
+            ai = provider(server)
+            pieces = []
+            try:
+                with pytest.raises(ProviderError, match="Overloaded"):
+                    async for piece in ai.stream_summary(["a: hello"], "Summarize"):
+                        pieces.append(piece)
+            finally:
+                await ai.close()
+            assert pieces == ["Partial"]
+
+    asyncio.run(scenario())
+
+def test_stalled_stream_raises_provider_error():
+    async def scenario():
+        events = stream_events(["First"])
+        async with StubServer({PATH: stream(events, done=False, stall_after=3)}) as server:
+            ai = provider(server, timeout=0.2)
+            try:
+                with pytest.raises(ProviderError, match="Anthropic"):
+                    await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_stream_server_error_raises_provider_error():
+    async def scenario():
+        error = {"type": "error", "error": {"type": "api_error", "message": "Internal"}}
+        async with StubServer({PATH: respond(error, status=500)}) as server:
+            ai = provider(server)
+            try:
+                with pytest.raises(ProviderError, match="HTTP 500 api_error: Internal"):
+                    await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from services.ai.base import ProviderError
+from services.ai.local_provider import LocalLLMProvider
+from services.metrics import ai_tokens
+from stubs import StubServer, chat_chunks, chat_completion, collect, respond, stream
+
+CHAT = "/v1/chat/completions"
+COMPLETION = "/completion"
+
+def provider(server: StubServer, **options) -> LocalLLMProvider:
+    return LocalLLMProvider(base_url=server.url, model="stub", **options)
+
+def tokens(kind: str) -> float:
+    return ai_tokens.values().get(("local", kind), 0)
+
+def test_unknown_api_style_is_rejected():
+    with pytest.raises(ValueError):
+        LocalLLMProvider(api_style="grpc")
+
+def test_openai_style_generate():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion(" All good.", 8, 2))}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                summary = await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+            assert summary == "All good."
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (8, 2)
+            assert server.requests[0]["model"] == "stub"
+
+    asyncio.run(scenario())
+
+def test_base_url_with_v1_suffix_is_accepted():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion("ok"))}) as server:
+            ai = LocalLLMProvider(base_url=server.url + "/v1/")
+            try:
+                assert await ai.generate_summary(["a: hello"], "Summarize") == "ok"
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_openai_style_stream():
+    async def scenario():
+        async with StubServer({CHAT: stream(chat_chunks([" First", " point."], 11, 3))}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                pieces = await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+            assert pieces == ["First", " point."]
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (11, 3)
+            assert server.requests[0]["stream_options"] == {"include_usage": True}
+
+    asyncio.run(scenario())
+
+def test_llamacpp_style_generate():
+    async def scenario():
+        body = {"content": " Native summary.", "tokens_evaluated": 50, "tokens_predicted": 6}
+        async with StubServer({COMPLETION: respond(body)}) as server:
+            ai = provider(server, api_style="llamacpp")
+            before = tokens("prompt"), tokens("completion")
+            try:
+                summary = await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+            assert summary == "Native summary."
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (50, 6)
+            request = server.requests[0]
+            assert request["prompt"].startswith("Summarize\n\na: hello")
+            assert request["cache_prompt"] is True
+
+    asyncio.run(scenario())
+
+def test_llamacpp_style_stream_ends_with_the_connection():
+    async def scenario():
+        events = [{"content": " One", "stop": False}, {"content": " two", "stop": False},
+                  {"content": "", "stop": True, "tokens_evaluated": 9, "tokens_predicted": 2}]
+        async with StubServer({COMPLETION: stream(events, done=False)}) as server:
+            ai = provider(server, api_style="llamacpp")
+            before = tokens("prompt"), tokens("completion")
+            try:
+                pieces = await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+            assert pieces == ["One", " two"]
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (9, 2)
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("api_style, path", [("openai", CHAT), ("llamacpp", COMPLETION)])
+def test_server_error_raises_provider_error(api_style, path):
+    async def scenario():
+        async with StubServer({path: respond({"error": "loading model"}, status=503)}) as server:
+            ai = provider(server, api_style=api_style)
+            try:
+                with pytest.raises(ProviderError, match="503"):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+                with pytest.raises(ProviderError, match="503"):
+                    await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_slow_server_raises_provider_error():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion("late"), delay=5)}) as server:
+            ai = provider(server, timeout=0.2)
+            try:
+                with pytest.raises(ProviderError, match="local model server"):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_stream_may_run_longer_than_the_timeout_while_pieces_keep_coming():
+    async def scenario():
+        chunks = chat_chunks(["a", "b", "c", "d", "e"])
+        async with StubServer({CHAT: stream(chunks, delay=0.1)}) as server:
+            ai = provider(server, timeout=0.3)
+            try:
+                pieces = await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+            assert "".join(pieces) == "abcde"
+
+    asyncio.run(scenario())
+
+def test_stalled_stream_raises_provider_error():
+    async def scenario():
+        async with StubServer({CHAT: stream(chat_chunks(["First"]), stall_after=2)}) as server:
+            ai = provider(server, timeout=0.2)
+            pieces = []
+            try:
+                with pytest.raises(ProviderError, match="local model server"):
+                    async for piece in ai.stream_summary(["a: hello"], "Summarize"):
+                        pieces.append(piece)
+            finally:
+                await ai.close()
+            assert pieces == ["First"]
+
+    asyncio.run(scenario())
+
+def test_calls_beyond_the_slot_count_wait_their_turn():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion("ok"), delay=0.2)}) as server:
+            ai = provider(server, max_concurrency=1)
+            try:
+                first = asyncio.create_task(ai.generate_summary(["a: hello"], "Summarize"))
+                await asyncio.sleep(0.05)
+                assert ai.limiter.active == 1
+                second = asyncio.create_task(ai.generate_summary(["a: hello"], "Summarize"))
+                await asyncio.sleep(0.05)
+                assert ai.limiter.queued == 1
+                assert await asyncio.gather(first, second) == ["ok", "ok"]
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
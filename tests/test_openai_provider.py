@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from services.ai.base import ProviderError
+from services.ai.openai_provider import OpenAIProvider
+from services.metrics import ai_tokens
+from stubs import StubServer, chat_chunks, chat_completion, collect, respond, stream
+
+PATH = "/v1/chat/completions"
+
+def provider(server: StubServer, **options) -> OpenAIProvider:
+    return OpenAIProvider(api_key="test", model="stub", base_url=server.url + "/v1", **options)
+
+def tokens(kind: str) -> float:
+    return ai_tokens.values().get(("openai", kind), 0)
+
+def test_generate_returns_the_stripped_summary_and_counts_tokens():
+    async def scenario():
+        async with StubServer({PATH: respond(chat_completion("  All good.\n", 12, 3))}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                summary = await ai.generate_summary(["a: hello", "b: hi"], "Summarize")
+            finally:
+                await ai.close()
+            assert summary == "All good."
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (12, 3)
+            request = server.requests[0]
+            assert request["model"] == "stub"
+            assert request["messages"] == [{"role": "system", "content": "Summarize"},
+                                           {"role": "user", "content": "a: hello\nb: hi"}]
+
+    asyncio.run(scenario())
+
+def test_server_error_raises_provider_error():
+    async def scenario():
+        error = {"error": {"message": "overloaded", "type": "server_error"}}
+        async with StubServer({PATH: respond(error, status=503)}) as server:
+            ai = provider(server)
+            try:
+                with pytest.raises(ProviderError, match="OpenAI"):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_slow_server_raises_provider_error_after_the_client_timeout():
+    async def scenario():
+        async with StubServer({PATH: respond(chat_completion("late"), delay=5)}) as server:
+            ai = provider(server, timeout=0.2)
+            try:
+                with pytest.raises(ProviderError):
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_call_timeout_raises_timeout_error():
+    async def scenario():
+        async with StubServer({PATH: respond(chat_completion("late"), delay=5)}) as server:
+            ai = provider(server)
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    await ai.generate_summary(["a: hello"], "Summarize", timeout=0.2)
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_stream_yields_pieces_and_counts_tokens_from_the_usage_chunk():
+    async def scenario():
+        chunks = chat_chunks(["  ", " First", " point.", "\nSecond."], 20, 4)
+        async with StubServer({PATH: stream(chunks)}) as server:
+            ai = provider(server)
+            before = tokens("prompt"), tokens("completion")
+            try:
+                pieces = await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+            assert pieces == ["First", " point.", "\nSecond."]
+            assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (20, 4)
+            assert server.requests[0]["stream"] is True
+            assert server.requests[0]["stream_options"] == {"include_usage": True}
+
+    asyncio.run(scenario())
+
+def test_stream_server_error_raises_provider_error():
+    async def scenario():
+        async with StubServer({PATH: respond({"error": {"message": "down"}}, status=500)}) as server:
+            ai = provider(server)
+            try:
+                with pytest.raises(ProviderError, match="OpenAI"):
+                    await collect(ai.stream_summary(["a: hello"], "Summarize"))
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+from services.ai.base import ProviderError
+from services.ai.local_provider import LocalLLMProvider
+from services.ai.router import CircuitBreaker, ProviderRouter, Route
+from stubs import StubServer, chat_chunks, chat_completion, collect, respond, stream
+
+CHAT = "/v1/chat/completions"
+
+def route(server: StubServer, timeout: float = 5.0, slots: int = 4, **breaker) -> Route:
+    provider = LocalLLMProvider(base_url=server.url, max_concurrency=slots)
+    return Route(provider, timeout, CircuitBreaker(**breaker) if breaker else None)
+
+def router(*routes: Route, **options) -> ProviderRouter:
+    options.setdefault("hedge", False)
+    return ProviderRouter(list(routes), **options)
+
+def test_failover_on_server_error():
+    async def scenario():
+        async with StubServer({CHAT: respond({"error": "down"}, status=503)}) as primary, \
+                   StubServer({CHAT: respond(chat_completion("From fallback"))}) as fallback:
+            ai = router(route(primary), route(fallback))
+            try:
+                assert await ai.generate_summary(["a: hello"], "Summarize") == "From fallback"
+            finally:
+                await ai.close()
+            assert len(primary.requests) == len(fallback.requests) == 1
+
+    asyncio.run(scenario())
+
+def test_failover_on_timeout():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion("late"), delay=5)}) as primary, \
+                   StubServer({CHAT: respond(chat_completion("From fallback"))}) as fallback:
+            ai = router(route(primary, timeout=0.2), route(fallback))
+            try:
+                started = time.monotonic()
+                assert await ai.generate_summary(["a: hello"], "Summarize") == "From fallback"
+                assert time.monotonic() - started < 2
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_slow_call_is_hedged_and_the_first_answer_wins():
+    async def scenario():
+        async with StubServer({CHAT: respond(chat_completion("slow"), delay=2)}) as primary, \
+                   StubServer({CHAT: respond(chat_completion("From hedge"))}) as fallback:
+            ai = router(route(primary), route(fallback), hedge=True,
+                        default_hedge_delay=0.1, min_hedge_delay=0.05)
+            try:
+                started = time.monotonic()
+                assert await ai.generate_summary(["a: hello"], "Summarize") == "From hedge"
+                assert time.monotonic() - started < 1
+                # The losing request is cancelled and gives up its slot
+                await asyncio.sleep(0.05)
+                assert ai.routes[0].provider.limiter.active == 0
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_every_provider_failing_raises_provider_error():
+    async def scenario():
+        async with StubServer({CHAT: respond({"error": "down"}, status=500)}) as primary, \
+                   StubServer({CHAT: respond({"error": "down"}, status=502)}) as fallback:
+            ai = router(route(primary), route(fallback))
+            try:
+                with pytest.raises(ProviderError, match="No AI provider") as error:
+                    await ai.generate_summary(["a: hello"], "Summarize")
+            finally:
+                await ai.close()
+            assert "500" in str(error.value) and "502" in str(error.value)
+
+    asyncio.run(scenario())
+
+def test_open_circuit_skips_the_failing_provider():
+    async def scenario():
+        async with StubServer({CHAT: respond({"error": "down"}, status=503)}) as primary, \
+                   StubServer({CHAT: respond(chat_completion("From fallback"))}) as fallback:
+            ai = router(route(primary, failure_threshold=1, cooldown=60), route(fallback))
+            try:
+                for _ in range(3):
+                    assert await ai.generate_summary(["a: hello"], "Summarize") == "From fallback"
+            finally:
+                await ai.close()
+            assert ai.routes[0].breaker.state == "open"
+            assert len(primary.requests) == 1
+            assert len(fallback.requests) == 3
+
+    asyncio.run(scenario())
+
+def test_stream_fails_over_before_the_first_piece():
+    async def scenario():
+        async with StubServer({CHAT: respond({"error": "down"}, status=503)}) as primary, \
+                   StubServer({CHAT: stream(chat_chunks([" From", " fallback"]))}) as fallback:
+            ai = router(route(primary), route(fallback))
+            try:
+                assert await collect(ai.stream_summary(["a: hello"], "Summarize")) == ["From", " fallback"]
+            finally:
+                await ai.close()
+
+    asyncio.run(scenario())
+
+def test_stream_stalling_after_the_first_piece_raises_provider_error():
+    async def scenario():
+        async with StubServer({CHAT: stream(chat_chunks(["Partial", " rest"]), stall_after=2)}) as primary, \
+                   StubServer({CHAT: stream(chat_chunks(["Unused"]))}) as fallback:
+            ai = router(route(primary, timeout=0.2), route(fallback))
+            pieces = []
+            try:
+                with pytest.raises(ProviderError):
+                    async for piece in ai.stream_summary(["a: hello"], "Summarize"):
+                        pieces.append(piece)
+            finally:
+                await ai.close()
+            # Text was already shown, so the stream is not restarted elsewhere
+            assert pieces == ["Partial"]
+            assert not fallback.requests
+
+    asyncio.run(scenario())
+
+def test_stream_timeout_starts_once_the_provider_has_a_slot():
+    async def scenario():
+        chunks = chat_chunks(["Done"])
+        async with StubServer({CHAT: stream(chunks, delay=0.1)}) as server:
+            # Each stream takes ~0.2 s to its first piece; the second waits for
+            # the only slot for longer than the timeout, which must not count
+            ai = router(route(server, timeout=0.3, slots=1))
+            try:
+                results = await asyncio.gather(*(collect(ai.stream_summary(["a: hello"], "Summarize"))
+                                                 for _ in range(2)))
+            finally:
+                await ai.close()
+            assert results == [["Done"], ["Done"]]
+
+    asyncio.run(scenario())
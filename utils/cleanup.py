@@ -1,38 +1,101 @@
-from datetime import datetime, timedelta
-from sqlalchemy import delete
-from config.database import db, Message
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict
+from config.database import db
+from config.async_database import async_db
+from config.retention import RetentionPolicy, retention_policy
+from services.token_index import token_index
 
 class MessageCleanup:
-    def __init__(self, retention_days: int = 30):
+    """
+    Retention engine for stored messages.
+
+    Each run walks every thread and deletes its expired messages in small
+    batches, sleeping between batches so the ingestion writer can take the
+    database lock in between. Messages whose thread is not stored (e.g.
+    from channels that are no longer watched) use the default retention.
+    Meant to run often (e.g. hourly) so each run only has a little to
+    delete. On SQLite, freed pages are then returned to the filesystem a
+    bounded number at a time.
+    """
+
+    def __init__(self, policy: RetentionPolicy = retention_policy, batch_size: int = 500,
+                 pause: float = 0.05, vacuum_pages: int = 2000):
         """
         Initialize message cleanup manager.
-        
+
         Args:
-            retention_days: Number of days to keep messages (default: 30)
+            policy: Retention policy giving each thread's cutoff
+            batch_size: Messages deleted per transaction
+            pause: Seconds to yield between batches
+            vacuum_pages: Maximum SQLite pages reclaimed per run
         """
-        self.retention_days = retention_days
+        self.policy = policy
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "rows_deleted": 0,
+            "batches": 0,
+            "lock_seconds": 0.0,      # Total time spent in delete transactions
+            "max_lock_seconds": 0.0,  # Longest single delete transaction
+            "free_pages": None,       # SQLite free pages left after the last run
+            "last_run": None,
+        }
 
     async def cleanup_old_messages(self) -> int:
         """
-        Remove messages older than retention period.
-        
+        Remove messages older than each thread's retention period.
+
         Returns:
             int: Number of messages removed
         """
-        cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
-        
+        now = datetime.utcnow()
+        total = 0
         try:
-            with db.Session() as session:
-                # Delete messages older than cutoff date
-                delete_query = delete(Message).where(Message.created_at < cutoff_date)
-                result = session.execute(delete_query)
-                session.commit()
-                
-                # Get number of rows deleted
-                rows_deleted = result.rowcount
-                print(f"Cleaned up {rows_deleted} messages older than {cutoff_date}")
-                return rows_deleted
-                
+            threads = await async_db.get_thread_retention()
+            for thread_id, retention_days in threads:
+                cutoff = self.policy.cutoff(retention_days, now)
+                deleted = await self._cleanup_thread(thread_id, cutoff)
+                if deleted:
+                    token_index.invalidate(thread_id)
+                    total += deleted
+                await async_db.delete_summary_buckets_before(cutoff, thread_id)
+
+            # Messages of threads that are not stored have no override
+            cutoff = self.policy.cutoff(None, now)
+            for thread_id in await async_db.get_orphaned_thread_ids(cutoff):
+                total += await self._cleanup_thread(thread_id, cutoff)
+
+            # Uses a SQLite-specific driver call; stays on the sync engine in a worker thread
+            self.stats["free_pages"] = await asyncio.to_thread(db.reclaim_space, self.vacuum_pages)
         except Exception as e:
             print(f"Error during message cleanup: {e}")
-            return 0
\ No newline at end of file
+
+        self.stats["runs"] += 1
+        self.stats["last_run"] = now
+        print(f"Cleaned up {total} expired messages "
+              f"(max lock {self.stats['max_lock_seconds'] * 1000:.1f} ms, "
+              f"free pages {self.stats['free_pages']})")
+        return total
+
+    async def _cleanup_thread(self, thread_id: int, cutoff: datetime) -> int:
+        """Delete a thread's messages older than the cutoff, one batch at a time."""
+        deleted = 0
+        while True:
+            started = time.perf_counter()
+            count = await async_db.delete_messages_before(thread_id, cutoff, self.batch_size)
+            elapsed = time.perf_counter() - started
+
+            self.stats["batches"] += 1
+            self.stats["rows_deleted"] += count
+            self.stats["lock_seconds"] += elapsed
+            self.stats["max_lock_seconds"] = max(self.stats["max_lock_seconds"], elapsed)
+            deleted += count
+
+            if count < self.batch_size:
+                return deleted
+            # Let queued ingestion writes through before the next batch
+            await asyncio.sleep(self.pause)
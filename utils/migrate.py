@@ -1,84 +1,272 @@
+"""
+Import a feedback_log.txt style log into the messages table.
+
+The log is streamed: lines are parsed lazily (optionally in worker
+processes) and written in large bulk batches, so memory use does not grow
+with the size of the file.
+
+Usage:
+    python -m utils.migrate feedback_log.txt THREAD_ID
+    python -m utils.migrate big.log THREAD_ID --workers 4 --batch-size 10000
+    python -m utils.migrate big.log THREAD_ID --commit-every-batch --start-line 2000001
+"""
+import argparse
+import os
 import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from config.database import db
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 from sqlalchemy.exc import SQLAlchemyError
 
-def parse_log_line(line: str):
+from config.database import DatabaseConfig, db
+from utils.tokens import count_tokens
+
+# Example line: [2025-10-16 14:25:30 EDT] [Mod] Username: Message content
+# Or: [2025-10-16 14:25:30 EDT] [Mod] Username (reply to Other User (2025-10-16 14:20:00)): Message content
+LOG_LINE_PATTERN = re.compile(r'\[(.*?)\] (.*?)(?: \(reply to (.*?)\))?: (.*?)(\s+\[edited\])?$')
+ROLE_PATTERN = re.compile(r'\[(.*?)\]\s*(.*)')
+
+def parse_log_line(line: str) -> Optional[Dict[str, Any]]:
     """Parse a line from feedback_log.txt into its components."""
-    # Example line: [2025-10-16 14:25:30 EDT] [Mod] Username: Message content
-    # Or: [2025-10-16 14:25:30 EDT] [Mod] Username (reply to Other User (2025-10-16 14:20:00)): Message content
-    pattern = r'\[(.*?)\] (.*?)(?: \(reply to (.*?)\))?: (.*?)(?:  \[edited\])?$'
-    match = re.match(pattern, line)
-    if match:
-        timestamp_str, author_text, reply_to, content = match.groups()
-        try:
-            # Parse the timestamp
-            # Remove timezone abbreviation for parsing
-            timestamp_no_tz = ' '.join(timestamp_str.strip().split(' ')[:-1])
-            timestamp = datetime.strptime(timestamp_no_tz, '%Y-%m-%d %H:%M:%S')
-            
-            # Extract role if present
-            role_match = re.match(r'\[(.*?)\]\s*(.*)', author_text)
-            if role_match:
-                role, author = role_match.groups()
-            else:
-                role, author = None, author_text
-            
-            return {
-                'timestamp': timestamp,
-                'author': author.strip(),
-                'role': role.strip() if role else None,
-                'reply_to': reply_to.strip() if reply_to else None,
-                'content': content.strip()
-            }
-        except ValueError:
-            return None
-    return None
-
-def migrate_log_to_db(log_file: str, thread_id: int) -> int:
+    match = LOG_LINE_PATTERN.match(line)
+    if not match:
+        return None
+
+    timestamp_str, author_text, reply_to, content, edited = match.groups()
+    try:
+        # Drop the timezone abbreviation; timestamps are stored as written
+        timestamp = datetime.fromisoformat(timestamp_str.strip().rsplit(' ', 1)[0])
+    except ValueError:
+        return None
+
+    role_match = ROLE_PATTERN.match(author_text)
+    if role_match:
+        role, author = role_match.groups()
+    else:
+        role, author = None, author_text
+
+    return {
+        'timestamp': timestamp,
+        'author': author.strip(),
+        'role': role.strip() if role else None,
+        'reply_to': reply_to.strip() if reply_to else None,
+        'content': content.strip(),
+        'edited': edited is not None
+    }
+
+def parse_lines(lines: List[str], thread_id: int) -> Tuple[List[dict], int]:
+    """
+    Turn raw log lines into message rows, token counts included.
+
+    Module-level so worker processes can run it.
+
+    Returns:
+        (message_row() dicts, number of non-empty lines that did not parse)
+    """
+    rows = []
+    skipped = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        parsed = parse_log_line(line)
+        if parsed is None:
+            skipped += 1
+            continue
+        rows.append(DatabaseConfig.message_row(
+            thread_id=thread_id,
+            author=parsed['author'],
+            role=parsed['role'],
+            content=parsed['content'],
+            created_at=parsed['timestamp'],
+            reply_to=parsed['reply_to'],
+            edited=parsed['edited'],
+            token_count=count_tokens(parsed['content'])
+        ))
+    return rows, skipped
+
+class LogMigration:
+    """
+    One streaming pass over a log file.
+
+    Reads the file in binary so progress can be reported in bytes, hands
+    batch_size-line chunks to the parser (in-process, or in up to `workers`
+    processes with a bounded number of chunks in flight) and yields each
+    chunk's rows as one batch for DatabaseConfig.insert_message_stream.
+    """
+
+    def __init__(self, log_file: str, thread_id: int, batch_size: int = 5000,
+                 workers: int = 1, start_line: int = 1, progress_interval: float = 5.0):
+        """
+        Args:
+            log_file: Path to the log file
+            thread_id: ID of the thread to associate messages with
+            batch_size: Lines per bulk insert
+            workers: Parser processes; 1 parses in this process
+            start_line: First line to import (1-based), to resume a partial import
+            progress_interval: Seconds between progress reports
+        """
+        self.log_file = log_file
+        self.thread_id = thread_id
+        self.batch_size = batch_size
+        self.workers = workers
+        self.start_line = start_line
+        self.progress_interval = progress_interval
+
+        self.total_bytes = os.path.getsize(log_file)
+        self.stats = {"lines": 0, "bytes": 0, "parsed": 0, "skipped": 0, "written": 0}
+        self._last_line_in_batch: deque = deque()
+        self._started = 0.0
+        self._last_report = 0.0
+
+    def run(self, database: DatabaseConfig, single_transaction: bool = True) -> int:
+        """
+        Import the file.
+
+        Returns:
+            int: Number of messages imported
+
+        Raises:
+            SQLAlchemyError: If a batch fails to write
+        """
+        self._started = self._last_report = time.monotonic()
+        written = database.insert_message_stream(
+            self.batches(), single_transaction=single_transaction, on_batch=self._on_batch
+        )
+        self.report(final=True)
+        return written
+
+    @property
+    def committed_line(self) -> int:
+        """Last line whose messages are durably written (per-batch commits only)."""
+        return self.stats.get("committed_line", self.start_line - 1)
+
+    def batches(self) -> Iterator[List[dict]]:
+        """
+        Yield the rows of each batch_size-line chunk of the file.
+
+        Batches never straddle chunks, so once a batch is written every line
+        up to the end of its chunk is imported (the resume point).
+        """
+        for rows, last_line in self._parsed_chunks():
+            if rows:
+                self._last_line_in_batch.append(last_line)
+                yield rows
+
+    def _on_batch(self, size: int) -> None:
+        self.stats["written"] += size
+        self.stats["committed_line"] = self._last_line_in_batch.popleft()
+        if time.monotonic() - self._last_report >= self.progress_interval:
+            self.report()
+
+    def _line_chunks(self) -> Iterator[Tuple[List[str], int]]:
+        """Yield (decoded lines, number of the chunk's last line) from start_line on."""
+        line_number = 0
+        with open(self.log_file, 'rb') as f:
+            while True:
+                raw = list(islice(f, self.batch_size))
+                if not raw:
+                    return
+                self.stats["bytes"] += sum(len(line) for line in raw)
+                first = line_number + 1
+                line_number += len(raw)
+                if line_number < self.start_line:
+                    continue
+                raw = raw[max(0, self.start_line - first):]
+                self.stats["lines"] += len(raw)
+                yield [line.decode('utf-8', errors='replace') for line in raw], line_number
+
+    def _parsed_chunks(self) -> Iterator[Tuple[List[dict], int]]:
+        """Yield (rows, number of the chunk's last line), in file order."""
+        if self.workers <= 1:
+            for lines, last_line in self._line_chunks():
+                yield self._count(parse_lines(lines, self.thread_id)), last_line
+            return
+
+        # Keep at most two chunks per worker in flight so memory stays bounded
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending: deque = deque()
+            for lines, last_line in self._line_chunks():
+                pending.append((pool.submit(parse_lines, lines, self.thread_id), last_line))
+                if len(pending) >= self.workers * 2:
+                    future, line = pending.popleft()
+                    yield self._count(future.result()), line
+            while pending:
+                future, line = pending.popleft()
+                yield self._count(future.result()), line
+
+    def _count(self, result: Tuple[List[dict], int]) -> List[dict]:
+        rows, skipped = result
+        self.stats["parsed"] += len(rows)
+        self.stats["skipped"] += skipped
+        return rows
+
+    def report(self, final: bool = False) -> None:
+        """Print progress and throughput."""
+        self._last_report = time.monotonic()
+        elapsed = max(self._last_report - self._started, 1e-9)
+        percent = 100.0 * self.stats["bytes"] / self.total_bytes if self.total_bytes else 100.0
+        label = "Migration finished" if final else "Migrating"
+        print(f"{label}: {self.stats['written']} messages written, "
+              f"{self.stats['skipped']} lines skipped, {percent:.1f}% of "
+              f"{self.total_bytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+              f"({self.stats['written'] / elapsed:.0f} msg/s, "
+              f"{self.stats['bytes'] / 1024 / 1024 / elapsed:.1f} MB/s)")
+
+def migrate_log_to_db(log_file: str, thread_id: int, batch_size: int = 5000, workers: int = 1,
+                      single_transaction: bool = True, start_line: int = 1,
+                      database: Optional[DatabaseConfig] = None) -> int:
     """
     Migrate messages from a log file to the database.
-    Uses SQLAlchemy transaction to ensure all messages are imported successfully.
-    
+
+    With single_transaction (the default) every message is imported or none
+    is. Otherwise each batch commits on its own; if one fails, the line to
+    resume from is printed and the messages committed so far are kept.
+
     Args:
         log_file: Path to the log file
         thread_id: ID of the thread to associate messages with
-        
+        batch_size: Lines per bulk insert
+        workers: Parser processes for very large files; 1 parses inline
+        single_transaction: Commit once at the end instead of per batch
+        start_line: First line to import (1-based)
+        database: Database to write to (defaults to the configured one)
+
     Returns:
         int: Number of messages imported
     """
-    imported = 0
-    messages_to_import = []
-
-    # First, parse all messages
-    with open(log_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-                
-            parsed = parse_log_line(line)
-            if parsed:
-                messages_to_import.append({
-                    'thread_id': thread_id,
-                    'author': parsed['author'],
-                    'role': parsed['role'],
-                    'content': parsed['content'],
-                    'created_at': parsed['timestamp'],
-                    'reply_to': parsed['reply_to']
-                })
-
-    # Then import all messages in a single transaction
-    if messages_to_import:
-        try:
-            with db.Session() as session:
-                for message in messages_to_import:
-                    success = db.save_message(**message)
-                    if success:
-                        imported += 1
-                session.commit()
-        except SQLAlchemyError as e:
-            print(f"Error during migration: {e}")
+    migration = LogMigration(log_file, thread_id, batch_size=batch_size,
+                             workers=workers, start_line=start_line)
+    try:
+        return migration.run(database or db, single_transaction=single_transaction)
+    except SQLAlchemyError as e:
+        print(f"Error during migration: {e}")
+        if single_transaction:
             return 0
-    
-    return imported
\ No newline at end of file
+        print(f"Resume with --start-line {migration.committed_line + 1}")
+        return migration.stats["written"]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import a feedback log file into the database.")
+    parser.add_argument("log_file", help="Path to the log file")
+    parser.add_argument("thread_id", type=int, help="Thread the messages belong to")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Lines per bulk insert (default: 5000)")
+    parser.add_argument("--workers", type=int, default=1, help="Parser processes (default: 1)")
+    parser.add_argument("--commit-every-batch", action="store_true",
+                        help="Commit each batch instead of one transaction, so a failed run can be resumed")
+    parser.add_argument("--start-line", type=int, default=1, help="First line to import (default: 1)")
+    args = parser.parse_args()
+
+    imported = migrate_log_to_db(args.log_file, args.thread_id, batch_size=args.batch_size,
+                                 workers=args.workers, single_transaction=not args.commit_every_batch,
+                                 start_line=args.start_line)
+    print(f"Imported {imported} messages")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
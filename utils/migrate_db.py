@@ -2,9 +2,33 @@ import sqlite3
 import os
 from pathlib import Path
 
+# (table, column, SQL type) added since the original schema
+COLUMNS_TO_ADD = [
+    ("threads", "description", "TEXT"),
+    ("threads", "retention_days", "INTEGER"),
+    ("messages", "discord_message_id", "BIGINT"),
+    ("messages", "edited_at", "DATETIME"),
+    ("messages", "token_count", "INTEGER"),
+    ("summary_buckets", "bucket_end", "DATETIME"),
+]
+
+# (index name, CREATE INDEX statement) added since the original schema
+INDEXES_TO_ADD = [
+    ("idx_thread_created_at",
+     "CREATE INDEX IF NOT EXISTS idx_thread_created_at ON messages (thread_id, created_at)"),
+    ("idx_discord_message_id",
+     "CREATE UNIQUE INDEX IF NOT EXISTS idx_discord_message_id ON messages (discord_message_id)"),
+]
+
+# Indexes superseded by newer ones
+INDEXES_TO_DROP = [
+    "idx_thread_id",  # Prefix of idx_thread_created_at
+]
+
 def migrate_database():
     """
-    Migrate the database schema to add the description column to the threads table.
+    Migrate the database schema to add columns and indexes introduced after
+    the original release (thread descriptions, Discord message IDs, edit times).
     """
     # Get the database path from environment or use default
     db_url = os.getenv("DATABASE_URL", "sqlite:///instance/feedback.db")
@@ -26,18 +50,36 @@ def migrate_database():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
-        # Check if the description column already exists
-        cursor.execute("PRAGMA table_info(threads)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if "description" not in column_names:
-            print("Adding 'description' column to threads table...")
-            cursor.execute("ALTER TABLE threads ADD COLUMN description TEXT")
-            conn.commit()
-            print("Migration successful!")
-        else:
-            print("Column 'description' already exists in threads table.")
+        for table, column, sql_type in COLUMNS_TO_ADD:
+            cursor.execute(f"PRAGMA table_info({table})")
+            column_names = [col[1] for col in cursor.fetchall()]
+
+            if not column_names:
+                # The table does not exist yet; the bot creates it with every column
+                continue
+            if column not in column_names:
+                print(f"Adding '{column}' column to {table} table...")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+            else:
+                print(f"Column '{column}' already exists in {table} table.")
+
+        for index_name, create_sql in INDEXES_TO_ADD:
+            print(f"Ensuring index '{index_name}' exists...")
+            cursor.execute(create_sql)
+
+        for index_name in INDEXES_TO_DROP:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+        conn.commit()
+
+        # Let the cleanup task hand freed pages back to the filesystem;
+        # changing auto_vacuum on an existing database needs a full VACUUM once
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            print("Enabling incremental auto-vacuum (one-time VACUUM)...")
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        print("Migration successful!")
         
         conn.close()
         return True
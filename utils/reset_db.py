@@ -1,4 +1,5 @@
-from config.database import db, Base, engine
+from config.database import db, Base
+from config.search_index import drop_search_index, install_search_index
 from utils.migrate import migrate_log_to_db
 
 def reset_database():
@@ -7,10 +8,14 @@ def reset_database():
     Optionally re-import data from feedback_log.txt.
     """
     print("Dropping all tables...")
-    Base.metadata.drop_all(engine)
-    
+    with db.engine.begin() as conn:
+        drop_search_index(conn)
+        Base.metadata.drop_all(conn)
+
     print("Creating new tables with updated schema...")
-    Base.metadata.create_all(engine)
+    with db.engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        install_search_index(conn)
     
     try:
         print("Re-importing messages from feedback_log.txt...")
@@ -0,0 +1,146 @@
+import time
+from typing import List, Optional, Tuple
+
+import discord
+
+# Discord's message length limit
+MESSAGE_LIMIT = 2000
+
+CODE_FENCE = "```"
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> Tuple[str, str]:
+    """
+    Split text into a head that fits in one Discord message and the rest.
+
+    Cuts at the last paragraph break, line break or space in the second half
+    of the allowed length, so words and markdown lines are not cut in half.
+    A code block left open by the cut is closed in the head and reopened in
+    the rest.
+
+    Returns:
+        Tuple of (head, rest); rest is empty if text already fits
+    """
+    if len(text) <= limit:
+        return text, ""
+
+    # Leave room to close a code block
+    window = text[:limit - len(CODE_FENCE) - 1]
+    cut = -1
+    for separator in ("\n\n", "\n", " "):
+        cut = window.rfind(separator, len(window) // 2)
+        if cut > 0:
+            break
+    if cut <= 0:
+        cut = len(window)
+
+    head, rest = text[:cut].rstrip(), text[cut:].lstrip()
+    if head.count(CODE_FENCE) % 2:
+        # Reopen with the same language tag, e.g. ```py
+        opening = head[head.rfind(CODE_FENCE):].split("\n", 1)[0]
+        head += f"\n{CODE_FENCE}"
+        rest = f"{opening}\n{rest}"
+    return head, rest
+
+def paginate(entries: List[str], limit: int = MESSAGE_LIMIT, separator: str = "\n") -> List[List[str]]:
+    """
+    Group consecutive entries into pages whose text, joined by `separator`,
+    fits in `limit` characters. Entries are never split; one longer than the
+    limit gets a page of its own.
+    """
+    pages: List[List[str]] = []
+    page: List[str] = []
+    size = 0
+    for entry in entries:
+        added = len(entry) + (len(separator) if page else 0)
+        if page and size + added > limit:
+            pages.append(page)
+            page, size, added = [], 0, len(entry)
+        page.append(entry)
+        size += added
+    if page:
+        pages.append(page)
+    return pages
+
+class StreamingReply:
+    """
+    Shows text that arrives incrementally as one or more Discord replies.
+
+    A placeholder reply is edited as text is written, at most once per
+    `edit_interval` seconds to stay well within Discord's edit rate limits.
+    When the text outgrows a message it is cut at a markdown-safe boundary
+    and continues in a new reply. The placeholder never stays behind: if
+    the stream ends empty or fails, it is replaced with a note saying so.
+    """
+
+    def __init__(self, ctx, header: str = "", edit_interval: float = 1.0,
+                 limit: int = MESSAGE_LIMIT, empty_text: str = "ℹ️ Nothing to show."):
+        """
+        Args:
+            ctx: Command context the replies are sent to
+            header: Text shown before the streamed content in the first message
+            edit_interval: Minimum seconds between edits of the same message
+            limit: Maximum characters per message
+            empty_text: Replaces the placeholder if the stream ends without text
+        """
+        self.ctx = ctx
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.empty_text = empty_text
+        self._text = header          # Content of the current message, including unsent text
+        self._has_content = False    # Whether anything beyond the header was written
+        self._message: Optional[discord.Message] = None
+        self._shown: Optional[str] = None
+        self._last_edit = 0.0
+
+    async def start(self, placeholder: str) -> None:
+        """Send the placeholder reply that will be replaced by the streamed text."""
+        self._message = await self.ctx.reply(placeholder)
+        self._shown = placeholder
+        self._last_edit = time.monotonic()
+
+    async def write(self, text: str) -> None:
+        """Append text; the reply is updated if the last edit is old enough."""
+        if not text:
+            return
+        self._text += text
+        self._has_content = True
+        if len(self._text) > self.limit or time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self) -> None:
+        """Show everything written so far, or empty_text if nothing was."""
+        if self._has_content:
+            await self._flush()
+        elif self._message is not None:
+            await self._show(self.empty_text)
+
+    async def fail(self, error: str) -> None:
+        """
+        Report that the stream failed: the error replaces the placeholder if
+        nothing was written, and otherwise follows the partial text.
+        """
+        if self._has_content:
+            self._text += f"\n\n{error}"
+            await self._flush()
+        elif self._message is not None:
+            await self._show(error)
+        else:
+            await self.ctx.reply(error)
+
+    async def _flush(self) -> None:
+        while len(self._text) > self.limit:
+            head, self._text = split_message(self._text, self.limit)
+            await self._show(head)
+            # The rest continues in a new reply
+            self._message = None
+            self._shown = None
+        if self._text.strip():
+            await self._show(self._text)
+
+    async def _show(self, content: str) -> None:
+        if self._message is None:
+            self._message = await self.ctx.reply(content)
+        elif content != self._shown:
+            await self._message.edit(content=content)
+        self._shown = content
+        self._last_edit = time.monotonic()
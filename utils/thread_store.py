@@ -1,6 +1,8 @@
 from dataclasses import dataclass
+from typing import Iterator, Set
 from discord import Member
-from config.database import db
+from config.async_database import async_db
+from services.token_index import token_index
 
 @dataclass
 class ThreadInfo:
@@ -8,31 +10,78 @@ class ThreadInfo:
     nickname: str
     created_by: str
     description: str = None
+    retention_days: int = None
 
-def save_thread(thread_id: int, nickname: str, created_by: Member, description: str = None) -> bool:
+class WatchedThreadRegistry:
+    """
+    In-memory set of the thread IDs stored in the threads table.
+
+    Event handlers check membership before doing any other work so traffic
+    from unwatched channels never reaches the database.
+    """
+
+    def __init__(self):
+        self._thread_ids: Set[int] = set()
+
+    async def load(self) -> int:
+        """Replace the registry contents with the threads currently in the database."""
+        self._thread_ids = set(await async_db.get_thread_ids())
+        return len(self._thread_ids)
+
+    def add(self, thread_id: int) -> None:
+        self._thread_ids.add(thread_id)
+
+    def discard(self, thread_id: int) -> None:
+        self._thread_ids.discard(thread_id)
+
+    def __contains__(self, thread_id: int) -> bool:
+        return thread_id in self._thread_ids
+
+    def __len__(self) -> int:
+        return len(self._thread_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._thread_ids)
+
+# Process-wide registry of watched threads
+watched_threads = WatchedThreadRegistry()
+
+async def save_thread(thread_id: int, nickname: str, created_by: Member, description: str = None) -> bool:
     """Store thread information with a nickname."""
-    return db.save_thread(thread_id, nickname, str(created_by), description)
+    saved = await async_db.save_thread(thread_id, nickname, str(created_by), description)
+    if saved:
+        watched_threads.add(thread_id)
+    return saved
+
+async def remove_thread(thread_id: int) -> bool:
+    """Stop watching a thread and delete its stored messages."""
+    watched_threads.discard(thread_id)
+    deleted = await async_db.delete_thread(thread_id)
+    token_index.invalidate(thread_id)
+    return deleted
 
-def get_thread_by_name(nickname: str) -> ThreadInfo:
+async def get_thread_by_name(nickname: str) -> ThreadInfo:
     """Retrieve thread information by nickname."""
-    thread = db.get_thread_by_name(nickname)
+    thread = await async_db.get_thread_by_name(nickname)
     if thread:
         return ThreadInfo(
             thread_id=thread.thread_id,
             nickname=thread.nickname,
             created_by=thread.created_by,
-            description=thread.description
+            description=thread.description,
+            retention_days=thread.retention_days
         )
     return None
 
-def get_thread_by_id(thread_id: int) -> ThreadInfo:
+async def get_thread_by_id(thread_id: int) -> ThreadInfo:
     """Retrieve thread information by ID."""
-    thread = db.get_thread_by_id(thread_id)
+    thread = await async_db.get_thread_by_id(thread_id)
     if thread:
         return ThreadInfo(
             thread_id=thread.thread_id,
             nickname=thread.nickname,
             created_by=thread.created_by,
-            description=thread.description
+            description=thread.description,
+            retention_days=thread.retention_days
         )
     return None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Tuple, Optional
 
 def parse_timeframe(timeframe: Optional[str] = None) -> Tuple[datetime, datetime]:
@@ -59,4 +59,10 @@ def format_timeframe(start_date: datetime, end_date: datetime) -> str:
     elif delta.days == 30:
         return "last 30 days"
     else:
-        return f"last {delta.days} days"
\ No newline at end of file
+        return f"last {delta.days} days"
+
+def to_naive_utc(dt: datetime) -> datetime:
+    """Convert a tz-aware datetime (as Discord provides) to the naive UTC form stored in the database."""
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
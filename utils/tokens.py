@@ -0,0 +1,62 @@
+import math
+from typing import List, Optional
+
+try:
+    # Optional: exact counts for OpenAI-style tokenizers
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# Extra tokens per transcript line for the role prefix, author name and separator
+MESSAGE_OVERHEAD_TOKENS = 8
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding, tiktoken
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Encoding files could not be loaded (e.g. offline); use the estimate
+            tiktoken = None
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of text.
+
+    Uses tiktoken when installed, otherwise estimates from the length.
+    This is CPU work; call it from a worker thread, not the event loop.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def pack_lines(lines: List[str], budget: int, token_counts: Optional[List[int]] = None) -> List[List[str]]:
+    """
+    Split transcript lines into consecutive chunks of at most `budget` tokens.
+    A single line larger than the budget gets a chunk of its own.
+
+    Lines are tokenized unless their counts are given in `token_counts`.
+    """
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for i, line in enumerate(lines):
+        count = token_counts[i] if token_counts is not None else count_tokens(line)
+        tokens = count + MESSAGE_OVERHEAD_TOKENS
+        if current and size + tokens > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks